@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+reconstruct_table 性能基准
+
+在合成的密集表格页面（默认 10000 个文本框）上比较向量化实现与原先的
+纯 Python 实现（保留在本文件中作为参照），并核对两者的输出：
+规整表格上两者一致；行倾斜时原实现会把相邻行的文本混在一起（错行）或把
+一行拆开（丢行）；旁注行距与表格不同时两行可能被连成一行（丢行）。
+
+向量化实现出现错行，或丢行多于原实现时以退出码 1 结束。
+
+用法：
+    python benchmarks/bench_reconstruct_table.py
+    python benchmarks/bench_reconstruct_table.py --boxes 20000 --cols 12 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routers.pdf_ocr import reconstruct_table  # noqa: E402
+
+
+def legacy_reconstruct_table(texts, boxes, y_threshold=30, min_cols=3):
+    """原先的逐项字典 + 行首比较实现，仅用于对比"""
+    if not texts or not boxes or len(texts) != len(boxes) or len(texts) < 6:
+        return {'has_table': False, 'headers': [], 'rows': []}
+    items = []
+    for i, (text, box) in enumerate(zip(texts, boxes)):
+        if isinstance(box, list) and len(box) >= 4:
+            x1, y1, x2, y2 = box[0], box[1], box[2], box[3]
+            items.append({'text': text, 'x_center': (x1 + x2) / 2, 'y_center': (y1 + y2) / 2, 'index': i})
+    if len(items) < 6:
+        return {'has_table': False, 'headers': [], 'rows': []}
+    items.sort(key=lambda x: x['y_center'])
+    rows = []
+    current_row = [items[0]]
+    for item in items[1:]:
+        if abs(item['y_center'] - current_row[0]['y_center']) < y_threshold:
+            current_row.append(item)
+        else:
+            current_row.sort(key=lambda x: x['x_center'])
+            rows.append(current_row)
+            current_row = [item]
+    current_row.sort(key=lambda x: x['x_center'])
+    rows.append(current_row)
+    if len(rows) < 2:
+        return {'has_table': False, 'headers': [], 'rows': []}
+    col_counts = [len(row) for row in rows]
+    valid_col_counts = [c for c in col_counts if c >= min_cols]
+    if not valid_col_counts:
+        return {'has_table': False, 'headers': [], 'rows': []}
+    most_common_cols = Counter(valid_col_counts).most_common(1)[0][0]
+    regular_rows = [row for row in rows if len(row) == most_common_cols]
+    if len(regular_rows) < 2:
+        return {'has_table': False, 'headers': [], 'rows': []}
+    headers = [item['text'] for item in regular_rows[0]]
+    data_rows = [[item['text'] for item in row][:len(headers)] for row in regular_rows[1:]]
+    return {'has_table': True, 'headers': headers, 'rows': data_rows,
+            'total_rows': len(data_rows), 'total_cols': len(headers)}
+
+
+def synthetic_page(n_boxes: int, n_cols: int, row_height: float = 40.0, jitter: float = 4.0,
+                   drift: float = 0.0, seed: int = 0):
+    """
+    生成合成表格页面
+
+    Args:
+        n_boxes: 文本框总数
+        n_cols: 每行列数
+        jitter: 文本框位置的随机抖动（像素）
+        drift: 每列相对上一列的纵向偏移（像素），模拟倾斜的行
+    """
+    rng = random.Random(seed)
+    texts, boxes = [], []
+    for i in range(n_boxes):
+        row, col = divmod(i, n_cols)
+        x = 20 + col * 120 + rng.uniform(-jitter, jitter)
+        y = 20 + row * row_height + col * drift + rng.uniform(-jitter, jitter)
+        texts.append(f"r{row}c{col}")
+        boxes.append([x, y, x + 100, y + 24])
+    # OCR 输出顺序并不严格按行列排列
+    pairs = list(zip(texts, boxes))
+    rng.shuffle(pairs)
+    return [t for t, _ in pairs], [b for _, b in pairs]
+
+
+def sidebar_page(n_rows: int, n_cols: int, pitch: float, row_height: float = 40.0):
+    """表格右侧附带一列旁注，旁注的行距 pitch 与表格行距不同"""
+    texts, boxes = [], []
+    for row in range(n_rows):
+        for col in range(n_cols):
+            y = 20 + row * row_height
+            texts.append(f"r{row}c{col}")
+            boxes.append([20 + col * 120, y, 120 + col * 120, y + 24])
+    for i in range(int(n_rows * row_height / pitch)):
+        y = 25 + i * pitch
+        texts.append(f"note{i}")
+        boxes.append([20 + n_cols * 120 + 100, y, 20 + n_cols * 120 + 300, y + 20])
+    return texts, boxes
+
+
+def mixed_rows(table) -> int:
+    """输出中混入了其它行文本的行数（合成文本为 r<行>c<列>，旁注不计）"""
+    rows = [table['headers']] + table['rows'] if table.get('has_table') else []
+    return sum(1 for row in rows if len({cell.split('c')[0] for cell in row if cell.startswith('r')}) > 1)
+
+
+def best_time(func, repeat: int) -> float:
+    """多次运行取最短耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="reconstruct_table 性能基准")
+    parser.add_argument("--boxes", type=int, default=10000, help="每页文本框数")
+    parser.add_argument("--cols", type=int, default=10, help="每行列数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最短耗时）")
+    args = parser.parse_args()
+
+    regular = synthetic_page(args.boxes, args.cols)
+    # 完整的行数减去表头
+    expected = args.boxes // args.cols - 1
+    cases = [
+        # PaddleOCR 返回的 rec_boxes 本身就是 (N, 4) 数组
+        ("规整/数组", regular[0], regular[1], np.array(regular[1]), expected),
+        ("规整/列表", regular[0], regular[1], regular[1], expected),
+        ("倾斜/列表", *synthetic_page(args.boxes, args.cols, drift=3.0), None, expected),
+        ("旁注/列表", *sidebar_page(10, 4, pitch=27.0), None, 9),
+    ]
+    print(f"{'页面':<10}{'文本框':>7}{'原实现(ms)':>11}{'向量化(ms)':>11}{'加速':>7}"
+          f"{'数据行':>12}{'丢行':>10}{'错行':>10}")
+    failed = False
+    for name, texts, boxes, current_boxes, expected_rows in cases:
+        if current_boxes is None:
+            current_boxes = boxes
+        legacy = legacy_reconstruct_table(texts, boxes)
+        current = reconstruct_table(texts, current_boxes)
+        legacy_ms = best_time(lambda: legacy_reconstruct_table(texts, boxes), args.repeat)
+        current_ms = best_time(lambda: reconstruct_table(texts, current_boxes), args.repeat)
+        legacy_lost = expected_rows - legacy.get('total_rows', 0)
+        current_lost = expected_rows - current.get('total_rows', 0)
+        print(f"{name:<10}{len(texts):>7}{legacy_ms:>11.2f}{current_ms:>11.2f}{legacy_ms / current_ms:>6.1f}x"
+              f"{legacy.get('total_rows', 0):>6}/{current.get('total_rows', 0):<5}"
+              f"{legacy_lost:>4}/{current_lost:<5}"
+              f"{mixed_rows(legacy):>4}/{mixed_rows(current):<4}"
+              + ("  一致" if legacy == current else ""))
+        if mixed_rows(current) or current_lost > max(legacy_lost, 0):
+            failed = True
+    if failed:
+        print("\n向量化实现出现错行或丢行")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+离线分阶段性能基准
+
+对仓库自带的 PDF（1.pdf、Products.pdf、proton-recovery-kit.pdf）和一个合成表格页面，
+逐阶段测量耗时与峰值内存：
+
+    base64_decode -> pdf_open -> rasterize -> detection -> recognition
+    -> extract_ocr_data -> reconstruct_table -> json_serialize
+
+另外单独测量 reconstruct_table 在合成 10000 文本框页面上的耗时，
+在新解释器中 import main 的耗时（import[main]，冷启动导入开销），
+以及每次上传的处理（upload[输入]：按块写入 SpooledTemporaryFile、经 upload_content
+取得内容并由 PyMuPDF 打开）；
+输入中另有一个超过 OCR_UPLOAD_SPOOL_MB 的合成大文件（large_upload），覆盖转存到临时文件的路径。
+
+每个 (阶段, 输入) 报告 p50 / p95 耗时与 RSS 增量：阶段开始前通过 /proc/self/clear_refs
+重置峰值 RSS (VmHWM)，增量为阶段内的峰值减去开始时的 RSS（import[main] 为新解释器中
+import main 前后之差）；不能重置峰值的平台上为阶段结束与开始时 RSS 之差。
+结果与基线文件比较：p50 或 RSS 增量超出基线的比例大于 --threshold 时以退出码 1 结束。
+
+基线与机器相关，不提交到仓库（benchmarks/baseline*.json 已加入 .gitignore）。
+基线文件不存在时本次结果即写入为基线；在对比用的机器上以未修改的代码运行一次
+--update-baseline 即可重新生成，之后再在修改后的代码上运行比较。
+
+引擎：
+- stub（默认）：确定性的 OpenCV 检测 / 识别替身，不需要模型与网络，
+  用于衡量识别前后各阶段（渲染、解析、表格重建、序列化）的变化
+- paddle：PaddleOCR 3.x 的 TextDetection / TextRecognition 模块，
+  只使用本地已缓存的模型（不检查模型源）
+
+用法：
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --iterations 20 --threshold 0.2
+    python benchmarks/run_benchmarks.py --engine paddle --baseline benchmarks/baseline_paddle.json
+    python benchmarks/run_benchmarks.py --update-baseline   # 重新生成基线
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# paddle 引擎只使用本地缓存的模型
+os.environ.setdefault("PADDLE_PDX_DISABLE_MODEL_SOURCE_CHECK", "True")
+# 基准只测量计算本身，关闭结果缓存
+os.environ["OCR_CACHE_ENABLED"] = "0"
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from utils import EngineRegistry  # noqa: E402
+from utils.EngineRegistry import resolve_models  # noqa: E402
+
+DEFAULT_FILES = ["1.pdf", "Products.pdf", "proton-recovery-kit.pdf"]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# 小于该值的耗时差异视为噪声，不判定为回退
+MIN_REGRESSION_MS = 0.5
+MIN_REGRESSION_RSS_MB = 16.0
+
+# 在子进程中执行：输出 import main 的耗时（秒）以及导入前的 RSS 与导入后的峰值 RSS（MB）。
+# ru_maxrss 在 Linux 上跨 fork / execve 继承父进程的值，因此读取本进程的 VmRSS / VmHWM
+IMPORT_PROBE = (
+    "import time\n"
+    "def rss(field):\n"
+    "    try:\n"
+    "        with open('/proc/self/status') as f:\n"
+    "            return next(int(line.split()[1]) / 1024 for line in f if line.startswith(field))\n"
+    "    except OSError:\n"
+    "        return 0.0\n"
+    "before = rss('VmRSS:')\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "print(time.perf_counter() - start, before, rss('VmHWM:'))\n"
+)
+
+
+class StubEngine:
+    """
+    确定性的检测 / 识别替身
+
+    检测：形态学梯度 + Otsu 二值化 + 横向闭运算 + 连通域，得到词级文本框；
+    识别：按识别模型的输入高度缩放每个文本框，根据墨迹分布生成固定文本。
+    相同输入总是得到相同输出。
+    """
+
+    name = "stub"
+    REC_HEIGHT = 48
+
+    def __init__(self):
+        self._gradient_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3))
+
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        # 形态学梯度对深色背景上的浅色文字同样有效
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, self._gradient_kernel)
+        _, ink = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        ink = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, self._kernel)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        x, y, w, h = stats[1:, 0], stats[1:, 1], stats[1:, 2], stats[1:, 3]
+        keep = (w >= 8) & (h >= 6) & (h < image.shape[0] / 4)
+        return np.column_stack([x, y, x + w, y + h])[keep].astype(np.int32)
+
+    def recognize(self, image: np.ndarray, boxes: np.ndarray):
+        texts, scores = [], []
+        for x1, y1, x2, y2 in boxes:
+            crop = image[y1:y2, x1:x2]
+            width = max(int(round(crop.shape[1] * self.REC_HEIGHT / crop.shape[0])), 1)
+            line = cv2.resize(crop, (width, self.REC_HEIGHT), interpolation=cv2.INTER_LINEAR)
+            profile = 255 - line.mean(axis=(0, 2)) if line.ndim == 3 else 255 - line.mean(axis=0)
+            texts.append(f"w{len(profile)}i{int(profile.sum()) % 9973}")
+            scores.append(round(float(profile.mean()) / 255, 4))
+        return texts, scores
+
+
+class PaddleStages:
+    """PaddleOCR 3.x 的独立检测 / 识别模块，分别计时"""
+
+    name = "paddle"
+
+    def __init__(self, detection_model: str, recognition_model: str):
+        from paddleocr import TextDetection, TextRecognition
+        self._det = TextDetection(model_name=detection_model)
+        self._rec = TextRecognition(model_name=recognition_model)
+
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        result = self._det.predict(image)[0]
+        polys = np.asarray(result['dt_polys']).reshape(-1, 4, 2)
+        if len(polys) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+        return np.concatenate([polys.min(axis=1), polys.max(axis=1)], axis=1).astype(np.int32)
+
+    def recognize(self, image: np.ndarray, boxes: np.ndarray):
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+        if not crops:
+            return [], []
+        results = self._rec.predict(crops)
+        return [r['rec_text'] for r in results], [float(r['rec_score']) for r in results]
+
+
+def _reset_peak_rss() -> bool:
+    """重置 Linux 的 VmHWM（峰值 RSS），不支持时返回 False"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _rss_mb() -> float:
+    """当前 RSS（仅 Linux，其它平台返回 0）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _peak_rss_mb() -> float:
+    """上次 _reset_peak_rss 以来的峰值 RSS（VmHWM，仅 Linux）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _rss_mb()
+
+
+def measure(func, *args):
+    """
+    执行 func(*args)
+
+    Returns:
+        tuple: (结果, 耗时 ms, RSS 增量 MB)，RSS 增量为执行期间的峰值减去开始时的 RSS
+    """
+    resettable = _reset_peak_rss()
+    before = _rss_mb()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    after = _peak_rss_mb() if resettable else _rss_mb()
+    return result, elapsed_ms, max(after - before, 0.0)
+
+
+class StageTimer:
+    """按 (阶段, 输入) 收集耗时与 RSS 增量"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.rss_deltas: Dict[str, float] = {}
+        self.record = True
+
+    def run(self, stage: str, label: str, func, *args):
+        result, elapsed_ms, rss_delta_mb = measure(func, *args)
+        self.add(stage, label, elapsed_ms, rss_delta_mb)
+        return result
+
+    def add(self, stage: str, label: str, elapsed_ms: float, rss_delta_mb: float):
+        """记录一个样本（RSS 增量取各次中的最大值）"""
+        if self.record:
+            key = f"{stage}[{label}]"
+            self.samples.setdefault(key, []).append(elapsed_ms)
+            self.rss_deltas[key] = max(self.rss_deltas.get(key, 0.0), rss_delta_mb)
+
+    def summary(self) -> Dict[str, dict]:
+        return {
+            key: {
+                'p50_ms': round(float(np.percentile(values, 50)), 3),
+                'p95_ms': round(float(np.percentile(values, 95)), 3),
+                'rss_delta_mb': round(self.rss_deltas[key], 1),
+                'samples': len(values)
+            }
+            for key, values in self.samples.items()
+        }
+
+
+def synthetic_pdf() -> bytes:
+    """生成一页 40 行 x 6 列的文本表格 PDF"""
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page(width=842, height=595)
+    for row in range(40):
+        for col in range(6):
+            text = "Item" if col == 0 else f"{(row * 7 + col * 13) % 1000:>4}.{col}"
+            page.insert_text((40 + col * 130, 40 + row * 13), f"{text} {row}", fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def large_pdf(min_bytes: int) -> bytes:
+    """生成不小于 min_bytes 的 PDF（每页一张难以压缩的噪声图）"""
+    import fitz
+    rng = np.random.default_rng(0)
+    doc = fitz.open()
+    while True:
+        page = doc.new_page(width=595, height=842)
+        noise = (rng.random((900, 700, 3)) * 60 + 195).astype(np.uint8)
+        _, buf = cv2.imencode(".jpg", noise, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        page.insert_image(page.rect, stream=buf.tobytes())
+        data = doc.tobytes()
+        if len(data) >= min_bytes:
+            doc.close()
+            return data
+
+
+def _handle_upload(pdf_bytes: bytes, chunk_size: int = 64 * 1024) -> int:
+    from utils.BodyReader import UPLOAD_SPOOL_BYTES, upload_content
+    from utils.PdfHelper import open_pdf
+
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    try:
+        for start in range(0, len(pdf_bytes), chunk_size):
+            spool.write(pdf_bytes[start:start + chunk_size])
+        content = upload_content(spool)
+    finally:
+        spool.close()
+    document = open_pdf(content)
+    try:
+        return document.page_count
+    finally:
+        document.close()
+
+
+def measure_upload(timer: StageTimer, label: str, pdf_bytes: bytes):
+    """一次上传的处理耗时与 RSS 增量"""
+    timer.run("upload", label, _handle_upload, pdf_bytes)
+
+
+def run_pdf(timer: StageTimer, engine, label: str, pdf_bytes: bytes):
+    """对一个 PDF 依次执行全部阶段"""
+    from routers.ocr import extract_ocr_data
+    from routers.pdf_ocr import reconstruct_table
+    from utils.ImageHelper import base64_to_bytes
+    from utils.PdfHelper import DEFAULT_ZOOM, open_pdf, pixmap_to_ndarray
+    import fitz
+
+    b64 = base64.b64encode(pdf_bytes).decode("ascii")
+    data = timer.run("base64_decode", label, base64_to_bytes, b64)
+    document = timer.run("pdf_open", label, open_pdf, data)
+    try:
+        matrix = fitz.Matrix(DEFAULT_ZOOM, DEFAULT_ZOOM)
+        for page in document:
+            image = timer.run("rasterize", label,
+                              lambda: pixmap_to_ndarray(page.get_pixmap(matrix=matrix, alpha=False)))
+            boxes = timer.run("detection", label, engine.detect, image)
+            texts, scores = timer.run("recognition", label, engine.recognize, image, boxes)
+            result = [{'res': {'input_path': '', 'rec_texts': texts, 'rec_scores': scores, 'rec_boxes': boxes}}]
+            extracted = timer.run("extract_ocr_data", label, extract_ocr_data, result)
+            timer.run("reconstruct_table", label, reconstruct_table, texts, boxes)
+            response = {'resultcode': 200, 'message': 'Success', 'data': extracted}
+            timer.run("json_serialize", label, lambda: json.dumps(response, ensure_ascii=False))
+    finally:
+        document.close()
+
+
+def measure_import(timer: StageTimer):
+    """在新解释器中测量 import main（重量级依赖应在首次使用时才导入）"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=REPO_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    seconds, before, after = output.strip().splitlines()[-1].split()
+    timer.add("import", "main", float(seconds) * 1000, max(float(after) - float(before), 0.0))
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """返回超出阈值的回退描述"""
+    regressions = []
+    for key, stats in sorted(current.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        p50, base_p50 = stats['p50_ms'], base['p50_ms']
+        if p50 > base_p50 * (1 + threshold) and p50 - base_p50 > MIN_REGRESSION_MS:
+            regressions.append(f"{key}: p50 {base_p50:.2f} -> {p50:.2f} ms (+{(p50 / base_p50 - 1) * 100:.0f}%)")
+        # 旧格式的基线记录的是进程峰值 RSS，不比较
+        rss, base_rss = stats['rss_delta_mb'], base.get('rss_delta_mb')
+        if base_rss is not None and rss > base_rss * (1 + threshold) and rss - base_rss > MIN_REGRESSION_RSS_MB:
+            regressions.append(f"{key}: RSS 增量 {base_rss:.1f} -> {rss:.1f} MB")
+    return regressions
+
+
+def print_table(current: Dict[str, dict], baseline: Dict[str, dict]):
+    print(f"{'阶段[输入]':<48}{'p50(ms)':>10}{'p95(ms)':>10}{'ΔRSS(MB)':>10}{'基线p50':>10}")
+    for key, stats in current.items():
+        base = baseline.get(key)
+        base_p50 = f"{base['p50_ms']:.2f}" if base else "-"
+        print(f"{key:<48}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['rss_delta_mb']:>10.1f}{base_p50:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线分阶段性能基准")
+    parser.add_argument("--engine", choices=("stub", "paddle"), default="stub", help="检测 / 识别引擎")
+    parser.add_argument("--detection-model", default=None, help="paddle 引擎的检测模型")
+    parser.add_argument("--recognition-model", default=None, help="paddle 引擎的识别模型")
+    parser.add_argument("--files", nargs="*", default=DEFAULT_FILES, help="PDF 文件（相对仓库根目录）")
+    parser.add_argument("--iterations", type=int, default=10, help="每个输入的测量次数")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的回退比例（0.25 = 25%%）")
+    parser.add_argument("--output", default=None, help="把本次结果另存为 JSON")
+    args = parser.parse_args()
+
+    detection_model, recognition_model = resolve_models(args.detection_model, args.recognition_model)
+    engine = StubEngine() if args.engine == "stub" else PaddleStages(detection_model, recognition_model)
+    # 经注册表取引擎的代码路径使用替身，基准中不加载模型
+    EngineRegistry.registry = EngineRegistry.EngineRegistry(factory=lambda det, rec: engine, prepare=None)
+
+    from bench_reconstruct_table import synthetic_page
+    from routers.pdf_ocr import reconstruct_table
+
+    inputs = [(name, open(os.path.join(REPO_DIR, name), "rb").read()) for name in args.files]
+    inputs.append(("synthetic_table", synthetic_pdf()))
+    from utils.BodyReader import UPLOAD_SPOOL_BYTES
+    large_upload = large_pdf(UPLOAD_SPOOL_BYTES * 2)
+    dense_texts, dense_boxes = synthetic_page(10000, 10)
+    dense_boxes = np.array(dense_boxes)
+
+    timer = StageTimer()
+    if not _reset_peak_rss():
+        print("注意：无法重置峰值 RSS，报告的是阶段结束与开始时的 RSS 之差")
+    for iteration in range(args.iterations + 1):
+        # 第一轮为预热，不计入统计
+        timer.record = iteration > 0
+        for label, pdf_bytes in inputs:
+            run_pdf(timer, engine, label, pdf_bytes)
+            measure_upload(timer, label, pdf_bytes)
+        measure_upload(timer, "large_upload", large_upload)
+        timer.run("reconstruct_table", "synthetic_10k", reconstruct_table, dense_texts, dense_boxes)
+        measure_import(timer)
+
+    current = timer.summary()
+    result = {
+        'meta': {
+            'engine': engine.name,
+            'detection_model': detection_model if args.engine == "paddle" else None,
+            'recognition_model': recognition_model if args.engine == "paddle" else None,
+            'iterations': args.iterations,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        'stages': current
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('engine') != engine.name:
+            print(f"基线使用的引擎为 {baseline['meta'].get('engine')}，与本次 ({engine.name}) 不同，跳过比较")
+            baseline = None
+
+    print_table(current, baseline['stages'] if baseline else {})
+
+    if baseline is None:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n已写入基线: {args.baseline}")
+        return 0
+
+    regressions = compare(current, baseline['stages'], args.threshold)
+    if regressions:
+        print(f"\n性能回退（阈值 {args.threshold * 100:.0f}%）:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\n与基线相比没有超过 {args.threshold * 100:.0f}% 的回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,53 @@
 # -*- coding: utf-8 -*-
 
+import time
+
+# 应用导入耗时（paddleocr、fitz、cv2 等重量级依赖在首次使用时才导入，见 utils.LazyImport）
+_import_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+
 # import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 # import uvicorn
-import yaml
 
 from models.RestfulModel import *
-from routers import ocr, pdf_ocr
+from routers import ocr, pdf_ocr, jobs
+from utils import Metrics
+from utils.BlockingExecutor import monitor_loop_lag
+from utils.EngineRegistry import registry
+from utils.HttpFetcher import close_fetcher
+from utils.ResultCache import result_cache
+from utils.UrlCache import url_cache
+from utils.Telemetry import RequestMetricsMiddleware, TimedJSONResponse
+from utils.Warmup import is_ready, start_warmup, warmup_status
 from utils.ImageHelper import *
+from utils.LazyImport import import_times, record_import
+
+record_import("main", time.perf_counter() - _import_started)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    启动阶段：后台预加载并预热 OCR_PRELOAD_MODELS 中的模型（完成前 /ready 返回 503），
+    拉起异步任务线程并恢复中断的任务，开始采样事件循环延迟
+    """
+    start_warmup()
+    jobs.start_job_runner()
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+    yield
+    lag_monitor.cancel()
+    await close_fetcher()
+
 
 app = FastAPI(title="Paddle OCR API",
-              description="基于 Paddle OCR 和 FastAPI 的自用接口")
+              description="基于 Paddle OCR 和 FastAPI 的自用接口",
+              default_response_class=TimedJSONResponse,
+              lifespan=lifespan)
 
 
 # 跨域设置
@@ -25,6 +61,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+# 请求耗时与进行中请求数（/metrics）
+app.add_middleware(RequestMetricsMiddleware)
 
 # Health check endpoint for Docker/Dokploy
 @app.get("/health", tags=["Health"])
@@ -39,7 +77,44 @@ async def health_check():
         "version": "3.x"
     }
 
+
+@app.get("/ready", tags=["Health"])
+async def readiness_check():
+    """
+    就绪探测：启动预热（模型预加载 + 一次预热识别）完成后返回 200，
+    之前（或预热失败时）返回 503。响应中包含各模型组合的加载与预热耗时。
+    """
+    state = warmup_status()
+    return JSONResponse(status_code=200 if is_ready() else 503, content=state)
+
+
+@app.get("/stats", tags=["Health"])
+async def runtime_stats():
+    """
+    运行时统计：已加载的 OCR 引擎、内存占用以及缓存命中/未命中/加载/淘汰计数，
+    识别结果缓存的命中率与节省的字节数，应用与各依赖的导入耗时
+    """
+    return {
+        "imports": import_times(),
+        "warmup": warmup_status(),
+        "engines": registry.stats(),
+        "result_cache": result_cache.stats(),
+        "url_cache": url_cache.stats(),
+        "metrics": Metrics.snapshot()
+    }
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Prometheus 文本格式的指标：按路由的请求耗时、按检测/识别模型的各阶段耗时
+    (decode / render / extract / ocr / postprocess / serialize)、页数与像素数、
+    引擎加载耗时与缓存命中、进行中请求数与攒批队列深度
+    """
+    return PlainTextResponse(Metrics.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(ocr.router)
 app.include_router(pdf_ocr.router)
+app.include_router(jobs.router)
 
 # uvicorn.run(app=app, host="0.0.0.0", port=8000)
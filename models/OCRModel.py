@@ -20,3 +20,8 @@ class PDFBase64PostModel(BaseModel):
     base64_str: str  # PDF base64字符串
     detection_model: Optional[str] = None  # 检测模型名称
     recognition_model: Optional[str] = None  # 识别模型名称
+    use_text_layer: Optional[bool] = None  # 是否优先使用PDF文本层（仅全文OCR接口，默认取 OCR_PDF_TEXT_LAYER）
+    use_vector_tables: Optional[bool] = None  # 是否优先使用矢量表格检测（仅表格接口，默认取 OCR_PDF_VECTOR_TABLES）
+    pages: Optional[str] = None  # 只处理这些页码，如 "1-3,10"
+    max_pages: Optional[int] = None  # 最多处理的页数
+    max_tables: Optional[int] = None  # 提取到这么多个表格后停止（仅表格接口）
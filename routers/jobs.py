@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+异步识别任务路由
+
+大文档同步识别会长时间占用 HTTP 连接，代理超时即前功尽弃。本模块提供：
+- POST /jobs: 提交 PDF 或图片，立即返回任务 ID
+- GET /jobs/{job_id}: 查询进度（已完成页数 / 总页数）
+- GET /jobs/{job_id}/result: 获取识别结果
+- POST /jobs/{job_id}/retry: 重试失败的任务
+
+任务由后台线程逐页处理，每页结果写入 SQLite 检查点（utils.JobStore），
+服务重启后未完成的任务从缺失的页码继续。识别失败的页面不写入检查点，
+任务标记为失败并在 error 中列出页码；重试时只重做这些页面。
+已完成或失败的任务在 OCR_JOB_RETENTION_HOURS 后连同输入文件一起删除。
+
+运行中的任务由心跳线程定期续约；心跳超过 OCR_JOB_LEASE_SECONDS 的任务
+（其进程已退出）才会被重新排队，不会抢走其它 worker 或副本正在处理的任务。
+
+可选的 webhook_url 会在任务完成或失败时收到一次 POST 通知；通知由单独的
+线程发送并重试，不占用任务线程。
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, UploadFile, status, Query
+
+from models.RestfulModel import *
+from routers.ocr import PDF_TEXT_LAYER, extract_ocr_data, iter_pdf_ocr_pages
+from routers.pdf_ocr import PDF_VECTOR_TABLES, extract_pdf_ocr_data, iter_pdf_tables
+from utils.BatchScheduler import predict
+from utils.BlockingExecutor import run_blocking
+from utils.ImageHelper import file_to_ndarray
+from utils.JobStore import JobStore, STATUS_DONE, STATUS_FAILED
+from utils.LazyImport import lazy_module
+from utils.PdfHelper import page_count
+from utils.ResultCache import cache_policy
+
+logger = logging.getLogger(__name__)
+
+# 仅回调通知时使用
+requests = lazy_module("requests")
+
+# 后台任务线程数
+JOB_WORKERS = max(int(os.environ.get("OCR_JOB_WORKERS", "1")), 1)
+
+IMAGE_SUFFIXES = (".jpg", ".png", ".jpeg", ".bmp", ".tiff")
+JOB_MODES = ("ocr", "table")
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+_runner_lock = threading.Lock()
+_workers = []
+_wakeup = threading.Event()
+# 待发送的 webhook 通知：(发送时间, 地址, 内容, 已尝试次数)
+_webhooks = queue.Queue()
+WEBHOOK_ATTEMPTS = 3
+# 过期任务的清理间隔（秒）
+PURGE_INTERVAL = 3600
+
+
+def get_job_store() -> JobStore:
+    """获取全局任务存储（首次调用时创建数据库）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def start_job_runner():
+    """启动后台任务线程、心跳线程与 webhook 通知线程，并把已失去心跳的任务重新排队"""
+    with _runner_lock:
+        if not _workers:
+            store = get_job_store()
+            _requeue_stale(store)
+            for i in range(JOB_WORKERS):
+                worker = threading.Thread(target=_worker_loop, name=f"ocr-job-{i}", daemon=True)
+                worker.start()
+                _workers.append(worker)
+            for target, name in ((_lease_loop, "ocr-job-lease"), (_webhook_loop, "ocr-job-webhook")):
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                _workers.append(thread)
+    # 唤醒空闲的任务线程
+    _wakeup.set()
+
+
+def _requeue_stale(store: JobStore):
+    resumed = store.requeue_stale()
+    if resumed:
+        logger.info("恢复 %d 个未完成的识别任务", resumed)
+        _wakeup.set()
+
+
+def _lease_loop():
+    """为本进程的运行中任务续约，回收其它进程遗留的过期任务，并定期删除超过保留期的任务"""
+    store = get_job_store()
+    interval = store.lease_seconds / 3
+    next_purge = time.monotonic()
+    while True:
+        if time.monotonic() >= next_purge:
+            next_purge = time.monotonic() + PURGE_INTERVAL
+            try:
+                purged = store.purge_expired()
+                if purged:
+                    logger.info("删除 %d 个超过保留期的识别任务", purged)
+            except Exception:
+                logger.exception("清理过期任务失败")
+        time.sleep(interval)
+        try:
+            store.heartbeat()
+            _requeue_stale(store)
+        except Exception:
+            logger.exception("任务心跳更新失败")
+
+
+def _worker_loop():
+    store = get_job_store()
+    while True:
+        _wakeup.clear()
+        job = store.claim_next()
+        if job is None:
+            _wakeup.wait(timeout=5)
+            continue
+        _run_job(store, job)
+
+
+def _run_job(store: JobStore, job: dict):
+    """处理单个任务，已写入检查点的页面直接跳过"""
+    job_id = job['id']
+    detection_model = job['detection_model']
+    recognition_model = job['recognition_model']
+    try:
+        done = store.completed_pages(job_id)
+        failed = {}
+        if job['kind'] == 'pdf':
+            total = page_count(job['input_path'])
+            store.update(job_id, total_pages=total)
+            remaining = [p for p in range(1, total + 1) if p not in done]
+            if remaining and job['mode'] == 'table':
+                for page_num, page_data in iter_pdf_tables(
+                        job['input_path'], detection_model, recognition_model, pages=remaining,
+                        page_cache=cache_policy(None), vector_tables=PDF_VECTOR_TABLES):
+                    store.save_page(job_id, page_num, page_data)
+            elif remaining:
+                for page_data in iter_pdf_ocr_pages(
+                        job['input_path'], detection_model, recognition_model, pages=remaining,
+                        page_cache=cache_policy(None), text_layer=PDF_TEXT_LAYER):
+                    # 失败的页面不写入检查点，重试时会再次识别
+                    if 'error' in page_data:
+                        failed[page_data['page']] = page_data['error']
+                    else:
+                        store.save_page(job_id, page_data['page'], page_data)
+        else:
+            store.update(job_id, total_pages=1)
+            if 1 not in done:
+                with open(job['input_path'], 'rb') as f:
+                    result = predict(file_to_ndarray(f), detection_model, recognition_model)
+                if job['mode'] == 'table':
+                    page_data = extract_pdf_ocr_data(result, 1)
+                else:
+                    page_data = extract_ocr_data(result)[0]
+                    page_data['page'] = 1
+                store.save_page(job_id, 1, page_data)
+
+        if failed:
+            pages = ", ".join(str(p) for p in sorted(failed))
+            first = failed[min(failed)]
+            finished = store.finish(job_id, STATUS_FAILED, error=f"第 {pages} 页识别失败: {first}")
+        else:
+            finished = store.finish(job_id, STATUS_DONE)
+            if finished:
+                try:
+                    os.unlink(job['input_path'])
+                except Exception:
+                    pass
+    except Exception as e:
+        logger.exception("识别任务 %s 失败", job_id)
+        finished = store.finish(job_id, STATUS_FAILED, error=str(e))
+
+    if not finished:
+        # 租约已过期，任务被重新排队并由其它线程或进程接手，由接手方负责结束与通知
+        logger.warning("识别任务 %s 的租约已过期，放弃本次结果", job_id)
+        return
+    if job['webhook_url']:
+        _webhooks.put((time.monotonic(), job['webhook_url'], _job_status(store.get(job_id)), 0))
+
+
+def _webhook_loop():
+    """发送 webhook 通知，失败后按 1、2、4 秒退避重试，等待期间不阻塞其它通知"""
+    pending = []
+    while True:
+        timeout = max(pending[0][0] - time.monotonic(), 0) if pending else None
+        try:
+            pending.append(_webhooks.get(timeout=timeout))
+        except queue.Empty:
+            pass
+        pending.sort(key=lambda item: item[0])
+        now = time.monotonic()
+        while pending and pending[0][0] <= now:
+            _, url, payload, attempt = pending.pop(0)
+            if not _notify_webhook(url, payload, attempt) and attempt + 1 < WEBHOOK_ATTEMPTS:
+                pending.append((time.monotonic() + 2 ** attempt, url, payload, attempt + 1))
+            pending.sort(key=lambda item: item[0])
+
+
+def _notify_webhook(url: str, payload: dict, attempt: int) -> bool:
+    try:
+        response = requests.post(url, json=payload, timeout=10)
+        response.raise_for_status()
+        return True
+    except Exception as e:
+        logger.warning("任务 %s 的 webhook 通知失败（第 %d 次）: %s", payload['job_id'], attempt + 1, e)
+        return False
+
+
+def _job_status(job: dict) -> dict:
+    total = job['total_pages']
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'kind': job['kind'],
+        'mode': job['mode'],
+        'filename': job['filename'],
+        'total_pages': total,
+        'done_pages': job['done_pages'],
+        'progress': round(job['done_pages'] / total, 4) if total else 0.0,
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+
+
+# 创建路由器，所有接口前缀为 /jobs；后台任务线程在应用启动（main.lifespan）时拉起
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.post('', response_model=RestfulModel, status_code=status.HTTP_202_ACCEPTED, summary="提交异步识别任务")
+async def create_job(
+    file: UploadFile,
+    mode: str = Query("ocr", description="ocr: 全文识别; table: 表格提取"),
+    detection_model: Optional[str] = Query(None, description="检测模型"),
+    recognition_model: Optional[str] = Query(None, description="识别模型"),
+    webhook_url: Optional[str] = Query(None, description="任务完成或失败时 POST 通知的地址（可选）")
+):
+    """
+    提交 PDF 或图片作为后台任务，立即返回任务 ID
+
+    使用示例：
+        curl -X POST "http://localhost:8000/jobs?mode=table" -F "file=@document.pdf"
+        curl "http://localhost:8000/jobs/<job_id>"
+        curl "http://localhost:8000/jobs/<job_id>/result"
+    """
+    filename = file.filename or ""
+    suffix = os.path.splitext(filename.lower())[1]
+    if suffix == ".pdf":
+        kind = "pdf"
+    elif suffix in IMAGE_SUFFIXES:
+        kind = "image"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请上传 PDF 或支持的图片格式 (.pdf, .jpg, .png, .jpeg, .bmp, .tiff)"
+        )
+    if mode not in JOB_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"mode 必须是 {', '.join(JOB_MODES)} 之一"
+        )
+
+    store = await run_blocking(get_job_store)
+    job_id = store.new_job_id()
+    input_path = store.new_input_path(job_id, suffix)
+    f = await run_blocking(open, input_path, 'wb')
+    try:
+        while True:
+            chunk = await file.read(1024 * 1024)
+            if not chunk:
+                break
+            await run_blocking(f.write, chunk)
+    finally:
+        await run_blocking(f.close)
+
+    job = await run_blocking(store.create, job_id, kind, mode, input_path, filename=filename,
+                             detection_model=detection_model, recognition_model=recognition_model,
+                             webhook_url=webhook_url)
+    start_job_runner()
+
+    return RestfulModel(resultcode=202, message="Accepted", data=[_job_status(job)])
+
+
+@router.get('/{job_id}', response_model=RestfulModel, summary="查询任务进度")
+async def get_job(job_id: str):
+    store = await run_blocking(get_job_store)
+    job = await run_blocking(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+    return RestfulModel(resultcode=200, message=job['status'], data=[_job_status(job)])
+
+
+@router.get('/{job_id}/result', response_model=RestfulModel, summary="获取任务结果")
+async def get_job_result(job_id: str):
+    """
+    获取已完成任务的结果
+
+    mode=ocr 时返回每页的全文识别结果；mode=table 时只返回包含表格的页面，
+    格式与 /ocr/pdf-predict-by-file、/pdf/predict-by-file 一致。
+    """
+    store = await run_blocking(get_job_store)
+    job = await run_blocking(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+    if job['status'] == STATUS_FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"任务失败: {job['error']}"
+        )
+    if job['status'] != STATUS_DONE:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"任务尚未完成: {job['done_pages']}/{job['total_pages'] or '?'} 页"
+        )
+
+    results = [page_data for page_data in await run_blocking(store.results, job_id) if page_data is not None]
+    if job['mode'] == 'table':
+        message = f"Success: 提取到 {len(results)} 个表格"
+    else:
+        message = f"Success: 处理了 {job['total_pages']} 页"
+    return RestfulModel(resultcode=200, message=message, data=results)
+
+
+@router.post('/{job_id}/retry', response_model=RestfulModel, status_code=status.HTTP_202_ACCEPTED,
+             summary="重试失败的任务")
+async def retry_job(job_id: str):
+    """
+    把失败的任务重新排队，已完成的页面直接沿用检查点，只重做失败或未完成的页面
+
+    使用示例：
+        curl -X POST "http://localhost:8000/jobs/<job_id>/retry"
+    """
+    store = await run_blocking(get_job_store)
+    job = await run_blocking(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+    if not await run_blocking(os.path.exists, job['input_path']):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="任务的输入文件已不存在，请重新提交")
+    if not await run_blocking(store.requeue, job_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"只能重试失败的任务，当前状态: {job['status']}"
+        )
+    start_job_runner()
+
+    job = await run_blocking(store.get, job_id)
+    return RestfulModel(resultcode=202, message="Accepted", data=[_job_status(job)])
@@ -1,28 +1,34 @@
 # -*- coding: utf-8 -*-
 
-from fastapi import APIRouter, HTTPException, UploadFile, status, Query
+from fastapi import APIRouter, HTTPException, Request, UploadFile, status, Query
 from models.OCRModel import *
 from models.RestfulModel import *
-from paddleocr import PaddleOCR
-from utils.ImageHelper import base64_to_ndarray, bytes_to_ndarray
-import requests
+from utils.BatchScheduler import page_elapsed_ms, predict, predict_async, predict_pages
+from utils.BlockingExecutor import run_blocking
+from utils.BodyReader import BodyTooLarge, decode_base64, media_type, read_body, upload_content
+from utils.EngineRegistry import get_engine
+from utils.HttpFetcher import DownloadTooLarge, FetchError
+from utils.ImageHelper import base64_to_bytes, bytes_to_ndarray
+from utils.PdfHelper import RENDER_SETTINGS, PageLimitExceeded, pdf_to_images, select_pages, to_coordinate_space
+from utils.ResultCache import cache_policy, lookup_request, result_cache
+from utils.StreamHelper import negotiate_stream, stream_records
+from utils.Telemetry import bind_request_models, count_pdf_page, model_labels, observe_stage, stage_timer
+from utils.UrlCache import ContentRequired, url_cache
 import os
-import tempfile
 import numpy as np
 from typing import Optional
-import fitz  # PyMuPDF - para processar PDF
-import base64
-
-OCR_LANGUAGE = os.environ.get("OCR_LANGUAGE", "ch")
 
 router = APIRouter(prefix="/ocr", tags=["OCR"])
 
-# Cache for OCR instances with different model configurations
-_ocr_instances = {}
+# PDF 全文识别默认是否优先使用文本层（请求参数 use_text_layer 可覆盖）
+PDF_TEXT_LAYER = os.environ.get("OCR_PDF_TEXT_LAYER", "0") == "1"
+
 
 def get_ocr_instance(detection_model: Optional[str] = None, recognition_model: Optional[str] = None):
     """
     获取或创建 PaddleOCR 实例（支持模型选择）
+
+    实例由 utils.EngineRegistry 统一管理，与 /pdf 路由共享
     
     Args:
         detection_model: 检测模型名称 (默认: PP-OCRv5_server_det)
@@ -44,37 +50,9 @@ def get_ocr_instance(detection_model: Optional[str] = None, recognition_model: O
     Returns:
         PaddleOCR: OCR 实例
     """
-    # 使用默认模型 - Server 版本更准确
-    if not detection_model:
-        detection_model = "PP-OCRv5_server_det"
-    if not recognition_model:
-        recognition_model = "PP-OCRv5_server_rec"
-    
-    # 创建缓存键
-    cache_key = f"{detection_model}_{recognition_model}_{OCR_LANGUAGE}"
-    
-    # 如果实例已存在，直接返回
-    if cache_key in _ocr_instances:
-        return _ocr_instances[cache_key]
-    
-    # 创建新实例
-    ocr_instance = PaddleOCR(
-        text_detection_model_name=detection_model,
-        text_recognition_model_name=recognition_model,
-        use_angle_cls=True,
-        use_doc_orientation_classify=False,
-        use_doc_unwarping=False,
-        lang=OCR_LANGUAGE
-    )
-    
-    # 缓存实例
-    _ocr_instances[cache_key] = ocr_instance
-    
-    return ocr_instance
+    return get_engine(detection_model, recognition_model)
 
 
-# 保持向后兼容性 - 默认实例
-ocr = get_ocr_instance()
 def _np_to_list(value):
     """仅把需要的 numpy 数组转换为 Python list，其它类型原样返回。"""
     if isinstance(value, np.ndarray):
@@ -162,79 +140,208 @@ def extract_ocr_data(result):
 
 
 @router.get('/predict-by-path', response_model=RestfulModel, summary="识别本地图片")
-def predict_by_path(
+async def predict_by_path(
     image_path: str,
     detection_model: Optional[str] = Query(None, description="检测模型 (PP-OCRv5_mobile_det, PP-OCRv5_server_det, PP-OCRv4_mobile_det, PP-OCRv4_server_det)"),
     recognition_model: Optional[str] = Query(None, description="识别模型 (PP-OCRv5_mobile_rec, PP-OCRv5_server_rec, PP-OCRv4_mobile_rec, PP-OCRv4_server_rec)")
 ):
-    ocr_instance = get_ocr_instance(detection_model, recognition_model)
-    result = ocr_instance.predict(input=image_path)
+    labels = bind_request_models(detection_model, recognition_model)
+    result = await predict_async(image_path, detection_model, recognition_model)
     # 提取关键数据：input_path, rec_texts, rec_boxes
-    result_data = extract_ocr_data(result)
+    with stage_timer('postprocess', labels):
+        result_data = extract_ocr_data(result)
     restfulModel = RestfulModel(
         resultcode=200, message="Success", data=result_data, cls=OCRModel)
     return restfulModel
 
 
-@router.post('/predict-by-base64', response_model=RestfulModel, summary="识别 Base64 数据")
-def predict_by_base64(base64model: Base64PostModel):
-    img = base64_to_ndarray(base64model.base64_str)
-    
-    # 保存为临时文件，因为predict方法需要文件路径
-    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-        import cv2
-        cv2.imwrite(tmp_file.name, img)
-        tmp_file_path = tmp_file.name
-    
+def _ocr_image_bytes(request: Request, img_bytes, detection_model: Optional[str],
+                     recognition_model: Optional[str], digest: Optional[str] = None):
+    """
+    识别图片字节（先查结果缓存），返回 extract_ocr_data 结构
+
+    img_bytes 为 None（URL 内容未变，只有摘要 digest）且缓存未命中时抛出 ContentRequired
+    """
+    labels = bind_request_models(detection_model, recognition_model)
+    key, result_data = lookup_request(request, 'ocr', img_bytes, detection_model, recognition_model,
+                                      digest=digest)
+    if result_data is not None:
+        return result_data
+    if img_bytes is None:
+        raise ContentRequired()
+    # 解码后的数组直接送入引擎，不落盘
+    with stage_timer('decode', labels):
+        img = bytes_to_ndarray(img_bytes)
+    result = predict(img, detection_model, recognition_model)
+    # 提取关键数据：input_path, rec_texts, rec_boxes
+    with stage_timer('postprocess', labels):
+        result_data = extract_ocr_data(result)
+    if key:
+        result_cache.put(key, result_data)
+    return result_data
+
+
+async def fetch_url(request: Request, url: str, labels: dict, error_prefix: str, describe=None,
+                    revalidate: bool = True):
+    """
+    经 URL 缓存获取内容（见 UrlCache），超过大小上限返回 413，下载失败返回 400
+
+    请求要求跳过结果缓存时也跳过 URL 缓存，总是完整下载。
+    """
+    lookup, _ = cache_policy(request)
     try:
-        ocr_instance = get_ocr_instance(base64model.detection_model, base64model.recognition_model)
-        result = ocr_instance.predict(input=tmp_file_path)
-    finally:
-        # 删除临时文件
+        return await url_cache.fetch(url, labels, describe=describe, revalidate=revalidate and lookup)
+    except FetchError as e:
+        raise fetch_http_error(e, error_prefix)
+
+
+def fetch_http_error(e: FetchError, error_prefix: str) -> HTTPException:
+    """下载错误对应的 HTTPException：超过大小上限为 413，其余为 400"""
+    if isinstance(e, DownloadTooLarge):
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"{error_prefix}: {str(e)}"
+        )
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"{error_prefix}: {str(e)}"
+    )
+
+
+async def url_response(request: Request, url: str, labels: dict, error_prefix: str, process, describe=None):
+    """
+    获取 URL 内容并在阻塞任务线程池中执行 process(fetched)
+
+    URL 内容未变时 fetched.content 为 None，process 按 fetched.digest 查结果缓存；
+    未命中时 process 抛出 ContentRequired，此处完整下载后再执行一次。
+    """
+    fetched = await fetch_url(request, url, labels, error_prefix, describe)
+    if fetched.content is None:
         try:
-            os.unlink(tmp_file_path)
-        except Exception:
-            pass
-    
-    # 提取关键数据：input_path, rec_texts, rec_boxes
-    result_data = extract_ocr_data(result)
+            return await run_blocking(process, fetched)
+        except ContentRequired:
+            fetched = await fetch_url(request, url, labels, error_prefix, describe, revalidate=False)
+    return await run_blocking(process, fetched)
+
+
+# 原始请求体接口接受的 Content-Type（前缀匹配）；text/plain 请求体视为 Base64 文本
+IMAGE_MEDIA_TYPES = ('application/octet-stream', 'image/')
+PDF_MEDIA_TYPES = ('application/octet-stream', 'application/pdf')
+
+
+async def read_request_body(request: Request, accepted: tuple, labels: dict):
+    """
+    读取原始请求体（见 BodyReader），未声明 Content-Type 时按 application/octet-stream 处理
+
+    Raises:
+        HTTPException: Content-Type 不支持 (415)、超过 OCR_UPLOAD_MAX_MB (413)、
+                       请求体为空或 Base64 无效 (400)
+    """
+    content_type = media_type(request) or 'application/octet-stream'
+    base64_encoded = content_type == 'text/plain'
+    if not base64_encoded and not content_type.startswith(accepted):
+        expected = ', '.join(t + '*' if t.endswith('/') else t for t in accepted)
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"不支持的 Content-Type: {content_type}，请发送 {expected} 或 text/plain（Base64）"
+        )
+    try:
+        return await read_body(request, labels, base64_encoded=base64_encoded)
+    except BodyTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+def _ocr_base64(request: Request, base64model: Base64PostModel):
+    with stage_timer('decode', bind_request_models(base64model.detection_model, base64model.recognition_model)):
+        img_bytes = base64_to_bytes(base64model.base64_str)
+    return _ocr_image_bytes(request, img_bytes, base64model.detection_model, base64model.recognition_model)
+
+
+@router.post('/predict-by-base64', response_model=RestfulModel, summary="识别 Base64 数据")
+async def predict_by_base64(request: Request, base64model: Base64PostModel):
+    """
+    相同图片与模型组合的识别结果会被缓存，
+    请求头 X-OCR-Cache: bypass 或 Cache-Control: no-cache 可跳过缓存
+    """
+    try:
+        result_data = await run_blocking(_ocr_base64, request, base64model)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
     restfulModel = RestfulModel(
         resultcode=200, message="Success", data=result_data, cls=OCRModel)
     return restfulModel
 
 
+@router.post('/predict-by-bytes', response_model=RestfulModel, summary="识别原始图片数据")
+async def predict_by_bytes(
+    request: Request,
+    detection_model: Optional[str] = Query(None, description="检测模型"),
+    recognition_model: Optional[str] = Query(None, description="识别模型")
+):
+    """
+    请求体直接为图片数据（Content-Type: application/octet-stream 或 image/*），
+    模型通过查询参数选择；与 /ocr/predict-by-base64 相比没有 Base64 膨胀与 JSON 解析。
+    仍需发送 Base64 时使用 text/plain 请求体，服务端边接收边解码。
+
+    请求体大小上限为 OCR_UPLOAD_MAX_MB，超出返回 413；识别结果同样会被缓存。
+
+    示例：
+        curl -X POST "http://localhost:8000/ocr/predict-by-bytes" \\
+             -H "Content-Type: image/png" --data-binary @test.png
+    """
+    labels = bind_request_models(detection_model, recognition_model)
+    img_bytes = await read_request_body(request, IMAGE_MEDIA_TYPES, labels)
+    try:
+        result_data = await run_blocking(_ocr_image_bytes, request, img_bytes,
+                                         detection_model, recognition_model)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    restfulModel = RestfulModel(
+        resultcode=200, message="Success", data=result_data)
+    return restfulModel
+
+
 @router.post('/predict-by-file', response_model=RestfulModel, summary="识别上传文件")
 async def predict_by_file(
+    request: Request,
     file: UploadFile,
     detection_model: Optional[str] = Query(None, description="检测模型"),
     recognition_model: Optional[str] = Query(None, description="识别模型")
 ):
+    """
+    相同图片与模型组合的识别结果会被缓存，
+    请求头 X-OCR-Cache: bypass 或 Cache-Control: no-cache 可跳过缓存
+    """
+    bind_request_models(detection_model, recognition_model)
     restfulModel: RestfulModel = RestfulModel()
     if file.filename.endswith((".jpg", ".png", ".jpeg", ".bmp", ".tiff")):  # 支持更多图片格式
         restfulModel.resultcode = 200
         restfulModel.message = file.filename
-        file_data = file.file
-        file_bytes = file_data.read()
-        
-        # 保存为临时文件
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-            tmp_file.write(file_bytes)
-            tmp_file.flush()
-            tmp_file_path = tmp_file.name
-        
+        # 上传内容的只读视图（与上传文件共享或 mmap），不依赖线程局部缓冲区
+        img_bytes = await run_blocking(upload_content, file.file)
         try:
-            ocr_instance = get_ocr_instance(detection_model, recognition_model)
-            result = ocr_instance.predict(input=tmp_file_path)
-        finally:
-            # 删除临时文件
-            try:
-                os.unlink(tmp_file_path)
-            except Exception:
-                pass
-        
-        # 提取关键数据：input_path, rec_texts, rec_boxes
-        result_data = extract_ocr_data(result)
-        restfulModel.data = result_data
+            restfulModel.data = await run_blocking(_ocr_image_bytes, request, img_bytes,
+                                                   detection_model, recognition_model)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{file.filename}: {e}"
+            )
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -245,55 +352,240 @@ async def predict_by_file(
 
 @router.get('/predict-by-url', response_model=RestfulModel, summary="识别图片 URL")
 async def predict_by_url(
+    request: Request,
     imageUrl: str,
     detection_model: Optional[str] = Query(None, description="检测模型"),
     recognition_model: Optional[str] = Query(None, description="识别模型")
 ):
-    # 直接使用URL进行predict
-    ocr_instance = get_ocr_instance(detection_model, recognition_model)
-    result = ocr_instance.predict(input=imageUrl)
-    # 提取关键数据：input_path, rec_texts, rec_boxes
-    result_data = extract_ocr_data(result)
+    """
+    图片由服务端共享的 HTTP 客户端下载（连接复用，大小上限 OCR_FETCH_MAX_MB），
+    之后与上传文件一样解码识别，结果同样会被缓存。
+
+    重复请求同一 URL 时先发送条件请求（ETag / Last-Modified），源站返回 304
+    且结果已缓存时既不下载也不识别（见 OCR_URL_CACHE_TTL）。
+    """
+    labels = bind_request_models(detection_model, recognition_model)
+
+    def process(fetched):
+        return _ocr_image_bytes(request, fetched.content, detection_model, recognition_model,
+                                digest=fetched.digest)
+
+    try:
+        result_data = await url_response(request, imageUrl, labels, "无法下载图片", process)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{imageUrl}: {e}"
+        )
     restfulModel = RestfulModel(
         resultcode=200, message="Success", data=result_data)
     return restfulModel
 
 
-def pdf_to_images(pdf_path: str):
+def _observe_page(img_info: dict, labels: dict):
+    """记录单页的来源与渲染（或直接提取）耗时"""
+    count_pdf_page(img_info['source'], labels)
+    stage = 'render' if img_info['source'] == 'ocr' else 'extract'
+    observe_stage(stage, img_info.get('render_ms', 0.0) / 1000, labels)
+
+
+def iter_pdf_ocr_pages(pdf_source, detection_model: Optional[str] = None, recognition_model: Optional[str] = None,
+                       pages=None, page_cache=(False, False), text_layer: bool = False):
     """
-    将 PDF 文档的每一页转换为图像，用于 OCR 处理
-    
+    逐页识别 PDF 全文（生成器），每页处理完立即产出
+
     Args:
-        pdf_path: PDF 文件路径
-    
+        pdf_source: PDF 文件路径或字节内容
+        detection_model: 检测模型（可选）
+        recognition_model: 识别模型（可选）
+        pages: 只识别这些页码（从 1 开始），None 表示全部页面
+        page_cache: (lookup, store)，按页像素指纹查找、写入识别结果缓存
+        text_layer: 文本层可用的页面直接读取文本与坐标，不渲染、不识别
+
+    Yields:
+        dict: 单页结果 {'page': int, 'input_path', 'rec_texts', 'rec_boxes',
+              'page_width', 'page_height', 'zoom',
+              'source': 'text_layer' | 'ocr', 'from_cache': bool, 'elapsed_ms': float}，
+              识别失败的页面包含 'error' 字段
+
+    坐标：rec_boxes 统一位于坐标空间（PDF 点 × 2，见 utils.PdfHelper），
+    与实际渲染倍率 zoom 无关；page_width / page_height 为同一坐标空间中的页面尺寸。
+    """
+    labels = model_labels(detection_model, recognition_model)
+    # 逐页渲染为内存图像并进行 OCR 识别（启用工作池时多页并行）
+    images = pdf_to_images(pdf_source, pages=pages, fingerprint=any(page_cache), text_layer=text_layer)
+    for img_info, future in predict_pages(images, detection_model, recognition_model, page_cache=page_cache):
+        _observe_page(img_info, labels)
+        try:
+            result = future.result()
+            with stage_timer('postprocess', labels):
+                page_data = extract_ocr_data(result)
+        except Exception as e:
+            # 即使某页失败，也继续处理其他页
+            yield {
+                'page': img_info['page_num'],
+                'error': str(e),
+                'rec_texts': [],
+                'rec_boxes': [],
+                'page_width': img_info['page_width'],
+                'page_height': img_info['page_height'],
+                'zoom': img_info['zoom'],
+                'source': img_info['source'],
+                'from_cache': False,
+                'elapsed_ms': page_elapsed_ms(img_info)
+            }
+            continue
+
+        # 添加页码、页面尺寸、来源与耗时信息，坐标统一换算到坐标空间
+        if page_data and len(page_data) > 0:
+            page_data[0]['page'] = img_info['page_num']
+            page_data[0]['rec_boxes'] = to_coordinate_space(page_data[0]['rec_boxes'], img_info['scale'])
+            page_data[0]['page_width'] = img_info['page_width']
+            page_data[0]['page_height'] = img_info['page_height']
+            page_data[0]['zoom'] = img_info['zoom']
+            page_data[0]['source'] = img_info['source']
+            page_data[0]['from_cache'] = img_info['from_cache']
+            page_data[0]['elapsed_ms'] = page_elapsed_ms(img_info)
+            yield from page_data
+
+
+def select_pdf_pages(pdf_content: Optional[bytes], pages: Optional[str] = None, max_pages: Optional[int] = None,
+                     total: Optional[int] = None):
+    """
+    在任何渲染/识别之前确定要处理的页码（只读取页数）
+
+    Args:
+        total: 已知的总页数（如 URL 缓存记录的），pdf_content 为 None 时必须给出，
+               否则抛出 ContentRequired
+
     Returns:
-        list: 包含每页图像信息的列表 [{'page_num': int, 'path': str}, ...]
+        tuple: (page_nums, variant)，page_nums 为 None 表示处理全部页面；
+               variant 用于区分不同页码选择与渲染设置（PdfHelper.RENDER_SETTINGS）的结果缓存
+
+    Raises:
+        HTTPException: 页码参数无效 (400)、页数超过 OCR_PDF_MAX_PAGES (413) 或 PDF 无法解析 (500)
     """
-    temp_files = []
-    pdf_document = fitz.open(pdf_path)
-    
-    for page_num in range(len(pdf_document)):
-        page = pdf_document[page_num]
-        mat = fitz.Matrix(2.0, 2.0)  # 2倍放大提高识别率
-        pix = page.get_pixmap(matrix=mat)
-        
-        # 保存为临时图像文件
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_img:
-            pix.save(tmp_img.name)
-            temp_files.append({
-                'page_num': page_num + 1,
-                'path': tmp_img.name
-            })
-    
-    pdf_document.close()
-    return temp_files
+    if pdf_content is None and total is None:
+        raise ContentRequired()
+    try:
+        page_nums, total = select_pages(pdf_content, pages, max_pages, total=total)
+    except PageLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"PDF识别失败: {str(e)}"
+        )
+    render = "render=" + ",".join(str(value) for value in RENDER_SETTINGS)
+    if len(page_nums) == total:
+        return None, render
+    return page_nums, ",".join(str(p) for p in page_nums) + "|" + render
+
+
+def _pdf_ocr_response(request: Request, pdf_content: bytes, detection_model: Optional[str],
+                      recognition_model: Optional[str], message_prefix: str,
+                      use_text_layer: Optional[bool] = None, pages: Optional[str] = None,
+                      max_pages: Optional[int] = None):
+    """
+    识别 PDF 内容并生成响应
+
+    相同 PDF 与模型组合的结果会被缓存（所有页面均识别成功时才写入），
+    修订版文档中未改动的页面按页复用缓存结果（页面记录的 from_cache 为 true）。
+    请求头 X-OCR-Cache: bypass 或 Cache-Control: no-cache 可跳过缓存。
+
+    use_text_layer 为 True（None 时取 OCR_PDF_TEXT_LAYER）时，带文本层的页面
+    直接返回文本层内容（source 为 text_layer），只有扫描页交给 OCR。
+
+    pages（如 "1-3,10"）与 max_pages 限定要处理的页面，未选中的页面不会被渲染。
+
+    请求头 Accept 为 application/x-ndjson 或 text/event-stream 时逐页流式返回，
+    最后发送 summary 记录；否则返回完整的 RestfulModel。
+    """
+    bind_request_models(detection_model, recognition_model)
+    page_nums, variant = select_pdf_pages(pdf_content, pages, max_pages)
+    text_layer = PDF_TEXT_LAYER if use_text_layer is None else use_text_layer
+    page_cache = cache_policy(request)
+    key, cached = lookup_request(request, 'pdf_ocr_text_layer' if text_layer else 'pdf_ocr', pdf_content,
+                                 detection_model, recognition_model, variant)
+
+    def page_records():
+        if cached is not None:
+            for page_data in cached:
+                page_data['from_cache'] = True
+                page_data['elapsed_ms'] = 0.0
+                yield page_data
+            return
+        # 直接从内容渲染（见 upload_content），不另存临时文件
+        collected = []
+        for page_data in iter_pdf_ocr_pages(pdf_content, detection_model, recognition_model,
+                                            pages=page_nums, page_cache=page_cache, text_layer=text_layer):
+            collected.append(page_data)
+            yield page_data
+        if key and not any('error' in page_data for page_data in collected):
+            result_cache.put(key, collected)
+
+    media_type = negotiate_stream(request)
+    if media_type:
+        def records():
+            seen_pages = set()
+            cached_pages = set()
+            text_layer_pages = set()
+            elapsed_ms = 0.0
+            for page_data in page_records():
+                seen_pages.add(page_data['page'])
+                if page_data.get('from_cache'):
+                    cached_pages.add(page_data['page'])
+                if page_data.get('source') == 'text_layer':
+                    text_layer_pages.add(page_data['page'])
+                elapsed_ms += page_data.get('elapsed_ms', 0.0)
+                yield 'page', page_data
+            yield 'summary', {
+                'resultcode': 200,
+                'message': f"{message_prefix}处理了 {len(seen_pages)} 页",
+                'total_pages': len(seen_pages),
+                'cached_pages': len(cached_pages),
+                'text_layer_pages': len(text_layer_pages),
+                'ocr_pages': len(seen_pages - text_layer_pages),
+                'elapsed_ms': round(elapsed_ms, 2)
+            }
+
+        return stream_records(records(), media_type)
+
+    try:
+        all_results = list(page_records())
+        page_count = len({page_data['page'] for page_data in all_results})
+
+        restfulModel = RestfulModel(
+            resultcode=200,
+            message=f"{message_prefix}处理了 {page_count} 页",
+            data=all_results
+        )
+        return restfulModel
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"PDF识别失败: {str(e)}"
+        )
 
 
 @router.post('/pdf-predict-by-file', response_model=RestfulModel, summary="识别上传的PDF文件（全文OCR）")
 async def pdf_predict_by_file(
+    request: Request,
     file: UploadFile,
     detection_model: Optional[str] = Query(None, description="检测模型"),
-    recognition_model: Optional[str] = Query(None, description="识别模型")
+    recognition_model: Optional[str] = Query(None, description="识别模型"),
+    use_text_layer: Optional[bool] = Query(None, description="带文本层的页面直接读取文本，不做 OCR（默认取 OCR_PDF_TEXT_LAYER）"),
+    pages: Optional[str] = Query(None, description="只处理这些页码，如 1-3,10（默认全部页面）"),
+    max_pages: Optional[int] = Query(None, description="最多处理的页数（在 pages 之后应用）")
 ):
     """
     上传 PDF 文件并对每一页进行 OCR 文本识别
@@ -301,11 +593,21 @@ async def pdf_predict_by_file(
     与 /pdf/predict-by-file 的区别：
     - 本接口返回完整的 OCR 文本识别结果
     - /pdf/predict-by-file 仅提取表格数据
+
+    流式输出：请求头 Accept: application/x-ndjson 或 text/event-stream 时，
+    每页识别完成即发送该页结果，最后发送 summary 记录。
+
+    文本层：use_text_layer=true 时，软件生成的页面直接返回文本层的文本与坐标
+    （坐标已换算到 2 倍渲染坐标系，与 OCR 结果一致），只有扫描页走 OCR；
+    每页的 source（text_layer / ocr）与 elapsed_ms 显示各页来源与耗时。
     
     Args:
         file: PDF 文件
         detection_model: 检测模型（可选）
         recognition_model: 识别模型（可选）
+        use_text_layer: 是否优先使用文本层（可选）
+        pages: 页码范围，如 1-3,10（可选）
+        max_pages: 最多处理的页数（可选）
     
     Returns:
         RestfulModel: 包含每页 OCR 识别结果的响应
@@ -316,71 +618,44 @@ async def pdf_predict_by_file(
             detail="请上传PDF格式的文件"
         )
     
-    # 读取文件内容
-    file_bytes = await file.read()
+    # 上传内容的只读视图（内存缓冲区或临时文件的 mmap），不复制
+    file_bytes = await run_blocking(upload_content, file.file)
     
-    # 保存为临时PDF文件
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_pdf:
-        tmp_pdf.write(file_bytes)
-        tmp_pdf_path = tmp_pdf.name
-    
-    try:
-        # 将 PDF 转换为图像
-        image_files = pdf_to_images(tmp_pdf_path)
-        
-        # 获取 OCR 实例
-        ocr_instance = get_ocr_instance(detection_model, recognition_model)
-        
-        # 对每页进行 OCR 识别
-        all_results = []
-        for img_info in image_files:
-            try:
-                result = ocr_instance.predict(input=img_info['path'])
-                page_data = extract_ocr_data(result)
-                
-                # 添加页码信息
-                if page_data and len(page_data) > 0:
-                    page_data[0]['page'] = img_info['page_num']
-                    all_results.extend(page_data)
-            except Exception as e:
-                # 即使某页失败，也继续处理其他页
-                all_results.append({
-                    'page': img_info['page_num'],
-                    'error': str(e),
-                    'rec_texts': [],
-                    'rec_boxes': []
-                })
-        
-        restfulModel = RestfulModel(
-            resultcode=200,
-            message=f"Success: {file.filename}, 处理了 {len(image_files)} 页",
-            data=all_results
-        )
-        return restfulModel
-    
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"PDF识别失败: {str(e)}"
-        )
-    
-    finally:
-        # 删除临时文件
-        if 'image_files' in locals():
-            for img_info in image_files:
-                try:
-                    os.unlink(img_info['path'])
-                except Exception:
-                    pass
-        
-        try:
-            os.unlink(tmp_pdf_path)
-        except Exception:
-            pass
+    return await run_blocking(_pdf_ocr_response, request, file_bytes, detection_model, recognition_model,
+                              message_prefix=f"Success: {file.filename}, ", use_text_layer=use_text_layer,
+                              pages=pages, max_pages=max_pages)
+
+
+@router.post('/pdf-predict-by-bytes', response_model=RestfulModel, summary="识别原始PDF数据（全文OCR）")
+async def pdf_predict_by_bytes(
+    request: Request,
+    detection_model: Optional[str] = Query(None, description="检测模型"),
+    recognition_model: Optional[str] = Query(None, description="识别模型"),
+    use_text_layer: Optional[bool] = Query(None, description="带文本层的页面直接读取文本，不做 OCR（默认取 OCR_PDF_TEXT_LAYER）"),
+    pages: Optional[str] = Query(None, description="只处理这些页码，如 1-3,10（默认全部页面）"),
+    max_pages: Optional[int] = Query(None, description="最多处理的页数（在 pages 之后应用）")
+):
+    """
+    请求体直接为 PDF 数据（Content-Type: application/pdf 或 application/octet-stream），
+    其余参数通过查询参数传递；text/plain 请求体按 Base64 边接收边解码。
+
+    与 /ocr/pdf-predict-by-base64 结果相同，但不需要 Base64 编码、JSON 解析，
+    也不在请求模型中保存整个 Base64 字符串。流式输出与文本层：同 /ocr/pdf-predict-by-file
+
+    示例：
+        curl -X POST "http://localhost:8000/ocr/pdf-predict-by-bytes?pages=1-3" \\
+             -H "Content-Type: application/pdf" --data-binary @document.pdf
+    """
+    labels = bind_request_models(detection_model, recognition_model)
+    pdf_content = await read_request_body(request, PDF_MEDIA_TYPES, labels)
+    return await run_blocking(_pdf_ocr_response, request, pdf_content, detection_model, recognition_model,
+                              message_prefix="Success: ", use_text_layer=use_text_layer,
+                              pages=pages, max_pages=max_pages)
 
 
 @router.post('/pdf-predict-by-base64', response_model=RestfulModel, summary="识别 Base64 PDF（全文OCR）")
 async def pdf_predict_by_base64(
+    request: Request,
     pdf_model: PDFBase64PostModel
 ):
     """
@@ -389,82 +664,25 @@ async def pdf_predict_by_base64(
     与 /pdf/predict-by-base64 的区别：
     - 本接口返回完整的 OCR 文本识别结果
     - /pdf/predict-by-base64 仅提取表格数据
+
+    流式输出与文本层：同 /ocr/pdf-predict-by-file
     
     Args:
-        pdf_model: 包含 base64_str 和可选模型参数的请求体
+        pdf_model: 包含 base64_str、可选模型参数与 use_text_layer 的请求体
     
     Returns:
         RestfulModel: 包含每页 OCR 识别结果的响应
     """
     try:
-        # 移除可能的 data URI scheme prefix
-        base64_str = pdf_model.base64_str
-        if ',' in base64_str and base64_str.startswith('data:'):
-            base64_str = base64_str.split(',', 1)[1]
-        
-        # 解码 Base64
-        pdf_content = base64.b64decode(base64_str)
-    except Exception as e:
+        # 分段解码 Base64（自动移除 data URI scheme prefix）
+        pdf_content = await run_blocking(decode_base64, pdf_model.base64_str)
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Base64 解码失败: {str(e)}"
+            detail=str(e)
         )
     
-    # 保存为临时PDF文件
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_pdf:
-        tmp_pdf.write(pdf_content)
-        tmp_pdf_path = tmp_pdf.name
-    
-    try:
-        # 将 PDF 转换为图像
-        image_files = pdf_to_images(tmp_pdf_path)
-        
-        # 获取 OCR 实例
-        ocr_instance = get_ocr_instance(pdf_model.detection_model, pdf_model.recognition_model)
-        
-        # 对每页进行 OCR 识别
-        all_results = []
-        for img_info in image_files:
-            try:
-                result = ocr_instance.predict(input=img_info['path'])
-                page_data = extract_ocr_data(result)
-                
-                # 添加页码信息
-                if page_data and len(page_data) > 0:
-                    page_data[0]['page'] = img_info['page_num']
-                    all_results.extend(page_data)
-            except Exception as e:
-                # 即使某页失败，也继续处理其他页
-                all_results.append({
-                    'page': img_info['page_num'],
-                    'error': str(e),
-                    'rec_texts': [],
-                    'rec_boxes': []
-                })
-        
-        restfulModel = RestfulModel(
-            resultcode=200,
-            message=f"Success: 处理了 {len(image_files)} 页",
-            data=all_results
-        )
-        return restfulModel
-    
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"PDF识别失败: {str(e)}"
-        )
-    
-    finally:
-        # 删除临时文件
-        if 'image_files' in locals():
-            for img_info in image_files:
-                try:
-                    os.unlink(img_info['path'])
-                except Exception:
-                    pass
-        
-        try:
-            os.unlink(tmp_pdf_path)
-        except Exception:
-            pass
+    return await run_blocking(_pdf_ocr_response, request, pdf_content, pdf_model.detection_model,
+                              pdf_model.recognition_model, message_prefix="Success: ",
+                              use_text_layer=pdf_model.use_text_layer,
+                              pages=pdf_model.pages, max_pages=pdf_model.max_pages)
@@ -5,6 +5,7 @@ PDF OCR 路由模块
 功能：从 PDF 文档中提取表格数据
 - 支持通过 URL、上传文件或 Base64 的方式处理 PDF
 - 自动检测并提取 PDF 中的表格结构
+- 带矢量框线的表格直接从 PDF 提取（不渲染、不识别），其余页面走 OCR
 - 基于文本位置坐标智能重建表格的行列关系
 - 返回结构化的表格数据（表头 + 数据行）
 - 支持自定义 OCR 模型选择
@@ -13,28 +14,31 @@ PDF OCR 路由模块
 版本：2.0
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, status, Query
+from fastapi import APIRouter, HTTPException, Request, UploadFile, status, Query
 from models.RestfulModel import *
 from models.OCRModel import PDFBase64PostModel
-from paddleocr import PaddleOCR
-import requests
+from routers.ocr import PDF_MEDIA_TYPES, _observe_page, fetch_http_error, read_request_body, select_pdf_pages, \
+    url_response
+from utils.BatchScheduler import page_elapsed_ms, predict_pages
+from utils.BlockingExecutor import run_blocking
+from utils.BodyReader import decode_base64, upload_content
+from utils.EngineRegistry import get_engine
+from utils.HttpFetcher import FetchError
+from utils.PdfHelper import page_count, pdf_to_images, to_coordinate_space
+from utils.RemotePdf import RemotePdf, UnsupportedPdf, count_full_load
+from utils.ResultCache import cache_policy, lookup_request, result_cache
+from utils.StreamHelper import negotiate_stream, stream_records
+from utils.Telemetry import bind_request_models, model_labels, stage_timer
+from utils.UrlCache import ContentRequired
 import os
-import tempfile
-import fitz  # PyMuPDF - PDF处理库
 import numpy as np
-from PIL import Image
-import io
-import base64
 from typing import Optional
 
-# 从环境变量获取 OCR 语言配置，默认为中文
-OCR_LANGUAGE = os.environ.get("OCR_LANGUAGE", "ch")
-
 # 创建路由器，所有接口前缀为 /pdf
 router = APIRouter(prefix="/pdf", tags=["PDF OCR"])
 
-# OCR 实例缓存（支持不同模型配置）
-_pdf_ocr_instances = {}
+# 默认是否先用矢量表格检测（框线 + 文本）提取表格，失败的页面再走 OCR（请求参数 use_vector_tables 可覆盖）
+PDF_VECTOR_TABLES = os.environ.get("OCR_PDF_VECTOR_TABLES", "1") == "1"
 
 def get_pdf_ocr(detection_model: Optional[str] = None, recognition_model: Optional[str] = None):
     """
@@ -42,6 +46,7 @@ def get_pdf_ocr(detection_model: Optional[str] = None, recognition_model: Option
     
     采用延迟初始化策略，只在第一次调用时创建 OCR 实例，
     避免服务启动时加载模型导致启动变慢。
+    实例由 utils.EngineRegistry 统一管理，与 /ocr 路由共享同一份缓存。
     
     Args:
         detection_model: 检测模型名称 (默认: PP-OCRv5_server_det)
@@ -63,125 +68,137 @@ def get_pdf_ocr(detection_model: Optional[str] = None, recognition_model: Option
     Returns:
         PaddleOCR: OCR 实例对象
     """
-    # 使用默认模型 - Server 版本更准确
-    if not detection_model:
-        detection_model = "PP-OCRv5_server_det"
-    if not recognition_model:
-        recognition_model = "PP-OCRv5_server_rec"
-    
-    # 创建缓存键
-    cache_key = f"{detection_model}_{recognition_model}_{OCR_LANGUAGE}"
-    
-    # 如果实例已存在，直接返回
-    if cache_key in _pdf_ocr_instances:
-        return _pdf_ocr_instances[cache_key]
-    
-    # 创建新实例
-    # PaddleOCR 3.x unified interface with customizable models
-    ocr_instance = PaddleOCR(
-        text_detection_model_name=detection_model,  # 文本检测模型
-        text_recognition_model_name=recognition_model,  # 文本识别模型
-        use_angle_cls=True,  # 启用角度分类器
-        use_doc_orientation_classify=False,  # 禁用文档方向分类
-        use_doc_unwarping=False,  # 禁用文档矫正
-        lang=OCR_LANGUAGE  # 语言设置
-    )
-    
-    # 缓存实例
-    _pdf_ocr_instances[cache_key] = ocr_instance
-    
-    return ocr_instance
+    return get_engine(detection_model, recognition_model)
 
 
-def pdf_to_images(pdf_path: str):
+def _box_array(boxes):
     """
-    将 PDF 文档的每一页转换为高清图像文件
-    
-    处理流程：
-    1. 使用 PyMuPDF 打开 PDF 文档
-    2. 逐页渲染为图像，分辨率提高 2 倍（提升 OCR 识别精度）
-    3. 将图像保存为临时 PNG 文件
-    4. 返回临时文件路径列表
-    
-    Args:
-        pdf_path (str): PDF 文件的绝对路径
-    
+    把边界框转换为 (N, 4) 浮点数组，忽略格式不正确的框
+
     Returns:
-        list: 包含每页图像信息的列表，每个元素是字典：
-            {
-                'page_num': int,  # 页码（从1开始）
-                'path': str,      # 临时图像文件路径
-                'width': int,     # 图像宽度（像素）
-                'height': int     # 图像高度（像素）
-            }
-    
-    注意：
-        - 调用者需要负责删除返回的临时文件
-        - 使用 2 倍分辨率渲染以提高 OCR 识别准确率
+        tuple: (keep, array)，keep 为有效框在原列表中的索引，全部有效时为 None
     """
-    temp_files = []
-    pdf_document = fitz.open(pdf_path)
-    
-    # 遍历 PDF 的每一页
-    for page_num in range(len(pdf_document)):
-        page = pdf_document[page_num]
-        
-        # 设置渲染矩阵，2.0 表示 2 倍放大（提高 OCR 识别精度）
-        mat = fitz.Matrix(2.0, 2.0)
-        pix = page.get_pixmap(matrix=mat)
-        
-        # 将 PyMuPDF 的 Pixmap 转换为 PIL Image
-        img_data = pix.tobytes("png")
-        img = Image.open(io.BytesIO(img_data))
-        
-        # 创建临时文件并保存图像
-        # delete=False 表示不自动删除，需要手动清理
-        tmp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        img.save(tmp_file.name, 'PNG')
-        tmp_file.close()
-        
-        # 记录页面信息
-        temp_files.append({
-            'page_num': page_num + 1,  # 页码从 1 开始
-            'path': tmp_file.name,      # 临时文件路径
-            'width': pix.width,         # 图像宽度
-            'height': pix.height        # 图像高度
-        })
-    
-    pdf_document.close()
-    return temp_files
+    if not isinstance(boxes, np.ndarray):
+        try:
+            boxes = np.asarray(boxes, dtype=np.float64)
+        except (TypeError, ValueError):
+            pass  # 长度不一或含 None，逐个检查
+    if isinstance(boxes, np.ndarray) and boxes.ndim == 2 and boxes.shape[1] >= 4:
+        return None, boxes[:, :4].astype(np.float64)
+    keep = [i for i, box in enumerate(boxes)
+            if isinstance(box, (list, tuple, np.ndarray)) and len(box) >= 4]
+    array = np.array([box[:4] for box in (boxes[i] for i in keep)], dtype=np.float64).reshape(-1, 4)
+    return np.asarray(keep, dtype=np.intp), array
+
 
+# 倾斜估计的斜率范围（约 ±3°）、候选个数与参与估计的文本框数上限
+_MAX_SKEW = 0.05
+_SKEW_STEPS = 41
+_SKEW_SAMPLE = 512
 
-def _np_to_list(value):
+
+def _estimate_skew(x_center, y_center, bin_size: float) -> float:
     """
-    将 numpy 数组转换为 Python 列表（用于 JSON 序列化）
-    
-    Args:
-        value: 任意类型的值
-    
+    估计文本行的斜率（dy/dx）
+
+    对每个候选斜率把 Y 中心投影到 bin_size 宽的区间，选使投影最集中（区间计数平方和最大）的斜率；
+    与不校正相比提升不足 5% 时返回 0，规整页面不受影响。文本框很多时等间隔抽样估计。
+    """
+    if len(x_center) < 2 or np.ptp(x_center) == 0:
+        return 0.0
+    if len(x_center) > _SKEW_SAMPLE:
+        step = -(-len(x_center) // _SKEW_SAMPLE)
+        x_center, y_center = x_center[::step], y_center[::step]
+    slopes = np.linspace(-_MAX_SKEW, _MAX_SKEW, _SKEW_STEPS)
+    projected = y_center[None, :] - slopes[:, None] * (x_center - x_center.mean())[None, :]
+    bins = np.floor((projected - projected.min(axis=1, keepdims=True)) / bin_size).astype(np.intp)
+    # 每个候选斜率的区间计数平方和：对 (候选, 区间) 组合计数
+    offsets = np.arange(_SKEW_STEPS)[:, None] * (bins.max() + 1)
+    counts = np.bincount((bins + offsets).ravel(), minlength=_SKEW_STEPS * (bins.max() + 1))
+    scores = np.square(counts).reshape(_SKEW_STEPS, -1).sum(axis=1)
+    best = int(np.argmax(scores))
+    if scores[best] <= scores[_SKEW_STEPS // 2] * 1.05:
+        return 0.0
+    return float(slopes[best])
+
+
+def _split_tall_rows(y_sorted, new_row, y_threshold: float):
+    """在与行首的差达到 y_threshold 处开始新的一行（只逐个检查跨度过大的行）"""
+    starts = np.flatnonzero(new_row)
+    ends = np.append(starts[1:], len(y_sorted))
+    # y_sorted 有序，行的跨度即末项与首项之差
+    tall = y_sorted[ends - 1] - y_sorted[starts] >= y_threshold
+    for start, end in zip(starts[tall].tolist(), ends[tall].tolist()):
+        row_start_y = y_sorted[start]
+        for i, y in enumerate(y_sorted[start + 1:end].tolist(), start + 1):
+            if y - row_start_y >= y_threshold:
+                new_row[i] = True
+                row_start_y = y
+
+
+def _table_rows(x_center, y_center, row_gap: float, y_threshold: float, min_cols: int):
+    """
+    按 Y 坐标分行并筛选规则行；row_gap 为 0 时只按与行首的差分行
+
     Returns:
-        如果是 numpy 数组则返回列表，否则原样返回
+        tuple or None: (order, regular, most_common_cols)，order 为按 (行, X) 排序的文本框下标，
+            regular 标记 order 中属于规则行的位置；不构成表格时返回 None
     """
-    if isinstance(value, np.ndarray):
-        return value.tolist()
-    return value
+    n = len(y_center)
+    # 相邻中心差超过间距阈值即开始新的一行；同一行与行首的差也不超过 y_threshold，
+    # 行距不同的文本（如旁注）交错时不会把多行连成一行
+    by_y = np.argsort(y_center, kind='stable')
+    y_sorted = y_center[by_y]
+    new_row = np.empty(n, dtype=bool)
+    new_row[0] = True
+    new_row[1:] = np.diff(y_sorted) >= row_gap if row_gap > 0 else False
+    _split_tall_rows(y_sorted, new_row, y_threshold)
+    row_sorted = np.cumsum(new_row) - 1
+    row_of = np.empty(n, dtype=np.intp)
+    row_of[by_y] = row_sorted
+    # 行内按 X 坐标排序（X 相同时保持 Y 顺序）：行号与 X 合成一个排序键，稳定排序一次完成
+    x_sorted = x_center[by_y] - x_center.min()
+    order = by_y[np.argsort(row_sorted * (x_sorted.max() + 1) + x_sorted, kind='stable')]
+    col_counts = np.bincount(row_of)
+    
+    # 至少需要 2 行（表头 + 数据）
+    if len(col_counts) < 2:
+        return None
+    
+    # 列数必须 >= min_cols，找出出现次数最多的列数（次数相同时取先出现的）
+    valid_col_counts = col_counts[col_counts >= min_cols]
+    if len(valid_col_counts) == 0:
+        return None
+    values, first_seen, freq = np.unique(valid_col_counts, return_index=True, return_counts=True)
+    candidates = np.flatnonzero(freq == freq.max())
+    most_common_cols = int(values[candidates[np.argmin(first_seen[candidates])]])
+    
+    # 筛选出列数为标准列数的规则行
+    regular = col_counts[row_of[order]] == most_common_cols
+    if np.count_nonzero(regular) < 2 * most_common_cols:  # 至少需要表头+数据各1行
+        return None
+    return order, regular, most_common_cols
 
 
 def reconstruct_table(texts, boxes, y_threshold=30, min_cols=3):
     """
     基于文本位置坐标智能重建表格结构
     
-    核心算法：
-    1. 按 Y 轴坐标聚类识别表格的"行"（Y 坐标接近的文本属于同一行）
-    2. 对每一行按 X 轴坐标排序识别"列"的顺序
+    核心算法（NumPy 向量化，O(n log n)，单页上万个文本框也只需几毫秒）：
+    1. 按 Y 轴中心排序，相邻中心差超过间距阈值或与行首的差达到 y_threshold 时断开，
+       得到表格的"行"（行距较小时相邻两行不会连成一行，行距不同的文本交错时也不会
+       把多行连成一行）；另外只按行首差分一次，页面倾斜时再按拉平后的 Y 轴中心各分一次，
+       取规则行中文本框最多的结果
+    2. 按 (行, X 轴中心) 一次排序确定每行内"列"的顺序
     3. 统计每行的列数，找出最常见的列数作为标准列数
     4. 筛选出列数符合标准的规则行
     5. 第一个规则行作为表头，其余作为数据行
     
     Args:
         texts (list): 识别出的文本列表，如 ['Name', 'Age', 'John', '25']
-        boxes (list): 对应的边界框坐标列表，格式 [x1, y1, x2, y2]
-        y_threshold (int): Y 轴阈值，判断是否在同一行的依据（默认 30 像素）
+        boxes (list | np.ndarray): 对应的边界框坐标，格式 [x1, y1, x2, y2]，也可以是 (N, 4) 数组
+        y_threshold (int): Y 轴阈值，同一行文本与行首中心差的上限（默认 30 像素）；
+            相邻文本中心差的上限取其与文本框中位高度一半中的较小值
         min_cols (int): 表格最少列数，少于此值不认为是表格（默认 3 列）
     
     Returns:
@@ -201,111 +218,68 @@ def reconstruct_table(texts, boxes, y_threshold=30, min_cols=3):
         - 列数需要 >= min_cols（默认 3）
     
     示例：
-        >>> texts = ['Name', 'Age', 'John', '25']
-        >>> boxes = [[10, 10, 50, 30], [60, 10, 100, 30], 
-        ...          [10, 40, 50, 60], [60, 40, 100, 60]]
+        >>> texts = ['Name', 'Age', 'City', 'John', '25', 'NYC']
+        >>> boxes = [[10, 10, 50, 30], [60, 10, 100, 30], [110, 10, 150, 30],
+        ...          [10, 40, 50, 60], [60, 40, 100, 60], [110, 40, 150, 60]]
         >>> result = reconstruct_table(texts, boxes)
         >>> result['has_table']
         True
         >>> result['headers']
-        ['Name', 'Age']
+        ['Name', 'Age', 'City']
         >>> result['rows']
-        [['John', '25']]
+        [['John', '25', 'NYC']]
     """
+    no_table = {'has_table': False, 'headers': [], 'rows': []}
+    
     # 基本验证
-    if not texts or not boxes or len(texts) != len(boxes):
-        return {'has_table': False, 'headers': [], 'rows': []}
+    if texts is None or boxes is None or len(texts) == 0 or len(texts) != len(boxes):
+        return no_table
     
     # 至少需要 6 个文本框才可能构成表格（3列 x 2行）
     if len(texts) < 6:
-        return {'has_table': False, 'headers': [], 'rows': []}
-    
-    # 步骤1：构建文本项目列表，计算每个文本框的中心点和尺寸
-    items = []
-    for i, (text, box) in enumerate(zip(texts, boxes)):
-        if isinstance(box, list) and len(box) >= 4:
-            x1, y1, x2, y2 = box[0], box[1], box[2], box[3]
-            items.append({
-                'text': text,
-                'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
-                'x_center': (x1 + x2) / 2,  # X 轴中心点
-                'y_center': (y1 + y2) / 2,  # Y 轴中心点
-                'width': x2 - x1,            # 宽度
-                'height': y2 - y1,           # 高度
-                'index': i                    # 原始索引
-            })
-    
-    if len(items) < 6:
-        return {'has_table': False, 'headers': [], 'rows': []}
-    
-    # 步骤2：按 Y 坐标分组，识别表格的"行"
-    # 先按 Y 轴中心点排序
-    items.sort(key=lambda x: x['y_center'])
-    
-    rows = []
-    current_row = [items[0]]
-    
-    # 遍历所有项目，根据 Y 坐标阈值判断是否属于同一行
-    for item in items[1:]:
-        # 如果当前项目的 Y 坐标与当前行的第一个项目接近，则认为在同一行
-        if abs(item['y_center'] - current_row[0]['y_center']) < y_threshold:
-            current_row.append(item)
-        else:
-            # 否则，当前行结束，将其按 X 坐标排序后保存
-            current_row.sort(key=lambda x: x['x_center'])
-            rows.append(current_row)
-            current_row = [item]
-    
-    # 添加最后一行
-    if current_row:
-        current_row.sort(key=lambda x: x['x_center'])
-        rows.append(current_row)
-    
-    # 步骤3：检查是否是有效表格
-    if len(rows) < 2:  # 至少需要 2 行（表头 + 数据）
-        return {'has_table': False, 'headers': [], 'rows': []}
-    
-    # 步骤4：统计列数分布，找出最常见的列数
-    col_counts = [len(row) for row in rows]
-    max_cols = max(col_counts)
-    
-    # 列数必须 >= min_cols
-    if max_cols < min_cols:
-        return {'has_table': False, 'headers': [], 'rows': []}
-    
-    # 找出列数符合要求的行（列数 >= min_cols）
-    from collections import Counter
-    valid_col_counts = [c for c in col_counts if c >= min_cols]
-    
-    if not valid_col_counts:
-        return {'has_table': False, 'headers': [], 'rows': []}
-    
-    # 找出出现次数最多的列数（标准列数）
-    col_count_freq = Counter(valid_col_counts)
-    most_common_cols = col_count_freq.most_common(1)[0][0]
-    
-    # 步骤5：筛选出列数为标准列数的规则行
-    regular_rows = [row for row in rows if len(row) == most_common_cols]
-    
-    if len(regular_rows) < 2:  # 至少需要表头+数据各1行
-        return {'has_table': False, 'headers': [], 'rows': []}
-    
-    # 步骤6：提取表头和数据行
-    # 第一个规则行作为表头
-    headers = [item['text'] for item in regular_rows[0]]
-    
-    # 其余规则行作为数据行
-    data_rows = []
-    for row in regular_rows[1:]:
-        row_data = [item['text'] for item in row]
-        # 确保每行列数一致（补齐或裁剪）
-        while len(row_data) < len(headers):
-            row_data.append('')
-        data_rows.append(row_data[:len(headers)])
-    
-    # 至少要有 1 行数据
-    if len(data_rows) < 1:
-        return {'has_table': False, 'headers': [], 'rows': []}
+        return no_table
+    
+    # 步骤1：有效文本框的中心点
+    keep, box_array = _box_array(boxes)
+    n = len(box_array)
+    if n < 6:
+        return no_table
+    x_center = (box_array[:, 0] + box_array[:, 2]) / 2
+    y_center = (box_array[:, 1] + box_array[:, 3]) / 2
+    
+    # 步骤2-5：分行并找出规则行。依次尝试：相邻间距 + 行首差分行、（页面倾斜时）拉平后同样分行、
+    # 只按行首差分行，取规则行中文本框最多的结果（相同时取先尝试的）
+    heights = box_array[:, 3] - box_array[:, 1]
+    row_gap = min(y_threshold, max(float(np.median(heights)) / 2, 1.0))
+    table, best = None, 0
+
+    def consider(y_values, gap):
+        nonlocal table, best
+        candidate = _table_rows(x_center, y_values, gap, y_threshold, min_cols)
+        if candidate is not None and np.count_nonzero(candidate[1]) > best:
+            table, best = candidate, np.count_nonzero(candidate[1])
+
+    # 全部文本框都在规则行中时不再尝试其它分法
+    consider(y_center, row_gap)
+    variants = [y_center]
+    if best < n:
+        skew = _estimate_skew(x_center, y_center, row_gap)
+        if skew:
+            variants.append(y_center - skew * (x_center - x_center.mean()))
+            consider(variants[1], row_gap)
+    for y_values in variants:
+        if best < n:
+            consider(y_values, 0)
+    if table is None:
+        return no_table
+    order, regular, most_common_cols = table
+    
+    # 步骤6：提取表头和数据行（第一个规则行作为表头，其余作为数据行）
+    text_array = np.empty(n, dtype=object)
+    text_array[:] = texts if keep is None else [texts[i] for i in keep]
+    cells = text_array[order[regular]].reshape(-1, most_common_cols).tolist()
+    headers = cells[0]
+    data_rows = cells[1:]
     
     # 返回成功识别的表格
     return {
@@ -317,7 +291,7 @@ def reconstruct_table(texts, boxes, y_threshold=30, min_cols=3):
     }
 
 
-def extract_pdf_ocr_data(result, page_num):
+def extract_pdf_ocr_data(result, page_num, scale: float = 1.0):
     """
     从 PaddleOCR 3.x 识别结果中提取表格数据，非表格页面返回 None
     
@@ -332,6 +306,8 @@ def extract_pdf_ocr_data(result, page_num):
             - OCRResult 对象：包含 rec_texts, rec_boxes, rec_scores 等属性
             - 列表格式：[OCRResult] 或传统格式兼容
         page_num (int): PDF 页码，从 1 开始编号
+        scale (float): 边界框换算到坐标空间的比例（pdf_to_images 页面信息中的 'scale'），
+            reconstruct_table 的行距阈值按坐标空间（2 倍渲染）设定
     
     Returns:
         dict or None: 如果检测到表格，返回：
@@ -372,10 +348,10 @@ def extract_pdf_ocr_data(result, page_num):
         # 尝试作为对象访问属性（OCRResult 对象）
         if hasattr(item, 'rec_texts') and hasattr(item, 'rec_boxes'):
             rec_texts = getattr(item, 'rec_texts', []) or []
-            rec_boxes = getattr(item, 'rec_boxes', []) or []
-            # 确保是列表类型
+            rec_boxes = getattr(item, 'rec_boxes', None)
+            # 确保是列表类型（边界框保持 numpy 数组，表格重建直接向量化处理）
             rec_texts = list(rec_texts) if isinstance(rec_texts, (list, tuple)) else []
-            rec_boxes = _np_to_list(rec_boxes)  # 转换 numpy 数组为列表
+            rec_boxes = rec_boxes if isinstance(rec_boxes, np.ndarray) else list(rec_boxes or [])
         
         # 尝试作为字典访问（旧版 PaddleOCR 返回格式）
         elif isinstance(item, dict):
@@ -384,7 +360,9 @@ def extract_pdf_ocr_data(result, page_num):
                 rec_texts = core.get('rec_texts', [])
                 rec_boxes = core.get('rec_boxes', [])
                 rec_texts = list(rec_texts) if isinstance(rec_texts, (list, tuple)) else []
-                rec_boxes = _np_to_list(rec_boxes)
+    
+    if scale != 1.0:
+        rec_boxes = to_coordinate_space(rec_boxes, scale)
     
     # 调用表格重建算法
     table_data = reconstruct_table(rec_texts, rec_boxes)
@@ -408,40 +386,217 @@ def extract_pdf_ocr_data(result, page_num):
         return None
 
 
-def process_pdf(pdf_path: str, detection_model: Optional[str] = None, recognition_model: Optional[str] = None):
+def iter_pdf_tables(pdf_path, detection_model: Optional[str] = None, recognition_model: Optional[str] = None,
+                    pages=None, page_cache=(False, False), vector_tables: bool = False):
+    """
+    逐页识别 PDF 并提取表格（生成器），每页处理完立即产出
+    
+    Args:
+        pdf_path: PDF 文件路径或字节内容
+        detection_model: 检测模型名称
+        recognition_model: 识别模型名称
+        pages: 只识别这些页码（从 1 开始），None 表示全部页面
+        page_cache: (lookup, store)，按页像素指纹查找、写入识别结果缓存
+        vector_tables: 先用矢量表格检测（框线 + 文本）提取，成功的页面不渲染、不识别
+    
+    Yields:
+        tuple: (page_num, page_data)，页面不含表格时 page_data 为 None；
+               page_data['source'] 为 vector_table 或 ocr，
+               page_data['from_cache'] 表示该页识别结果是否来自缓存
+    """
+    labels = model_labels(detection_model, recognition_model)
+    # 逐页渲染为内存图像并进行 OCR 识别（启用工作池时多页并行）
+    images = pdf_to_images(pdf_path, pages=pages, fingerprint=any(page_cache), vector_tables=vector_tables)
+    for img_info, future in predict_pages(images, detection_model, recognition_model, page_cache=page_cache):
+        _observe_page(img_info, labels)
+        result = future.result()
+        if img_info['source'] == 'vector_table':
+            page_data = {'page': img_info['page_num'], 'table': result}
+        else:
+            with stage_timer('postprocess', labels):
+                page_data = extract_pdf_ocr_data(result, img_info['page_num'], scale=img_info['scale'])
+        if page_data is not None:
+            page_data['page_width'] = img_info['page_width']
+            page_data['page_height'] = img_info['page_height']
+            page_data['zoom'] = img_info['zoom']
+            page_data['source'] = img_info['source']
+            page_data['from_cache'] = img_info['from_cache']
+            page_data['elapsed_ms'] = page_elapsed_ms(img_info)
+        yield img_info['page_num'], page_data
+
+
+def process_pdf(pdf_path, detection_model: Optional[str] = None, recognition_model: Optional[str] = None,
+                vector_tables: bool = PDF_VECTOR_TABLES, pages=None, max_tables: Optional[int] = None):
     """
     处理 PDF 文件并提取表格
     
     Args:
-        pdf_path: PDF 文件路径
+        pdf_path: PDF 文件路径或字节内容
         detection_model: 检测模型名称
         recognition_model: 识别模型名称
+        vector_tables: 是否先用矢量表格检测
+        pages: 只处理这些页码（从 1 开始），None 表示全部页面
+        max_tables: 提取到这么多个表格后停止，后续页面不再渲染
     
     Returns:
-        tuple: (all_results, image_files) - 提取结果和临时图像文件列表
+        list: 包含表格的页面提取结果
+    """
+    # 只保留包含表格的页面
+    tables = iter_pdf_tables(pdf_path, detection_model, recognition_model, pages=pages,
+                             vector_tables=vector_tables)
+    return [page_data for _, page_data in _take_tables(tables, max_tables) if page_data is not None]
+
+
+def _take_tables(tables, max_tables: Optional[int] = None):
     """
-    # 将 PDF 转换为图像文件
-    image_files = pdf_to_images(pdf_path)
+    转发 iter_pdf_tables 的产出，找到 max_tables 个表格后关闭生成器
+
+    关闭生成器会停止后台渲染线程，剩余页面既不渲染也不识别。
+    """
+    found = 0
+    try:
+        for page_num, page_data in tables:
+            yield page_num, page_data
+            if page_data is not None:
+                found += 1
+                if max_tables and found >= max_tables:
+                    return
+    finally:
+        tables.close()
+
+
+def _tables_response(request: Request, pdf_content: Optional[bytes], detection_model: Optional[str],
+                     recognition_model: Optional[str], message_prefix: str,
+                     use_vector_tables: Optional[bool] = None, pages: Optional[str] = None,
+                     max_pages: Optional[int] = None, max_tables: Optional[int] = None,
+                     digest: Optional[str] = None, total_pages: Optional[int] = None):
+    """
+    从 PDF 内容提取表格并生成响应
     
-    # 获取 OCR 实例
-    ocr = get_pdf_ocr(detection_model, recognition_model)
+    相同 PDF 与模型组合的结果会被缓存，修订版文档中未改动的页面按页复用
+    缓存结果（页面记录的 from_cache 为 true）。请求头 X-OCR-Cache: bypass 或
+    Cache-Control: no-cache 可跳过缓存。
+    
+    use_vector_tables 为 True（None 时取 OCR_PDF_VECTOR_TABLES）时，先用矢量
+    表格检测提取（source 为 vector_table），检测失败的页面再走 OCR。
+    
+    pages（如 "1-3,10"）与 max_pages 限定要处理的页面，未选中的页面不会被渲染；
+    max_tables 为提取到指定数量的表格后立即停止（适合"只要第一张表"的场景）。
+
+    pdf_content 为 None 时（URL 内容未变）按 digest 与 total_pages 查结果缓存，
+    未命中抛出 ContentRequired。
+    
+    请求头 Accept 为 application/x-ndjson 或 text/event-stream 时，
+    每发现一个表格页即发送一条 page 记录，最后发送 summary 记录；
+    否则返回完整的 RestfulModel。
+    """
+    if max_tables is not None and max_tables < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="max_tables 必须大于 0"
+        )
+    bind_request_models(detection_model, recognition_model)
+    page_nums, variant = select_pdf_pages(pdf_content, pages, max_pages, total=total_pages)
+    if max_tables:
+        variant = f"{variant}|max_tables={max_tables}"
+    vector_tables = PDF_VECTOR_TABLES if use_vector_tables is None else use_vector_tables
+    page_cache = cache_policy(request)
+    key, cached = lookup_request(request, 'pdf_table_vector' if vector_tables else 'pdf_table', pdf_content,
+                                 detection_model, recognition_model, variant, digest=digest)
+    if cached is None and pdf_content is None:
+        raise ContentRequired()
+    
+    def page_records():
+        # 缓存内容为全部页面的 [page_num, page_data]，非表格页 page_data 为 None
+        if cached is not None:
+            for page_num, page_data in cached:
+                if page_data is not None:
+                    page_data['from_cache'] = True
+                    page_data['elapsed_ms'] = 0.0
+                yield page_num, page_data
+            return
+        # 直接从内容渲染（见 upload_content），不另存临时文件
+        collected = []
+        tables = iter_pdf_tables(pdf_content, detection_model, recognition_model, pages=page_nums,
+                                 page_cache=page_cache, vector_tables=vector_tables)
+        for page_num, page_data in _take_tables(tables, max_tables):
+            collected.append([page_num, page_data])
+            yield page_num, page_data
+        if key:
+            result_cache.put(key, collected)
+    
+    media_type = negotiate_stream(request)
+    if media_type:
+        def records():
+            total_pages = 0
+            total_tables = 0
+            cached_tables = 0
+            for _, page_data in page_records():
+                total_pages += 1
+                if page_data is not None:
+                    total_tables += 1
+                    cached_tables += 1 if page_data.get('from_cache') else 0
+                    yield 'page', page_data
+            yield 'summary', {
+                'resultcode': 200,
+                'message': f"{message_prefix}提取到 {total_tables} 个表格",
+                'total_pages': total_pages,
+                'total_tables': total_tables,
+                'cached_tables': cached_tables
+            }
+        
+        return stream_records(records(), media_type)
     
-    # 对每个页面进行 OCR 识别，只保留包含表格的页面
-    all_results = []
-    for img_info in image_files:
-        result = ocr.predict(input=img_info['path'])
-        page_data = extract_pdf_ocr_data(result, img_info['page_num'])
-        if page_data is not None:  # 只添加包含表格的页面
-            all_results.append(page_data)
+    try:
+        # 只保留包含表格的页面
+        all_results = [page_data for _, page_data in page_records() if page_data is not None]
+        
+        # 计算总表格数
+        total_tables = len(all_results)
+        
+        restfulModel = RestfulModel(
+            resultcode=200,
+            message=f"{message_prefix}提取到 {total_tables} 个表格",
+            data=all_results
+        )
+        return restfulModel
     
-    return all_results, image_files
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"PDF识别失败: {str(e)}"
+        )
+
+
+def _remote_tables_response(request: Request, remote: RemotePdf, detection_model: Optional[str],
+                            recognition_model: Optional[str], **options):
+    """
+    按需读取远程 PDF 的所选页面并提取表格（在阻塞任务线程池中调用）
+
+    服务器提供 ETag / Last-Modified 时先按其摘要查结果缓存，命中则不读取页面内容。
+    """
+    total = remote.page_count()
+    if remote.digest:
+        try:
+            return _tables_response(request, None, detection_model, recognition_model,
+                                    digest=remote.digest, total_pages=total, **options)
+        except ContentRequired:
+            pass
+    page_nums, _ = select_pdf_pages(None, options.get('pages'), options.get('max_pages'), total=total)
+    return _tables_response(request, remote.extract(page_nums), detection_model, recognition_model,
+                            digest=remote.digest, total_pages=total, **options)
 
 
 @router.get('/predict-by-url', response_model=RestfulModel, summary="识别PDF URL")
 async def predict_pdf_by_url(
+    request: Request,
     pdf_url: str,
     detection_model: Optional[str] = Query(None, description="检测模型"),
-    recognition_model: Optional[str] = Query(None, description="识别模型")
+    recognition_model: Optional[str] = Query(None, description="识别模型"),
+    use_vector_tables: Optional[bool] = Query(None, description="先用矢量表格检测提取，失败的页面再走 OCR（默认取 OCR_PDF_VECTOR_TABLES）"),
+    pages: Optional[str] = Query(None, description="只处理这些页码，如 1-3,10（默认全部页面）"),
+    max_pages: Optional[int] = Query(None, description="最多处理的页数（在 pages 之后应用）"),
+    max_tables: Optional[int] = Query(None, description="提取到这么多个表格后停止")
 ):
     """
     通过 URL 下载并识别 PDF 文件中的表格数据
@@ -450,12 +605,11 @@ async def predict_pdf_by_url(
     
     工作流程：
     1. 参数验证：检查 URL 格式是否有效
-    2. 文件下载：通过 HTTP 请求下载 PDF 文件到临时目录
+    2. 文件下载：通过共享的 HTTP 客户端下载 PDF 内容到内存
     3. PDF 转图：将 PDF 每一页转换为高分辨率图像（2x）
     4. OCR 识别：对每页图像执行文字识别（可选择模型）
     5. 表格重建：使用坐标算法识别表格结构
     6. 结果过滤：只返回包含表格的页面
-    7. 资源清理：删除临时文件
     
     Args:
         pdf_url (str): PDF 文件的 URL 地址，支持 http/https 协议
@@ -491,6 +645,7 @@ async def predict_pdf_by_url(
     
     错误处理：
         - 400 Bad Request: 下载失败（网络问题、URL无效、文件不存在）
+        - 413 Request Entity Too Large: 文件超过 OCR_FETCH_MAX_MB
         - 500 Internal Server Error: 解析失败（非PDF文件、PDF损坏）或识别失败（OCR模型未加载、内存不足）
     
     使用示例：
@@ -504,69 +659,60 @@ async def predict_pdf_by_url(
         response = requests.get(url, params=params)
         data = response.json()
     
+    流式输出：
+        请求头 Accept: application/x-ndjson 或 text/event-stream 时，
+        每识别出一个表格页即发送 {"type": "page", "data": {...}}，
+        全部页面处理完后发送 {"type": "summary", "data": {...}}
+    
+    按需读取：
+        指定 pages 或 max_pages、源站支持 Range 且文件不小于 OCR_PDF_RANGE_MIN_MB 时，
+        只通过范围请求读取 xref 与所选页面引用的对象，不下载整个文件（见 RemotePdf）；
+        其它情况完整下载
+    
     注意事项：
         - URL 必须可公开访问（无需登录）
-        - 建议 PDF 文件大小不超过 50MB
-        - 超时时间为 30 秒
+        - PDF 文件大小上限为 OCR_FETCH_MAX_MB（默认 50MB），超出返回 413
+        - 超时时间为 OCR_FETCH_TIMEOUT（默认 30 秒）
         - 表格检测基于文本坐标，复杂表格可能识别不准确
     """
-    # 下载PDF文件
-    try:
-        response = requests.get(pdf_url, timeout=30)
-        response.raise_for_status()
-        pdf_content = response.content
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"无法下载PDF: {str(e)}"
-        )
-    
-    # 保存为临时文件
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-        tmp_file.write(pdf_content)
-        tmp_pdf_path = tmp_file.name
-    
-    try:
-        # 处理 PDF
-        all_results, image_files = process_pdf(tmp_pdf_path, detection_model, recognition_model)
-        
-        # 计算总表格数
-        total_tables = len(all_results)
-        
-        restfulModel = RestfulModel(
-            resultcode=200,
-            message=f"Success: 提取到 {total_tables} 个表格",
-            data=all_results
-        )
-        return restfulModel
-    
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"PDF识别失败: {str(e)}"
-        )
-    
-    finally:
-        # 删除临时图片文件
-        if 'image_files' in locals():
-            for img_info in image_files:
-                try:
-                    os.unlink(img_info['path'])
-                except Exception:
-                    pass
-        
-        # 删除临时PDF文件
+    labels = bind_request_models(detection_model, recognition_model)
+    options = dict(message_prefix="Success: ", use_vector_tables=use_vector_tables,
+                   pages=pages, max_pages=max_pages, max_tables=max_tables)
+
+    # 只处理部分页面时，大文件经 HTTP 范围请求按需读取，不下载整个文件；
+    # 服务器不支持范围请求或文档无法按需解析时退回完整下载
+    if pages or max_pages:
         try:
-            os.unlink(tmp_pdf_path)
-        except Exception:
+            remote = await RemotePdf.open(pdf_url, labels)
+            if remote is not None:
+                return await run_blocking(_remote_tables_response, request, remote, detection_model,
+                                          recognition_model, **options)
+        except UnsupportedPdf:
             pass
+        except FetchError as e:
+            raise fetch_http_error(e, "无法下载PDF")
+
+    def process(fetched):
+        if fetched.content is not None:
+            count_full_load()
+        return _tables_response(request, fetched.content, detection_model, recognition_model,
+                                digest=fetched.digest, total_pages=fetched.meta, **options)
+
+    # 下载PDF文件（共享连接池，超过 OCR_FETCH_MAX_MB 返回 413）；
+    # 内容未变（304）且结果已缓存时不下载、不识别
+    return await url_response(request, pdf_url, labels, "无法下载PDF", process, describe=page_count)
 
 
 @router.post('/predict-by-file', response_model=RestfulModel, summary="识别上传的PDF文件")
 async def predict_pdf_by_file(
+    request: Request,
     file: UploadFile,
     detection_model: Optional[str] = Query(None, description="检测模型"),
-    recognition_model: Optional[str] = Query(None, description="识别模型")
+    recognition_model: Optional[str] = Query(None, description="识别模型"),
+    use_vector_tables: Optional[bool] = Query(None, description="先用矢量表格检测提取，失败的页面再走 OCR（默认取 OCR_PDF_VECTOR_TABLES）"),
+    pages: Optional[str] = Query(None, description="只处理这些页码，如 1-3,10（默认全部页面）"),
+    max_pages: Optional[int] = Query(None, description="最多处理的页数（在 pages 之后应用）"),
+    max_tables: Optional[int] = Query(None, description="提取到这么多个表格后停止")
 ):
     """
     上传 PDF 文件并识别其中的表格数据
@@ -633,7 +779,8 @@ async def predict_pdf_by_file(
     注意事项：
         - 建议文件大小不超过 50MB
         - 上传超时时间为 60 秒
-        - 临时文件会在处理完成后自动删除
+        - 上传内容超过 OCR_UPLOAD_SPOOL_MB 时转存到临时目录（TMPDIR）并以 mmap 打开，
+          不在内存中保留完整副本，处理完成后自动释放
         - 表格检测基于文本坐标，复杂表格可能识别不准确
         - 只返回包含表格的页面，纯文本页面会被过滤
     """
@@ -643,52 +790,65 @@ async def predict_pdf_by_file(
             detail="请上传PDF格式的文件"
         )
     
-    # 读取文件内容
-    file_bytes = await file.read()
+    # 上传内容的只读视图（内存缓冲区或临时文件的 mmap），不复制
+    file_bytes = await run_blocking(upload_content, file.file)
     
-    # 保存为临时文件
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-        tmp_file.write(file_bytes)
-        tmp_pdf_path = tmp_file.name
+    return await run_blocking(_tables_response, request, file_bytes, detection_model, recognition_model,
+                              message_prefix=f"Success: {file.filename}, ", use_vector_tables=use_vector_tables,
+                              pages=pages, max_pages=max_pages, max_tables=max_tables)
+
+
+@router.post('/predict-by-bytes', response_model=RestfulModel, summary="识别原始PDF数据")
+async def predict_pdf_by_bytes(
+    request: Request,
+    detection_model: Optional[str] = Query(None, description="检测模型"),
+    recognition_model: Optional[str] = Query(None, description="识别模型"),
+    use_vector_tables: Optional[bool] = Query(None, description="先用矢量表格检测提取，失败的页面再走 OCR（默认取 OCR_PDF_VECTOR_TABLES）"),
+    pages: Optional[str] = Query(None, description="只处理这些页码，如 1-3,10（默认全部页面）"),
+    max_pages: Optional[int] = Query(None, description="最多处理的页数（在 pages 之后应用）"),
+    max_tables: Optional[int] = Query(None, description="提取到这么多个表格后停止")
+):
+    """
+    以原始请求体提交 PDF 并识别其中的表格数据
     
-    try:
-        # 处理 PDF
-        all_results, image_files = process_pdf(tmp_pdf_path, detection_model, recognition_model)
-        
-        # 计算总表格数
-        total_tables = len(all_results)
-        
-        restfulModel = RestfulModel(
-            resultcode=200,
-            message=f"Success: {file.filename}, 提取到 {total_tables} 个表格",
-            data=all_results
-        )
-        return restfulModel
+    API 端点：POST /pdf/predict-by-bytes
     
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"PDF识别失败: {str(e)}"
-        )
+    请求体直接为 PDF 数据（Content-Type: application/pdf 或 application/octet-stream），
+    模型与页码等参数通过查询参数传递。与 /pdf/predict-by-base64 相比：
+        - 没有 Base64 带来的约 33% 体积膨胀
+        - 服务端不解析 JSON，也不在请求模型中保存整个 Base64 字符串
+        - 请求体按块接收，只保留一份内容
+    仍需发送 Base64 时使用 text/plain 请求体（可带 data URI 前缀），服务端边接收边解码。
     
-    finally:
-        # 删除临时图片文件
-        if 'image_files' in locals():
-            for img_info in image_files:
-                try:
-                    os.unlink(img_info['path'])
-                except Exception:
-                    pass
+    错误处理：
+        - 400 Bad Request: 请求体为空、Base64 无效或页码参数无效
+        - 413 Request Entity Too Large: 请求体超过 OCR_UPLOAD_MAX_MB
+        - 415 Unsupported Media Type: Content-Type 不是 PDF / 二进制流 / text/plain
+        - 500 Internal Server Error: 解析失败（非PDF文件、PDF损坏）或识别失败
+    
+    使用示例：
+        # curl 请求
+        curl -X POST "http://localhost:8000/pdf/predict-by-bytes?pages=1-3" \\
+             -H "Content-Type: application/pdf" --data-binary @document.pdf
         
-        # 删除临时PDF文件
-        try:
-            os.unlink(tmp_pdf_path)
-        except Exception:
-            pass
+        # Python requests
+        import requests
+        with open("document.pdf", "rb") as f:
+            response = requests.post("http://localhost:8000/pdf/predict-by-bytes",
+                                     params={"max_tables": 1}, data=f,
+                                     headers={"Content-Type": "application/pdf"})
+    
+    流式输出：同 /pdf/predict-by-url
+    """
+    labels = bind_request_models(detection_model, recognition_model)
+    pdf_content = await read_request_body(request, PDF_MEDIA_TYPES, labels)
+    return await run_blocking(_tables_response, request, pdf_content, detection_model, recognition_model,
+                              message_prefix="Success: ", use_vector_tables=use_vector_tables,
+                              pages=pages, max_pages=max_pages, max_tables=max_tables)
 
 
 @router.post('/predict-by-base64', response_model=RestfulModel, summary="识别 Base64 PDF")
-async def predict_pdf_by_base64(pdf_model: PDFBase64PostModel):
+async def predict_pdf_by_base64(request: Request, pdf_model: PDFBase64PostModel):
     """
     通过 Base64 编码识别 PDF 文件中的表格数据
     
@@ -696,12 +856,11 @@ async def predict_pdf_by_base64(pdf_model: PDFBase64PostModel):
     
     工作流程：
     1. Base64 解码：将 Base64 字符串解码为 PDF 二进制数据
-    2. 文件保存：将解码后的数据保存到临时文件
+    2. 打开文档：PyMuPDF 直接从解码后的内存数据打开
     3. PDF 转图：将 PDF 每一页转换为高分辨率图像（2x）
     4. OCR 识别：对每页图像执行文字识别（可选择模型）
     5. 表格重建：使用坐标算法识别表格结构
     6. 结果过滤：只返回包含表格的页面
-    7. 资源清理：删除所有临时文件
     
     Args:
         pdf_model (PDFBase64PostModel): 包含 base64_str 的请求体
@@ -776,59 +935,16 @@ async def predict_pdf_by_base64(pdf_model: PDFBase64PostModel):
         - 表格检测基于文本坐标，复杂表格可能识别不准确
     """
     try:
-        # 移除可能的 data URI scheme prefix
-        base64_str = pdf_model.base64_str
-        if ',' in base64_str and base64_str.startswith('data:'):
-            base64_str = base64_str.split(',', 1)[1]
-        
-        # 解码 Base64
-        pdf_content = base64.b64decode(base64_str)
-    except Exception as e:
+        # 分段解码 Base64（自动移除 data URI scheme prefix）
+        pdf_content = await run_blocking(decode_base64, pdf_model.base64_str)
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Base64 解码失败: {str(e)}"
+            detail=str(e)
         )
     
-    # 保存为临时文件
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-        tmp_file.write(pdf_content)
-        tmp_pdf_path = tmp_file.name
-    
-    try:
-        # 处理 PDF
-        all_results, image_files = process_pdf(
-            tmp_pdf_path, 
-            pdf_model.detection_model, 
-            pdf_model.recognition_model
-        )
-        
-        # 计算总表格数
-        total_tables = len(all_results)
-        
-        restfulModel = RestfulModel(
-            resultcode=200,
-            message=f"Success: 提取到 {total_tables} 个表格",
-            data=all_results
-        )
-        return restfulModel
-    
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"PDF识别失败: {str(e)}"
-        )
-    
-    finally:
-        # 删除临时图片文件
-        if 'image_files' in locals():
-            for img_info in image_files:
-                try:
-                    os.unlink(img_info['path'])
-                except Exception:
-                    pass
-        
-        # 删除临时PDF文件
-        try:
-            os.unlink(tmp_pdf_path)
-        except Exception:
-            pass
+    return await run_blocking(_tables_response, request, pdf_content, pdf_model.detection_model,
+                              pdf_model.recognition_model, message_prefix="Success: ",
+                              use_vector_tables=pdf_model.use_vector_tables,
+                              pages=pdf_model.pages, max_pages=pdf_model.max_pages,
+                              max_tables=pdf_model.max_tables)
@@ -0,0 +1,105 @@
+"""
+引擎注册表（utils.EngineRegistry）测试
+
+使用替身工厂，不加载 PaddleOCR：
+- 并发的首次请求只构建一个引擎（single-flight）
+- 超出内存预算时按 LRU 淘汰最久未使用的引擎
+- prepare 在第一次构建前调用一次
+
+可直接运行（python test_engine_registry.py），也可由 pytest 收集。
+"""
+
+import threading
+import time
+
+from utils.EngineRegistry import EngineRegistry, parse_engine_sizes
+
+MB = 1024 * 1024
+
+
+class FakeFactory:
+    """记录构建次数的替身工厂，每次构建耗时 delay 秒"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.builds = []
+        self._lock = threading.Lock()
+
+    def __call__(self, detection_model, recognition_model):
+        time.sleep(self.delay)
+        with self._lock:
+            self.builds.append((detection_model, recognition_model))
+        return object()
+
+
+def test_single_flight():
+    factory = FakeFactory(delay=0.2)
+    registry = EngineRegistry(factory=factory, prepare=None)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        results.append(registry.get("det", "rec"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert factory.builds == [("det", "rec")]
+    assert len(results) == 8 and all(engine is results[0] for engine in results)
+
+
+def test_lru_eviction():
+    factory = FakeFactory()
+    # 每个引擎按配置计为 100MB，预算只够两个
+    registry = EngineRegistry(budget_bytes=250 * MB, factory=factory, prepare=None,
+                              sizes=parse_engine_sizes("*=100"))
+    a = registry.get("det", "rec_a")
+    registry.get("det", "rec_b")
+    # 使用 a，b 成为最久未使用的引擎
+    assert registry.get("det", "rec_a") is a
+    registry.get("det", "rec_c")
+
+    keys = [engine['key'] for engine in registry.stats()['engines']]
+    assert len(keys) == 2
+    assert not any("rec_b" in key for key in keys)
+    assert registry.stats()['resident_bytes'] == 200 * MB
+
+    # 被淘汰的引擎再次请求时重新构建
+    registry.get("det", "rec_b")
+    assert factory.builds.count(("det", "rec_b")) == 2
+    assert len(factory.builds) == 4
+
+
+def test_prepare_runs_once_before_first_build():
+    calls = []
+    factory = FakeFactory()
+    registry = EngineRegistry(factory=factory, prepare=lambda: calls.append(len(factory.builds)))
+    registry.get("det", "rec_a")
+    registry.get("det", "rec_b")
+    assert calls == [0]
+
+
+def test_configured_sizes():
+    sizes = parse_engine_sizes("det_a/rec_a=600, *=200")
+    assert sizes == {("det_a", "rec_a"): 600 * MB, "*": 200 * MB}
+    registry = EngineRegistry(factory=FakeFactory(), prepare=None, sizes=sizes)
+    registry.get("det_a", "rec_a")
+    registry.get("det_b", "rec_b")
+    assert sorted(e['size_bytes'] for e in registry.stats()['engines']) == [200 * MB, 600 * MB]
+    try:
+        parse_engine_sizes("det_only=100")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("格式无效时应抛出 ValueError")
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
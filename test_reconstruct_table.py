@@ -0,0 +1,90 @@
+"""
+表格重建（routers.pdf_ocr.reconstruct_table）回归测试
+
+在合成页面上检查 total_rows：
+- 行倾斜（每列相对上一列下移 drift 像素）时不丢行、不错行
+- 表格旁有行距不同的旁注时，相邻两行不会被连成一行
+- 行距小于 y_threshold 时相邻两行不会合并
+
+可直接运行（python test_reconstruct_table.py），也可由 pytest 收集。
+"""
+
+import random
+
+from routers.pdf_ocr import reconstruct_table
+
+
+def drifted_page(n_rows: int, n_cols: int, drift: float, jitter: float = 4.0, row_height: float = 40.0,
+                 seed: int = 0):
+    """n_rows 行 n_cols 列的表格，文本为 r<行>c<列>，输出顺序打乱"""
+    rng = random.Random(seed)
+    items = []
+    for row in range(n_rows):
+        for col in range(n_cols):
+            x = 20 + col * 120 + rng.uniform(-jitter, jitter)
+            y = 20 + row * row_height + col * drift + rng.uniform(-jitter, jitter)
+            items.append((f"r{row}c{col}", [x, y, x + 100, y + 24]))
+    rng.shuffle(items)
+    return [t for t, _ in items], [b for _, b in items]
+
+
+def sidebar_page(n_rows: int, n_cols: int, pitch: float, row_height: float = 40.0):
+    texts, boxes = [], []
+    for row in range(n_rows):
+        for col in range(n_cols):
+            y = 20 + row * row_height
+            texts.append(f"r{row}c{col}")
+            boxes.append([20 + col * 120, y, 120 + col * 120, y + 24])
+    for i in range(int(n_rows * row_height / pitch)):
+        y = 25 + i * pitch
+        texts.append(f"note{i}")
+        boxes.append([20 + n_cols * 120 + 100, y, 20 + n_cols * 120 + 300, y + 20])
+    return texts, boxes
+
+
+def assert_rows_intact(table):
+    """每一行的表格文本都来自同一行"""
+    for row in [table['headers']] + table['rows']:
+        assert len({cell.split('c')[0] for cell in row if cell.startswith('r')}) == 1, row
+
+
+def test_drifted_rows():
+    for drift in (0.0, 1.0, 2.0, 3.0, 4.0):
+        for seed in range(3):
+            texts, boxes = drifted_page(50, 8, drift, seed=seed)
+            table = reconstruct_table(texts, boxes)
+            assert table['has_table'], (drift, seed)
+            assert table['total_rows'] == 49, (drift, seed, table['total_rows'])
+            assert_rows_intact(table)
+
+
+def test_dense_drifted_page():
+    # 行内倾斜（9 列 x 3 像素）接近行距，按相邻间距分行会把整页连成少数几行
+    texts, boxes = drifted_page(1000, 10, 3.0)
+    table = reconstruct_table(texts, boxes)
+    assert table['total_rows'] == 999
+    assert_rows_intact(table)
+
+
+def test_sidebar_at_different_pitch():
+    for pitch in (20.0, 27.0, 33.0):
+        table = reconstruct_table(*sidebar_page(10, 4, pitch))
+        assert table['total_rows'] == 9, (pitch, table['total_rows'])
+        assert_rows_intact(table)
+
+
+def test_tight_row_spacing():
+    # 行距 20 像素小于默认 y_threshold（30）
+    texts, boxes = drifted_page(12, 5, 0.0, jitter=1.0, row_height=20.0)
+    # 文本框高 12 像素
+    boxes = [[x1, y1, x2, y1 + 12] for x1, y1, x2, _ in boxes]
+    table = reconstruct_table(texts, boxes)
+    assert table['total_rows'] == 11
+    assert_rows_intact(table)
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
@@ -0,0 +1,65 @@
+"""
+URL 缓存（条件请求）测试
+
+在本机启动一个支持 ETag / If-None-Match 的 HTTP 服务器作为对象存储替身，
+对同一个 URL 调用 /pdf/predict-by-url 两次：
+- 第一次：替身返回 200，服务端下载并识别
+- 第二次：替身返回 304，服务端直接返回缓存结果，不下载也不识别
+
+需要 API 服务运行在 http://localhost:8000，且能访问本机的替身服务器
+（服务在 Docker 中运行时请把 HOST 改为宿主机地址）。
+"""
+
+import hashlib
+import http.server
+import threading
+import time
+
+import requests
+
+API = 'http://localhost:8000'
+HOST = '127.0.0.1'
+PDF_FILE = 'Products.pdf'
+
+with open(PDF_FILE, 'rb') as f:
+    PDF_BYTES = f.read()
+ETAG = '"' + hashlib.sha256(PDF_BYTES).hexdigest()[:16] + '"'
+hits = []
+
+
+class ObjectStoreHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == ETAG:
+            hits.append(304)
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            return
+        hits.append(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(PDF_BYTES)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(PDF_BYTES)
+
+    def log_message(self, format, *args):
+        pass
+
+
+server = http.server.ThreadingHTTPServer((HOST, 0), ObjectStoreHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+pdf_url = f'http://{HOST}:{server.server_port}/{PDF_FILE}'
+
+for attempt in (1, 2):
+    print(f'=== 第 {attempt} 次 GET /pdf/predict-by-url ===')
+    start = time.perf_counter()
+    response = requests.get(f'{API}/pdf/predict-by-url', params={'pdf_url': pdf_url})
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f'状态码: {response.status_code}, 耗时: {elapsed:.0f} ms, 替身服务器响应: {hits[-1] if hits else "-"}')
+    print(f'响应信息: {response.json()["message"]}')
+
+server.shutdown()
+assert hits == [200, 304], f'期望替身依次返回 200、304，实际为 {hits}'
+print('\n✓ 第二次请求由条件请求 (304) 命中缓存')
+print(requests.get(f'{API}/stats').json()['url_cache'])
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+动态微批调度
+
+每个引擎对应一个 BatchScheduler：并发到达的识别请求先进入队列，
+后台线程在 OCR_BATCH_WINDOW_MS 时间窗内（或攒满 OCR_BATCH_MAX_SIZE 张）
+收集成一批，以一次 predict(input=[...]) 调用送入引擎，再把结果按顺序
+分发回各调用方。
+
+调用方拿到的结果与单张 predict 的返回格式一致（长度为 1 的列表），
+可以直接交给 extract_ocr_data / extract_pdf_ocr_data 处理。
+
+调度器与注册表中的引擎同生共死：引擎被 EngineRegistry 淘汰或卸载时，
+对应的调度器处理完已排队的请求后退出并释放引擎，之后的请求重新加载引擎。
+
+启用多进程工作池（OCR_WORKERS > 0）时，submit / predict 改为把图片分发到
+子进程，由各子进程自己的引擎完成识别。
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional
+
+from utils import EngineRegistry, Metrics
+from utils.EngineRegistry import engine_key, get_engine, on_evict, resolve_models
+from utils.ResultCache import cache_key, result_cache
+from utils.Telemetry import count_pixels, model_labels, observe_stage
+from utils.WorkerPool import get_worker_pool, to_plain
+
+# 攒批时间窗（毫秒）与单批最大图片数
+BATCH_WINDOW_MS = float(os.environ.get("OCR_BATCH_WINDOW_MS", "10"))
+BATCH_MAX_SIZE = max(int(os.environ.get("OCR_BATCH_MAX_SIZE", "8")), 1)
+
+_LABELS = ("detection_model", "recognition_model")
+
+_batch_size = Metrics.histogram(
+    "ocr_batch_size", "每次 predict 调用的图片数", _LABELS,
+    buckets=(1, 2, 4, 8, 16, 32, 64))
+_queue_wait = Metrics.histogram(
+    "ocr_batch_queue_wait_seconds", "请求在攒批队列中的等待时间", _LABELS)
+_predict_seconds = Metrics.histogram(
+    "ocr_batch_predict_seconds", "单批 predict 调用耗时", _LABELS)
+_images_total = Metrics.counter(
+    "ocr_batch_images_total", "经调度器完成识别的图片数", _LABELS)
+_queue_depth = Metrics.gauge(
+    "ocr_batch_queue_depth", "等待攒批的请求数", _LABELS)
+
+_STOP = object()
+
+
+class SchedulerClosed(RuntimeError):
+    """调度器已关闭（其引擎已被淘汰），应重新获取调度器"""
+
+
+class _Request:
+    __slots__ = ("input", "future", "enqueued_at")
+
+    def __init__(self, image):
+        self.input = image
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """
+    单个引擎前的攒批队列
+
+    Args:
+        engine: PaddleOCR 实例
+        window_ms: 首个请求到达后最多等待多少毫秒再发起推理
+        max_batch_size: 单批最大图片数，攒满立即发起推理
+        labels: 指标标签（检测/识别模型名）
+    """
+
+    def __init__(self, engine, window_ms: float = BATCH_WINDOW_MS,
+                 max_batch_size: int = BATCH_MAX_SIZE, labels: Optional[dict] = None):
+        self.engine = engine
+        self.window = max(window_ms, 0) / 1000.0
+        self.max_batch_size = max(max_batch_size, 1)
+        self.labels = labels or {}
+        self._queue = queue.Queue()
+        # 保证 close 之后不再有请求排在 _STOP 之后
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ocr-batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, image) -> Future:
+        """
+        提交一张图片（文件路径、URL 或 numpy 数组）
+
+        Returns:
+            concurrent.futures.Future: 结果为该图片的 predict 返回值
+
+        Raises:
+            SchedulerClosed: 调度器已关闭
+        """
+        request = _Request(image)
+        with self._lock:
+            if self._closed:
+                raise SchedulerClosed()
+            _queue_depth.inc(**self.labels)
+            self._queue.put(request)
+        return request.future
+
+    def close(self):
+        """处理完已排队的请求后退出后台线程并释放引擎"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            self.engine = None
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is _STOP:
+                    stopping = True
+                    break
+                batch.append(request)
+            self._execute(batch)
+
+    def _execute(self, batch):
+        started = time.perf_counter()
+        _queue_depth.dec(len(batch), **self.labels)
+        _batch_size.observe(len(batch), **self.labels)
+        for request in batch:
+            _queue_wait.observe(started - request.enqueued_at, **self.labels)
+
+        try:
+            if len(batch) == 1:
+                results = [list(self.engine.predict(input=batch[0].input))]
+            else:
+                outputs = list(self.engine.predict(input=[r.input for r in batch]))
+                if len(outputs) != len(batch):
+                    raise RuntimeError(f"批量识别返回 {len(outputs)} 个结果，期望 {len(batch)} 个")
+                results = [[output] for output in outputs]
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            # 整批失败时逐张重试，避免一张坏图拖垮同批的其它请求
+            self._execute_each(batch)
+        else:
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+        finally:
+            elapsed = time.perf_counter() - started
+            _predict_seconds.observe(elapsed, **self.labels)
+            observe_stage('ocr', elapsed, self.labels)
+            _images_total.inc(len(batch), **self.labels)
+
+    def _execute_each(self, batch):
+        for request in batch:
+            try:
+                request.future.set_result(list(self.engine.predict(input=request.input)))
+            except Exception as e:
+                request.future.set_exception(e)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def _close_scheduler(key: str, engine):
+    """引擎被淘汰时关闭并移除其调度器"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None or scheduler.engine is not engine:
+            return
+        del _schedulers[key]
+    scheduler.close()
+
+
+on_evict(_close_scheduler)
+
+
+def get_batch_scheduler(detection_model: Optional[str] = None, recognition_model: Optional[str] = None) -> BatchScheduler:
+    """
+    获取指定模型组合的调度器
+
+    已有调度器时不经过 EngineRegistry.get（不计入引擎缓存命中，只维持 LRU 顺序）；
+    没有时加载引擎并创建调度器。
+    """
+    detection_model, recognition_model = resolve_models(detection_model, recognition_model)
+    key = engine_key(detection_model, recognition_model)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+    if scheduler is not None:
+        EngineRegistry.registry.touch(key)
+        return scheduler
+
+    while True:
+        engine = get_engine(detection_model, recognition_model)
+        with _schedulers_lock:
+            scheduler = _schedulers.get(key)
+            if scheduler is None:
+                scheduler = BatchScheduler(engine, labels={
+                    'detection_model': detection_model,
+                    'recognition_model': recognition_model
+                })
+                _schedulers[key] = scheduler
+        # 引擎可能在加载完成后、调度器登记前就被淘汰（此时回调找不到调度器）
+        if EngineRegistry.registry.peek(key) is scheduler.engine:
+            return scheduler
+        _close_scheduler(key, scheduler.engine)
+
+
+def submit(image, detection_model: Optional[str] = None, recognition_model: Optional[str] = None) -> Future:
+    """
+    提交单张图片识别：启用工作池时交给子进程，否则进入本进程的攒批队列
+
+    Returns:
+        concurrent.futures.Future: 结果为该图片的 predict 返回值
+    """
+    count_pixels(image, model_labels(detection_model, recognition_model))
+    pool = get_worker_pool()
+    if pool is not None:
+        return pool.submit(image, detection_model, recognition_model)
+    while True:
+        try:
+            return get_batch_scheduler(detection_model, recognition_model).submit(image)
+        except SchedulerClosed:
+            # 取得调度器之后其引擎恰好被淘汰，重新获取
+            continue
+
+
+def predict(image, detection_model: Optional[str] = None, recognition_model: Optional[str] = None):
+    """识别单张图片（阻塞等待结果）"""
+    return submit(image, detection_model, recognition_model).result()
+
+
+async def predict_async(image, detection_model: Optional[str] = None, recognition_model: Optional[str] = None):
+    """predict 的协程版本，等待期间不占用事件循环"""
+    return await asyncio.wrap_future(submit(image, detection_model, recognition_model))
+
+
+def _cached_future(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _page_result_saver(key: str):
+    """识别成功后把该页结果写入按页缓存"""
+
+    def _done(future: Future):
+        if future.exception() is None:
+            result_cache.put(key, to_plain(future.result()))
+
+    return _done
+
+
+def predict_pages(pages, detection_model: Optional[str] = None, recognition_model: Optional[str] = None,
+                  page_cache=(False, False)):
+    """
+    按页序识别 pdf_to_images 产出的页面（生成器）
+
+    启用工作池时最多同时提交与子进程数相同的页面，使单个文档也能用满所有进程；
+    否则逐页提交到攒批队列。
+
+    页面带有 'fingerprint'（pdf_to_images(fingerprint=True)）时按页缓存识别结果：
+    修订版文档中未改动的页面直接复用上一版的结果，只识别新页面。
+    已由 pdf_to_images 直接提取（文本层 / 矢量表格，'image' 为 None）的页面不做识别，
+    future.result() 即为提取结果。
+
+    Args:
+        page_cache: (lookup, store)，是否按页指纹查找、写入缓存（见 ResultCache.cache_policy）
+
+    Yields:
+        tuple: (page_info, future)，page_info 为不含 'image' 的页面信息，
+               其中 'source' 为 ocr、text_layer 或 vector_table，'from_cache' 表示该页结果是否来自缓存；
+               future.result() 为该页的 predict 返回值或提取结果（识别失败时抛出异常）
+    """
+    lookup, store = page_cache
+    pool = get_worker_pool()
+    in_flight = pool.workers if pool is not None else 1
+    pending = deque()
+    for page in pages:
+        info = {k: v for k, v in page.items() if k not in ('image', 'fingerprint', 'extracted')}
+        info['submitted_at'] = time.perf_counter()
+        info['from_cache'] = False
+        if page['image'] is None:
+            future = _cached_future(page['extracted'])
+        else:
+            info['source'] = 'ocr'
+            key = None
+            if (lookup or store) and page.get('fingerprint'):
+                key = cache_key('page', page['fingerprint'], detection_model, recognition_model)
+            cached = result_cache.get(key, 'page', page['image'].nbytes) if key and lookup else None
+            if cached is not None:
+                info['from_cache'] = True
+                future = _cached_future(cached)
+            else:
+                future = submit(page['image'], detection_model, recognition_model)
+                if key and store:
+                    future.add_done_callback(_page_result_saver(key))
+        pending.append((info, future))
+        # 未启用工作池时，页面缓冲区在调用方取走结果之前必须保持有效
+        if len(pending) >= in_flight:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def page_elapsed_ms(page_info: dict) -> float:
+    """
+    predict_pages 产出页面的处理耗时（毫秒）：渲染或读取文本层的时间
+    加上从提交识别到取得结果的时间，应在 future.result() 返回后调用
+    """
+    waited = time.perf_counter() - page_info['submitted_at']
+    return round(page_info.get('render_ms', 0.0) + waited * 1000, 2)
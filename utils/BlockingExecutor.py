@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+阻塞任务执行器
+
+async 接口中的阻塞操作（上传文件读取、base64 解码、PDF 打开与渲染、
+结果等待、HTTP 下载、SQLite 读写）统一交给 run_blocking，在线程池中执行，
+同时执行的数量不超过 OCR_BLOCKING_THREADS，事件循环只负责收发请求，
+/health 等轻量接口不会被长任务卡住。
+
+monitor_loop_lag 周期性测量事件循环延迟（计划唤醒时间与实际唤醒时间之差），
+记录到 ocr_event_loop_lag_seconds：有阻塞代码跑在事件循环上时该值会明显升高。
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from typing import AsyncIterator, Iterator, Optional
+
+import anyio
+import anyio.to_thread
+
+from utils import Metrics
+
+# 同时执行的阻塞任务数上限
+BLOCKING_THREADS = max(int(os.environ.get("OCR_BLOCKING_THREADS", "16")), 1)
+# 事件循环延迟采样间隔（秒）
+LOOP_LAG_INTERVAL = float(os.environ.get("OCR_LOOP_LAG_INTERVAL", "0.25"))
+
+_tasks = Metrics.gauge("ocr_blocking_tasks", "已提交到阻塞任务执行器、尚未完成的任务数（含排队）")
+_wait_seconds = Metrics.histogram(
+    "ocr_blocking_wait_seconds", "阻塞任务等待空闲线程的时间",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+_loop_lag = Metrics.histogram(
+    "ocr_event_loop_lag_seconds", "事件循环延迟（计划唤醒与实际唤醒之差）",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+_loop_lag_last = Metrics.gauge("ocr_event_loop_lag_last_seconds", "最近一次采样的事件循环延迟")
+
+_limiter: Optional[anyio.CapacityLimiter] = None
+
+_DONE = object()
+
+
+def _get_limiter() -> anyio.CapacityLimiter:
+    # CapacityLimiter 需要在事件循环中创建
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(BLOCKING_THREADS)
+    return _limiter
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    在阻塞任务线程池中执行 func(*args, **kwargs) 并等待结果
+
+    调用方的上下文变量（如请求的指标标签）在线程中保持可见。
+    """
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def _call():
+        _wait_seconds.observe(time.perf_counter() - submitted)
+        return context.run(func, *args, **kwargs)
+
+    _tasks.inc()
+    try:
+        return await anyio.to_thread.run_sync(_call, limiter=_get_limiter())
+    finally:
+        _tasks.dec()
+
+
+async def iterate_blocking(iterator: Iterator) -> AsyncIterator:
+    """
+    逐项在阻塞任务线程池中推进同步迭代器（用于流式响应）
+
+    客户端断开等原因提前结束时，同样在线程池中关闭迭代器，触发其 finally 清理。
+    """
+    try:
+        while True:
+            item = await run_blocking(next, iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await run_blocking(close)
+
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """持续采样事件循环延迟，随应用生命周期运行，由 lifespan 取消"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - expected, 0.0)
+        _loop_lag.observe(lag)
+        _loop_lag_last.set(round(lag, 6))
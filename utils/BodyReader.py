@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+请求体与上传内容读取
+
+/ocr/predict-by-bytes、/ocr/pdf-predict-by-bytes 与 /pdf/predict-by-bytes 直接接收
+application/octet-stream、application/pdf 或 image/* 请求体，模型与页码等参数放在
+查询参数中，免去 Base64 膨胀（约 33%）、JSON 解析与 pydantic 模型中的字符串副本：
+- 请求体按块写入一个 SpooledTemporaryFile，只保留一份内容
+- Content-Length 已声明超过 OCR_UPLOAD_MAX_MB 时不读取请求体，接收过程中超限立即中止
+- 仍需发送 Base64 的客户端可以使用 text/plain 请求体（可带 data URI 前缀），
+  由 Base64Decoder 边接收边解码，不保存完整的 Base64 文本
+
+上传内容（原始请求体与 multipart 文件）不超过 OCR_UPLOAD_SPOOL_MB 时保存在内存中，
+超过后写入系统临时目录（TMPDIR，可指向 tmpfs）。upload_content 返回内容的只读视图：
+内存中的直接共享 BytesIO 的缓冲区，临时文件用 mmap 映射，交给 PyMuPDF 打开时都不再复制。
+
+接收耗时记录为 upload 阶段。
+"""
+
+import binascii
+import io
+import mmap
+import os
+import tempfile
+import time
+from typing import Optional, Union
+
+from starlette.formparsers import MultiPartParser
+
+from utils.BlockingExecutor import run_blocking
+from utils.Telemetry import observe_stage
+
+UPLOAD_MAX_BYTES = int(float(os.environ.get("OCR_UPLOAD_MAX_MB", "50")) * 1024 * 1024)
+# 上传内容超过该大小时从内存转存到临时文件
+UPLOAD_SPOOL_BYTES = int(float(os.environ.get("OCR_UPLOAD_SPOOL_MB", "4")) * 1024 * 1024)
+
+# multipart 上传由 Starlette 解析到 SpooledTemporaryFile，使用同一阈值（默认 1MB）
+MultiPartParser.spool_max_size = UPLOAD_SPOOL_BYTES
+
+# 与 base64.b64decode(validate=False) 一样，字母表以外的字符（换行、空格等）被忽略
+_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+_IGNORED = bytes(sorted(set(range(256)) - set(_ALPHABET)))
+# data URI 前缀（data:application/pdf;base64,）的最大长度
+_DATA_URI_MAX = 256
+# decode_base64 每次转换的字符数
+_DECODE_CHUNK = 1024 * 1024
+
+
+class BodyTooLarge(Exception):
+    """请求体超过 OCR_UPLOAD_MAX_MB"""
+
+
+class Base64Decoder:
+    """
+    增量 Base64 解码
+
+    每次 feed 解码到最后一个完整的 4 字符组，余下的字符留到下一块；
+    内容以 data: 开头时先跳过到第一个逗号为止的前缀。
+    """
+
+    def __init__(self):
+        self._head = b""
+        self._in_head = True
+        self._pending = b""
+
+    def feed(self, chunk) -> bytes:
+        """
+        Raises:
+            ValueError: Base64 格式无效
+        """
+        chunk = bytes(chunk)
+        if self._in_head:
+            chunk = self._strip_prefix(chunk)
+            if chunk is None:
+                return b""
+        data = self._pending + chunk.translate(None, _IGNORED)
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return self._decode(data[:usable])
+
+    def finish(self) -> bytes:
+        """
+        Raises:
+            ValueError: Base64 格式无效（长度不是 4 的倍数）
+        """
+        if self._in_head:
+            head, self._head, self._in_head = self._head, b"", False
+            self._pending += head.translate(None, _IGNORED)
+        data, self._pending = self._pending, b""
+        return self._decode(data)
+
+    def _strip_prefix(self, chunk: bytes) -> Optional[bytes]:
+        """返回去掉 data URI 前缀后的内容；还不能确定前缀是否结束时返回 None"""
+        head = self._head + chunk
+        if len(head) < 5 and b"data:".startswith(head):
+            self._head = head
+            return None
+        if head.startswith(b"data:"):
+            comma = head.find(b",", 0, _DATA_URI_MAX)
+            if comma < 0:
+                if len(head) < _DATA_URI_MAX:
+                    self._head = head
+                    return None
+                raise ValueError("Base64 解码失败: data URI 前缀过长")
+            head = head[comma + 1:]
+        self._head = b""
+        self._in_head = False
+        return head
+
+    @staticmethod
+    def _decode(data: bytes) -> bytes:
+        if not data:
+            return b""
+        try:
+            return binascii.a2b_base64(data)
+        except binascii.Error as e:
+            raise ValueError(f"Base64 解码失败: {e}")
+
+
+def decode_base64(b64_data: str) -> bytearray:
+    """
+    分段解码 Base64 字符串（可带 data URI 前缀）
+
+    每次只把 _DECODE_CHUNK 个字符转换为 ASCII 字节，不生成整个字符串的字节副本。
+
+    Raises:
+        ValueError: Base64 格式无效
+    """
+    decoder = Base64Decoder()
+    output = bytearray()
+    for start in range(0, len(b64_data), _DECODE_CHUNK):
+        try:
+            chunk = b64_data[start:start + _DECODE_CHUNK].encode("ascii")
+        except UnicodeEncodeError:
+            raise ValueError("Base64 解码失败: 包含非 ASCII 字符")
+        output += decoder.feed(chunk)
+    output += decoder.finish()
+    return output
+
+
+def upload_content(file_obj) -> Union[bytes, mmap.mmap]:
+    """
+    上传内容的只读视图，不复制内容
+
+    - 仍在内存中的 SpooledTemporaryFile：BytesIO.getvalue() 与其缓冲区共享内存
+    - 已转存到临时文件：只读 mmap，页面按需从页缓存读取，不计入进程的匿名内存
+    - 其它文件对象：完整读入
+
+    返回值不依赖 file_obj 的生命周期（mmap 持有自己的文件描述符），
+    可以在 file_obj 关闭后继续使用；open_pdf、bytes_to_ndarray 与 digest_bytes 都直接接受。
+
+    Args:
+        file_obj: 二进制文件对象（如 UploadFile.file）
+    """
+    # SpooledTemporaryFile 没有公开底层文件的接口，fileno() 会强制转存到磁盘
+    inner = getattr(file_obj, '_file', file_obj)
+    if isinstance(inner, io.BytesIO):
+        return inner.getvalue()
+    try:
+        inner.flush()
+        fileno = inner.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        file_obj.seek(0)
+        return file_obj.read()
+    if os.fstat(fileno).st_size == 0:
+        return b""
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def media_type(request) -> str:
+    """请求的 Content-Type（不含参数，小写）"""
+    return request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+
+
+def _too_large(max_bytes: int) -> BodyTooLarge:
+    return BodyTooLarge(f"请求体超过大小上限 {max_bytes / (1024 * 1024):g}MB")
+
+
+async def read_body(request, labels: dict, base64_encoded: bool = False,
+                    max_bytes: int = UPLOAD_MAX_BYTES) -> Union[bytes, mmap.mmap]:
+    """
+    按块接收请求体（超过 OCR_UPLOAD_SPOOL_MB 的部分写入临时文件）
+
+    Args:
+        base64_encoded: 请求体为 Base64 文本，边接收边解码
+        max_bytes: 内容（解码后）大小上限
+
+    Returns:
+        bytes 或 mmap.mmap: 请求体内容，见 upload_content
+
+    Raises:
+        BodyTooLarge: 超过 max_bytes
+        ValueError: 请求体为空或 Base64 无效
+    """
+    # Base64 文本约为内容的 4/3，另留出换行与 data URI 前缀的余量
+    raw_limit = max_bytes * 3 // 2 + _DATA_URI_MAX if base64_encoded else max_bytes
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > raw_limit:
+        raise _too_large(max_bytes)
+
+    start = time.perf_counter()
+    decoder = Base64Decoder() if base64_encoded else None
+    spool = new_spool()
+    received = 0
+    size = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > raw_limit:
+                raise _too_large(max_bytes)
+            data = decoder.feed(chunk) if decoder else chunk
+            size += len(data)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            await write_spool(spool, data)
+        if decoder:
+            await write_spool(spool, decoder.finish())
+        body = await run_blocking(upload_content, spool)
+    finally:
+        spool.close()
+        observe_stage('upload', time.perf_counter() - start, labels)
+    if not len(body):
+        raise ValueError("请求体为空")
+    return body
+
+
+def new_spool() -> tempfile.SpooledTemporaryFile:
+    """超过 OCR_UPLOAD_SPOOL_MB 后转存到临时文件的缓冲区"""
+    return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+
+
+async def write_spool(spool, data):
+    """写入 new_spool 创建的缓冲区"""
+    # 与 Starlette 解析 multipart 时相同：已转存到磁盘后写入放到线程池
+    if spool._rolled:
+        await run_blocking(spool.write, data)
+    else:
+        spool.write(data)
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+PaddleOCR 引擎注册表
+
+/ocr 与 /pdf 两个路由共用同一份引擎缓存：
+- 以 (检测模型, 识别模型, 语言) 为键，同一组合全进程只加载一次
+- 构建过程串行化（single-flight），并发的首次请求只会构建一个实例
+- 记录每个引擎加载前后的常驻内存 (RSS) 差值作为其内存占用；paddle / paddleocr
+  在测量前导入，导入与框架初始化不计入第一个引擎。OCR_ENGINE_SIZE_MB 可为
+  指定的模型组合配置固定占用，替代测量值
+- 总占用超过 OCR_ENGINE_MEMORY_BUDGET_MB 时按 LRU 淘汰最久未使用的引擎，
+  并通知 on_evict 注册的回调（如关闭该引擎的攒批调度器），使引擎真正被释放
+"""
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from utils import Metrics
+from utils.LazyImport import lazy_module
+
+# 首次创建引擎时才导入（秒级），import main 不加载 paddle
+paddleocr = lazy_module("paddleocr")
+
+OCR_LANGUAGE = os.environ.get("OCR_LANGUAGE", "ch")
+
+# 默认模型 - Server 版本更准确
+DEFAULT_DETECTION_MODEL = "PP-OCRv5_server_det"
+DEFAULT_RECOGNITION_MODEL = "PP-OCRv5_server_rec"
+
+# 影响识别结果的引擎开关（同时作为结果缓存键的一部分）
+ENGINE_OPTIONS = {
+    'use_angle_cls': True,  # 启用角度分类器
+    'use_doc_orientation_classify': False,  # 禁用文档方向分类
+    'use_doc_unwarping': False,  # 禁用文档矫正
+}
+
+# 引擎内存预算（MB），0 表示不限制
+ENGINE_MEMORY_BUDGET_MB = float(os.environ.get("OCR_ENGINE_MEMORY_BUDGET_MB", "0"))
+# 配置的引擎内存占用（MB），如 "PP-OCRv5_server_det/PP-OCRv5_server_rec=600,*=200"，
+# * 匹配其余组合；未配置的组合使用 RSS 差值
+ENGINE_SIZE_MB = os.environ.get("OCR_ENGINE_SIZE_MB", "")
+
+_MODEL_LABELS = ("detection_model", "recognition_model")
+
+_cache_hits = Metrics.counter("ocr_engine_cache_hits_total", "引擎缓存命中次数", _MODEL_LABELS)
+_cache_misses = Metrics.counter("ocr_engine_cache_misses_total", "引擎缓存未命中次数", _MODEL_LABELS)
+_engine_loads = Metrics.counter("ocr_engine_loads_total", "引擎加载次数", _MODEL_LABELS)
+_load_seconds = Metrics.histogram("ocr_engine_load_seconds", "引擎加载耗时", _MODEL_LABELS)
+_engine_evictions = Metrics.counter("ocr_engine_evictions_total", "引擎因内存预算被淘汰的次数")
+_resident_bytes = Metrics.gauge("ocr_engine_resident_bytes", "已加载引擎的估算内存占用（字节）")
+_resident_engines = Metrics.gauge("ocr_engine_resident_count", "已加载引擎数量")
+
+
+# 引擎被淘汰或卸载时调用 callback(key, engine)，对所有 EngineRegistry 实例生效
+_evict_callbacks: List[Callable] = []
+
+
+def on_evict(callback: Callable):
+    """注册引擎淘汰回调 callback(key, engine)（在注册表锁之外调用）"""
+    _evict_callbacks.append(callback)
+
+
+def _notify_evicted(evicted):
+    for key, engine in evicted:
+        for callback in _evict_callbacks:
+            callback(key, engine)
+
+
+def _current_rss() -> int:
+    """读取当前进程常驻内存（字节），非 Linux 平台返回 0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def parse_engine_sizes(value: str) -> dict:
+    """
+    解析 OCR_ENGINE_SIZE_MB
+
+    Returns:
+        dict: {(detection_model, recognition_model) 或 "*": 字节数}
+
+    Raises:
+        ValueError: 格式无效
+    """
+    sizes = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, sep, size_mb = item.rpartition("=")
+        models = tuple(m.strip() for m in name.split("/"))
+        if not sep or (name.strip() != "*" and (len(models) != 2 or not all(models))):
+            raise ValueError(f"OCR_ENGINE_SIZE_MB 格式无效: {item}")
+        sizes["*" if name.strip() == "*" else models] = int(float(size_mb) * 1024 * 1024)
+    return sizes
+
+
+def _import_framework():
+    # 访问属性触发 paddleocr（及 paddle）的实际导入
+    paddleocr.PaddleOCR
+
+
+def resolve_models(detection_model: Optional[str] = None, recognition_model: Optional[str] = None):
+    """补全默认模型名称，返回 (detection_model, recognition_model)"""
+    return (detection_model or DEFAULT_DETECTION_MODEL,
+            recognition_model or DEFAULT_RECOGNITION_MODEL)
+
+
+def engine_key(detection_model: Optional[str] = None, recognition_model: Optional[str] = None) -> str:
+    """引擎缓存键"""
+    detection_model, recognition_model = resolve_models(detection_model, recognition_model)
+    return f"{detection_model}_{recognition_model}_{OCR_LANGUAGE}"
+
+
+def _create_engine(detection_model: str, recognition_model: str):
+    kwargs = {}
+    # 推理线程数上限（多进程工作池会为每个子进程设置）
+    cpu_threads = os.environ.get("OCR_CPU_THREADS")
+    if cpu_threads:
+        kwargs['cpu_threads'] = int(cpu_threads)
+
+    # PaddleOCR 3.x unified interface with customizable models
+    return paddleocr.PaddleOCR(
+        text_detection_model_name=detection_model,  # 文本检测模型
+        text_recognition_model_name=recognition_model,  # 文本识别模型
+        lang=OCR_LANGUAGE,  # 语言设置
+        **ENGINE_OPTIONS,
+        **kwargs
+    )
+
+
+class _Entry:
+    __slots__ = ("engine", "size_bytes", "load_seconds")
+
+    def __init__(self, engine, size_bytes: int, load_seconds: float):
+        self.engine = engine
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+
+
+class EngineRegistry:
+    """
+    线程安全的 PaddleOCR 引擎缓存
+
+    Args:
+        budget_bytes: 引擎总内存预算，<= 0 表示不限制
+        factory: 构建引擎的函数 factory(detection_model, recognition_model)
+        prepare: 首次构建前调用一次（在测量 RSS 之前导入框架），None 表示不需要
+        sizes: 配置的引擎内存占用，格式同 parse_engine_sizes 的返回值
+    """
+
+    def __init__(self, budget_bytes: int = 0, factory=_create_engine, prepare: Optional[Callable] = _import_framework,
+                 sizes: Optional[dict] = None):
+        self.budget_bytes = budget_bytes
+        self._factory = factory
+        self._prepare = prepare
+        self._sizes = sizes or {}
+        self._engines = OrderedDict()  # key -> _Entry，按最近使用排序
+        self._lock = threading.Lock()  # 保护 _engines
+        # 串行化构建：保证同一键只构建一次，同时让 RSS 差值能归属到单个引擎
+        self._build_lock = threading.Lock()
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._engines.get(key)
+            if entry is not None:
+                self._engines.move_to_end(key)
+            return entry
+
+    def peek(self, key: str):
+        """已加载的引擎，不存在时返回 None（不计入命中统计、不改变 LRU 顺序）"""
+        with self._lock:
+            entry = self._engines.get(key)
+            return entry.engine if entry is not None else None
+
+    def touch(self, key: str):
+        """标记引擎被使用（调度器直接持有引擎时维持 LRU 顺序，不计入命中统计）"""
+        with self._lock:
+            if key in self._engines:
+                self._engines.move_to_end(key)
+
+    def get(self, detection_model: Optional[str] = None, recognition_model: Optional[str] = None):
+        """
+        获取或创建引擎实例
+
+        Returns:
+            PaddleOCR: OCR 实例
+        """
+        detection_model, recognition_model = resolve_models(detection_model, recognition_model)
+        key = engine_key(detection_model, recognition_model)
+        labels = {'detection_model': detection_model, 'recognition_model': recognition_model}
+
+        entry = self._lookup(key)
+        if entry is not None:
+            _cache_hits.inc(**labels)
+            return entry.engine
+
+        with self._build_lock:
+            # 等待期间可能已被其他线程构建完成
+            entry = self._lookup(key)
+            if entry is not None:
+                _cache_hits.inc(**labels)
+                return entry.engine
+
+            _cache_misses.inc(**labels)
+            if self._prepare is not None:
+                self._prepare()
+                self._prepare = None
+            rss_before = _current_rss()
+            start = time.perf_counter()
+            engine = self._factory(detection_model, recognition_model)
+            load_seconds = time.perf_counter() - start
+            size_bytes = self._sizes.get((detection_model, recognition_model), self._sizes.get("*"))
+            if size_bytes is None:
+                size_bytes = max(_current_rss() - rss_before, 0)
+            _engine_loads.inc(**labels)
+            _load_seconds.observe(load_seconds, **labels)
+
+            with self._lock:
+                self._engines[key] = _Entry(engine, size_bytes, load_seconds)
+                evicted = self._evict_locked(keep=key)
+                self._update_gauges_locked()
+
+        if evicted:
+            _notify_evicted(evicted)
+            del evicted
+            # 释放被淘汰引擎持有的推理资源
+            gc.collect()
+        return engine
+
+    def _evict_locked(self, keep: str) -> list:
+        """按 LRU 淘汰超出预算的引擎，返回 [(key, engine)]"""
+        if self.budget_bytes <= 0:
+            return []
+        evicted = []
+        total = sum(e.size_bytes for e in self._engines.values())
+        for key in list(self._engines.keys()):
+            if total <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            entry = self._engines.pop(key)
+            total -= entry.size_bytes
+            evicted.append((key, entry.engine))
+            _engine_evictions.inc()
+        return evicted
+
+    def _update_gauges_locked(self):
+        _resident_bytes.set(sum(e.size_bytes for e in self._engines.values()))
+        _resident_engines.set(len(self._engines))
+
+    def clear(self):
+        """卸载全部引擎"""
+        with self._lock:
+            evicted = [(key, entry.engine) for key, entry in self._engines.items()]
+            self._engines.clear()
+            self._update_gauges_locked()
+        _notify_evicted(evicted)
+        del evicted
+        gc.collect()
+
+    def stats(self) -> dict:
+        """当前已加载引擎及其估算内存占用"""
+        with self._lock:
+            engines = [
+                {
+                    'key': key,
+                    'size_bytes': entry.size_bytes,
+                    'load_seconds': round(entry.load_seconds, 3)
+                }
+                for key, entry in self._engines.items()
+            ]
+        return {
+            'budget_bytes': self.budget_bytes,
+            'resident_bytes': sum(e['size_bytes'] for e in engines),
+            'engines': engines,
+            'hits': _cache_hits.total(),
+            'misses': _cache_misses.total(),
+            'loads': _engine_loads.total(),
+            'evictions': _engine_evictions.value()
+        }
+
+
+# 全局共享实例
+registry = EngineRegistry(budget_bytes=int(ENGINE_MEMORY_BUDGET_MB * 1024 * 1024),
+                          sizes=parse_engine_sizes(ENGINE_SIZE_MB))
+
+
+def get_engine(detection_model: Optional[str] = None, recognition_model: Optional[str] = None):
+    """从全局注册表获取引擎实例"""
+    return registry.get(detection_model, recognition_model)
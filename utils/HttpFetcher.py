@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+URL 下载
+
+/ocr/predict-by-url 与 /pdf/predict-by-url 共用一个 httpx.AsyncClient：
+- 连接池与 keep-alive，重复访问同一主机不再每次新建连接
+- 同时进行的下载数不超过 OCR_FETCH_CONCURRENCY
+- 响应体边接收边检查大小，超过 OCR_FETCH_MAX_MB 立即中止（Content-Length
+  已声明超限时不读取响应体）
+- 响应体只保留一份：声明了 Content-Length 时写入预先分配的 bytearray，
+  否则写入 SpooledTemporaryFile（超过 OCR_UPLOAD_SPOOL_MB 转存到临时文件），
+  返回 upload_content 视图
+- 下载耗时记录为 download 阶段
+- fetch_range 支持 HTTP 范围请求（RemotePdf 按需读取大文件的部分字节）
+
+客户端绑定创建它的事件循环，应用关闭时由 lifespan 调用 close_fetcher 释放连接。
+"""
+
+import asyncio
+import mmap
+import os
+import re
+import time
+from typing import Optional, Tuple, Union
+
+from utils.BlockingExecutor import run_blocking
+from utils.BodyReader import new_spool, upload_content, write_spool
+from utils.LazyImport import lazy_module
+from utils.Telemetry import observe_stage
+
+httpx = lazy_module("httpx")
+
+FETCH_TIMEOUT = float(os.environ.get("OCR_FETCH_TIMEOUT", "30"))
+FETCH_MAX_BYTES = int(float(os.environ.get("OCR_FETCH_MAX_MB", "50")) * 1024 * 1024)
+FETCH_CONCURRENCY = max(int(os.environ.get("OCR_FETCH_CONCURRENCY", "8")), 1)
+# 连接池大小与空闲连接保留数
+FETCH_MAX_CONNECTIONS = max(int(os.environ.get("OCR_FETCH_MAX_CONNECTIONS", "20")), 1)
+FETCH_KEEPALIVE = max(int(os.environ.get("OCR_FETCH_KEEPALIVE", "10")), 0)
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+# fetch 返回的响应体：bytearray（已知长度）、bytes 或 mmap.mmap（见 BodyReader.upload_content）
+Content = Union[bytearray, bytes, mmap.mmap]
+
+_client = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_loop = None
+
+
+class FetchError(Exception):
+    """下载失败（网络错误、非 2xx 状态码）"""
+
+
+class DownloadTooLarge(FetchError):
+    """响应体超过大小上限"""
+
+
+def _get_client():
+    global _client, _semaphore, _loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=FETCH_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=FETCH_MAX_CONNECTIONS,
+                                max_keepalive_connections=FETCH_KEEPALIVE)
+        )
+        _semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+        _loop = loop
+    return _client
+
+
+def _check_size(size: int, limit: int, url: str):
+    if size > limit:
+        raise DownloadTooLarge(f"{url} 超过大小上限 {limit / (1024 * 1024):g}MB")
+
+
+async def _read_content(response, limit: int, url: str) -> Content:
+    """按块读取响应体，不保留块列表，峰值内存约为一份响应体"""
+    declared = response.headers.get("content-length")
+    encoding = response.headers.get("content-encoding", "identity").strip().lower()
+    # 压缩传输时 Content-Length 是压缩后的大小，不能用来预先分配
+    if declared and declared.isdigit() and encoding == "identity":
+        buffer = bytearray(min(int(declared), limit))
+        received = 0
+        async for chunk in response.aiter_bytes():
+            _check_size(received + len(chunk), limit, url)
+            buffer[received:received + len(chunk)] = chunk
+            received += len(chunk)
+        del buffer[received:]
+        return buffer
+
+    spool = new_spool()
+    try:
+        received = 0
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            _check_size(received, limit, url)
+            await write_spool(spool, chunk)
+        return await run_blocking(upload_content, spool)
+    finally:
+        spool.close()
+
+
+async def fetch(url: str, labels: dict, headers: Optional[dict] = None,
+                max_bytes: int = FETCH_MAX_BYTES) -> Tuple[int, Optional[Content], dict]:
+    """
+    发送 GET 请求并读取响应体
+
+    Args:
+        headers: 附加请求头（如条件请求的 If-None-Match / If-Modified-Since）
+
+    Returns:
+        tuple: (status_code, content, response_headers)，304 时 content 为 None
+
+    Raises:
+        DownloadTooLarge: 声明或实际大小超过 max_bytes
+        FetchError: 网络错误或 304 以外的非 2xx 状态码
+    """
+    client = _get_client()
+    async with _semaphore:
+        start = time.perf_counter()
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304:
+                    return 304, None, dict(response.headers)
+                response.raise_for_status()
+                declared = response.headers.get("content-length")
+                if declared and declared.isdigit():
+                    _check_size(int(declared), max_bytes, url)
+                content = await _read_content(response, max_bytes, url)
+                status_code, response_headers = response.status_code, dict(response.headers)
+        except FetchError:
+            raise
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise FetchError(str(e)) from e
+        finally:
+            observe_stage('download', time.perf_counter() - start, labels)
+    return status_code, content, response_headers
+
+
+async def fetch_bytes(url: str, labels: dict, max_bytes: int = FETCH_MAX_BYTES) -> Content:
+    """下载 url 的完整响应体（异常同 fetch）"""
+    _, content, _ = await fetch(url, labels, max_bytes=max_bytes)
+    return content
+
+
+async def fetch_range(url: str, labels: dict, start: int, end: int,
+                      if_range: Optional[str] = None) -> Tuple[Optional[int], Content, dict]:
+    """
+    请求 [start, end]（含两端）字节
+
+    Args:
+        if_range: 上次响应的 ETag / Last-Modified；文件已变化时服务器返回完整内容（视为不支持）
+
+    Returns:
+        tuple: (total_size, content, response_headers)；服务器不支持范围请求（未返回 206）
+               或总大小未知时 total_size 为 None、content 为 b""，此时不读取响应体
+
+    Raises:
+        FetchError: 网络错误或非 2xx 状态码
+    """
+    headers = {'Range': f"bytes={start}-{end}"}
+    if if_range:
+        headers['If-Range'] = if_range
+    client = _get_client()
+    async with _semaphore:
+        started = time.perf_counter()
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                response.raise_for_status()
+                match = _CONTENT_RANGE.match(response.headers.get("content-range", ""))
+                if response.status_code != 206 or match is None or match.group(3) == "*":
+                    return None, b"", dict(response.headers)
+                # 服务器可以返回比请求更短的范围（到文件末尾为止）
+                expected = int(match.group(2)) - int(match.group(1)) + 1
+                content = await _read_content(response, expected, url)
+                return int(match.group(3)), content, dict(response.headers)
+        except FetchError:
+            raise
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise FetchError(str(e)) from e
+        finally:
+            observe_stage('download', time.perf_counter() - started, labels)
+
+
+async def close_fetcher():
+    """关闭共享客户端（应用关闭时调用）"""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
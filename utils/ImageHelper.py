@@ -1,35 +1,75 @@
 # -*- coding: utf-8 -*-
 
-import base64
-
-import cv2
 import numpy as np
 
+from utils.BodyReader import decode_base64
+from utils.LazyImport import lazy_module
+
+cv2 = lazy_module("cv2")
+
+
+def _decode(buffer) -> np.ndarray:
+    if len(buffer) == 0:
+        raise ValueError("图片数据为空")
+    image_np = cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image_np is None:
+        raise ValueError("无法解码图片数据")
+    return image_np
+
+
+def base64_to_bytes(b64_data: str) -> bytearray:
+    """base64转字节（分段解码，不生成整个字符串的字节副本）
+
+    Args:
+        b64_data (str): base64数据，可带 data URI 前缀
+
+    Raises:
+        ValueError: base64 格式无效
+    """
+    return decode_base64(b64_data)
+
 
 def base64_to_ndarray(b64_data: str):
     """base64转numpy数组
 
     Args:
-        b64_data (str): base64数据
+        b64_data (str): base64数据，可带 data URI 前缀
 
     Returns:
-        _type_: _description_
+        np.ndarray: BGR 图像
+
+    Raises:
+        ValueError: base64 或图片格式无效
     """
-    image_bytes = base64.b64decode(b64_data)
-    image_np = np.frombuffer(image_bytes, dtype=np.uint8)
-    image_np2 = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
-    return image_np2
+    return _decode(base64_to_bytes(b64_data))
 
 
-def bytes_to_ndarray(img_bytes: str):
+def bytes_to_ndarray(img_bytes: bytes):
     """字节转numpy数组
 
     Args:
-        img_bytes (str): 图片字节
+        img_bytes (bytes): 图片字节，支持 bytes / bytearray / memoryview
+
+    Returns:
+        np.ndarray: BGR 图像
+
+    Raises:
+        ValueError: 图片格式无效
+    """
+    return _decode(img_bytes)
+
+
+def file_to_ndarray(file_obj):
+    """从文件对象读取并解码图片
+
+    Args:
+        file_obj: 二进制文件对象
 
     Returns:
-        _type_: _description_
+        np.ndarray: BGR 图像
+
+    Raises:
+        ValueError: 图片格式无效
     """
-    image_array = np.frombuffer(img_bytes, dtype=np.uint8)
-    image_np2 = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-    return image_np2
+    file_obj.seek(0)
+    return _decode(file_obj.read())
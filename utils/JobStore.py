@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+异步识别任务存储（SQLite）
+
+任务元数据与逐页结果都保存在 OCR_JOB_DIR/jobs.db 中：每识别完一页即写入
+pages 表作为检查点，进程重启后未完成的任务从缺失的页码继续，
+不会从头重做。上传的输入文件保存在同一目录下。
+
+多个进程（uvicorn 多 worker 或共享数据库的多个副本）可以同时处理任务：
+claim_next 以条件更新抢占任务并记录 owner，运行中的任务由 heartbeat 定期
+续约；只有心跳超过 OCR_JOB_LEASE_SECONDS 未更新的任务（其进程已退出）
+才会被 requeue_stale 重新排队，不会抢走仍在运行的任务。
+
+失败的任务保留输入文件与检查点，可由 requeue 重新排队并只重做缺失的页面；
+结束超过 OCR_JOB_RETENTION_HOURS 的已完成 / 失败任务由 purge_expired 删除。
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+JOB_DIR = os.environ.get("OCR_JOB_DIR", os.path.join(tempfile.gettempdir(), "paddleocr_jobs"))
+# 运行中任务的租约时长（秒）：心跳超过该时间未更新即视为其进程已退出
+JOB_LEASE_SECONDS = max(float(os.environ.get("OCR_JOB_LEASE_SECONDS", "60")), 1.0)
+# 已完成或失败的任务（结果、检查点与输入文件）保留的小时数，0 表示永久保留
+JOB_RETENTION_HOURS = float(os.environ.get("OCR_JOB_RETENTION_HOURS", "168"))
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    filename TEXT,
+    input_path TEXT NOT NULL,
+    detection_model TEXT,
+    recognition_model TEXT,
+    webhook_url TEXT,
+    total_pages INTEGER,
+    done_pages INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    heartbeat_at REAL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    job_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    result TEXT,
+    PRIMARY KEY (job_id, page)
+);
+"""
+
+_JOB_COLUMNS = ("id", "status", "kind", "mode", "filename", "input_path", "detection_model",
+                "recognition_model", "webhook_url", "total_pages", "done_pages", "error",
+                "created_at", "updated_at", "owner", "heartbeat_at")
+
+# 旧版数据库缺少的列
+_ADDED_COLUMNS = {"owner": "TEXT", "heartbeat_at": "REAL"}
+
+
+class JobStore:
+    """
+    线程安全的任务存储
+
+    Args:
+        directory: 数据库与输入文件所在目录
+        lease_seconds: 运行中任务的租约时长
+
+    Attributes:
+        owner: 本实例的标识，写入所抢占任务的 owner 列
+    """
+
+    def __init__(self, directory: str = JOB_DIR, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.directory = directory
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "jobs.db"), check_same_thread=False,
+                                     timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, column_type in _ADDED_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+        self._conn.commit()
+
+    def new_input_path(self, job_id: str, suffix: str) -> str:
+        """任务输入文件的保存路径"""
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    @staticmethod
+    def new_job_id() -> str:
+        return uuid.uuid4().hex
+
+    def create(self, job_id: str, kind: str, mode: str, input_path: str, filename: Optional[str] = None,
+               detection_model: Optional[str] = None, recognition_model: Optional[str] = None,
+               webhook_url: Optional[str] = None) -> dict:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, kind, mode, filename, input_path, detection_model,"
+                " recognition_model, webhook_url, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, kind, mode, filename, input_path, detection_model,
+                 recognition_model, webhook_url, now, now)
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(_JOB_COLUMNS, row)) if row else None
+
+    def update(self, job_id: str, **fields):
+        """更新任务字段（status / total_pages / error 等）"""
+        fields['updated_at'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def claim_next(self) -> Optional[dict]:
+        """取出最早的排队任务，标记为 running 并记录 owner；其它进程同时抢占时只有一个成功"""
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (STATUS_QUEUED,)
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, heartbeat_at = ?, updated_at = ?"
+                    " WHERE id = ? AND status = ?",
+                    (STATUS_RUNNING, self.owner, now, now, row[0], STATUS_QUEUED)
+                )
+                self._conn.commit()
+                if cursor.rowcount:
+                    break
+        return self.get(row[0])
+
+    def heartbeat(self) -> int:
+        """为本实例正在运行的任务续约，返回任务数"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?",
+                (time.time(), STATUS_RUNNING, self.owner)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def requeue_stale(self) -> int:
+        """把心跳超过租约时长的运行中任务（其进程已退出）重新排队，返回任务数"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ?"
+                " WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (STATUS_QUEUED, now, STATUS_RUNNING, now - self.lease_seconds)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> bool:
+        """
+        结束本实例持有的任务
+
+        Returns:
+            bool: 任务已因租约过期被重新排队（不再属于本实例）时返回 False，状态不变
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (status, error, time.time(), job_id, self.owner, STATUS_RUNNING)
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def requeue(self, job_id: str) -> bool:
+        """
+        把失败的任务重新排队，已写入检查点的页面不再重做
+
+        Returns:
+            bool: 任务不存在或不是失败状态时返回 False
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = NULL, owner = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                (STATUS_QUEUED, time.time(), job_id, STATUS_FAILED)
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def purge_expired(self, retention_hours: float = JOB_RETENTION_HOURS) -> int:
+        """删除结束超过 retention_hours 的已完成 / 失败任务及其检查点与输入文件，返回任务数"""
+        if retention_hours <= 0:
+            return 0
+        cutoff = time.time() - retention_hours * 3600
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, input_path FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (STATUS_DONE, STATUS_FAILED, cutoff)
+            ).fetchall()
+            for job_id, _ in rows:
+                self._conn.execute("DELETE FROM pages WHERE job_id = ?", (job_id,))
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+        for _, input_path in rows:
+            try:
+                os.unlink(input_path)
+            except OSError:
+                pass
+        return len(rows)
+
+    def save_page(self, job_id: str, page: int, result):
+        """写入单页结果检查点并更新进度"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (job_id, page, result) VALUES (?, ?, ?)",
+                (job_id, page, json.dumps(result, ensure_ascii=False))
+            )
+            self._conn.execute(
+                "UPDATE jobs SET done_pages = (SELECT COUNT(*) FROM pages WHERE job_id = ?), updated_at = ?"
+                " WHERE id = ?", (job_id, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def completed_pages(self, job_id: str) -> set:
+        with self._lock:
+            rows = self._conn.execute("SELECT page FROM pages WHERE job_id = ?", (job_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def results(self, job_id: str) -> List:
+        """按页码顺序返回全部单页结果"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result FROM pages WHERE job_id = ? ORDER BY page", (job_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+进程内指标收集
+
+提供线程安全的计数器 (Counter)、仪表 (Gauge) 与直方图 (Histogram)，
+按名称注册到全局表，供 /stats 导出 JSON 快照、/metrics 导出 Prometheus 文本格式。
+"""
+
+import bisect
+import threading
+from typing import Dict, Tuple
+
+_registry_lock = threading.Lock()
+_metrics: Dict[str, "_Metric"] = {}
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def snapshot(self) -> dict:
+        """返回 {labels_tuple: value} 的拷贝"""
+        with self._lock:
+            return dict(self._values)
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        """全部标签组合之和"""
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+# 默认分桶（秒），覆盖毫秒级到分钟级的耗时
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram(_Metric):
+    """
+    累积分桶直方图
+
+    每个标签组合记录 {'buckets': [各桶累计计数], 'count': int, 'sum': float}，
+    最后一个桶对应 +Inf。observe 只用二分查找累加落入的那一个桶，
+    累计计数在导出时才计算，热路径上开销很小。
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # buckets 保存各桶自身的计数（非累计）
+                state = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+                self._values[key] = state
+            state['buckets'][index] += 1
+            state['count'] += 1
+            state['sum'] += value
+
+    def cumulative(self) -> dict:
+        """返回 {labels_tuple: ([各桶累计计数], count, sum)}"""
+        with self._lock:
+            states = [(key, list(state['buckets']), state['count'], state['sum'])
+                      for key, state in self._values.items()]
+        result = {}
+        for key, counts, count, total in states:
+            running = 0
+            for i, c in enumerate(counts):
+                running += c
+                counts[i] = running
+            result[key] = (counts, count, total)
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            key: {
+                'buckets': dict(zip((str(b) for b in self.buckets), counts)),
+                'count': count,
+                'sum': total
+            }
+            for key, (counts, count, total) in self.cumulative().items()
+        }
+
+
+def _get_or_create(cls, name: str, documentation: str, labelnames=(), **kwargs):
+    with _registry_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = cls(name, documentation, labelnames, **kwargs)
+            _metrics[name] = metric
+        elif type(metric) is not cls:
+            raise ValueError(f"指标 {name} 已以 {metric.kind} 类型注册")
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    """获取或注册计数器"""
+    return _get_or_create(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames=()) -> Gauge:
+    """获取或注册仪表"""
+    return _get_or_create(Gauge, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    """获取或注册直方图"""
+    return _get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def snapshot() -> dict:
+    """
+    导出全部指标的 JSON 友好快照
+
+    Returns:
+        dict: {指标名: {'type': str, 'values': [{'labels': dict, 'value': ...}]}}
+    """
+    with _registry_lock:
+        metrics = list(_metrics.values())
+    result = {}
+    for metric in metrics:
+        values = []
+        for key, value in sorted(metric.snapshot().items()):
+            values.append({
+                'labels': dict(zip(metric.labelnames, key)),
+                'value': value
+            })
+        result[metric.name] = {'type': metric.kind, 'values': values}
+    return result
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render_prometheus() -> str:
+    """导出全部指标的 Prometheus 文本格式（version 0.0.4）"""
+    with _registry_lock:
+        metrics = sorted(_metrics.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        documentation = metric.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {metric.name} {documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if isinstance(metric, Histogram):
+            for key, (counts, count, total) in sorted(metric.cumulative().items()):
+                for bound, cumulative in zip(metric.buckets, counts):
+                    labels = _format_labels(metric.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{metric.name}_count{labels} {count}")
+        else:
+            for key, value in sorted(metric.snapshot().items()):
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,532 @@
+# -*- coding: utf-8 -*-
+"""
+PDF 页面光栅化
+
+/ocr 与 /pdf 路由共用的渲染实现：页面经 PyMuPDF 渲染为 Pixmap 后，
+直接以 numpy 视图读取其像素缓冲区，转换为 BGR 后交给 OCR，
+全程不做 PNG 编码、不写临时文件。
+
+渲染在后台线程中进行，最多领先 OCR_PDF_LOOKAHEAD 页：第 N 页识别的同时
+渲染第 N+1 页，两阶段之间是固定容量的队列，页面缓冲区循环复用，
+因此内存占用与文档页数无关。
+
+text_layer=True 时先检查页面自带的文本层：软件生成的 PDF 可直接读出
+文本行及其坐标（换算到渲染坐标系），这些页面不再渲染和识别。
+vector_tables=True 时先用 PyMuPDF 的表格检测（矢量框线 + 文本）提取表格，
+检测成功的页面同样不再渲染和识别。
+
+渲染倍率按页选择（choose_zoom）：默认 2 倍；可按文本层的字号估算使文字
+渲染到 OCR_PDF_TARGET_TEXT_PX 像素高；单页像素数不超过 OCR_PDF_MAX_PIXELS。
+无论实际倍率是多少，返回给客户端的坐标统一换算到"坐标空间"：
+PDF 页面尺寸（点，已按页面旋转）× COORDINATE_ZOOM（= 2），
+即与旧版固定 2 倍渲染时的像素坐标一致。
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from utils.LazyImport import lazy_module
+
+# 首次使用时导入
+cv2 = lazy_module("cv2")
+fitz = lazy_module("fitz")  # PyMuPDF - PDF处理库
+
+# 渲染倍率，2.0 表示 2 倍放大（提高 OCR 识别精度）
+DEFAULT_ZOOM = 2.0
+# 返回坐标所在的坐标空间：PDF 点 × COORDINATE_ZOOM
+COORDINATE_ZOOM = DEFAULT_ZOOM
+
+# 单页渲染像素上限（宽 × 高），超出时降低倍率；0 表示不限制
+PDF_MAX_PIXELS = int(float(os.environ.get("OCR_PDF_MAX_PIXELS", "16000000")))
+# 按字号估算倍率时的上下限
+PDF_MIN_ZOOM = float(os.environ.get("OCR_PDF_MIN_ZOOM", "1.0"))
+PDF_MAX_ZOOM = float(os.environ.get("OCR_PDF_MAX_ZOOM", "4.0"))
+# 文字渲染后的目标高度（像素），> 0 时按文本层中位字号选择倍率；0 表示关闭
+PDF_TARGET_TEXT_PX = float(os.environ.get("OCR_PDF_TARGET_TEXT_PX", "0"))
+
+# 单次请求最多处理的页数（按页码选择后计算），超出时直接拒绝；0 表示不限制
+PDF_MAX_PAGES = max(int(os.environ.get("OCR_PDF_MAX_PAGES", "0")), 0)
+
+# 渲染线程最多领先识别的页数，0 表示在调用线程中同步渲染
+PDF_LOOKAHEAD = max(int(os.environ.get("OCR_PDF_LOOKAHEAD", "1")), 0)
+
+# 文本层至少包含多少个非空白字符才视为可用（少于此数的页面按扫描件处理）
+TEXT_LAYER_MIN_CHARS = int(os.environ.get("OCR_TEXT_LAYER_MIN_CHARS", "20"))
+# 无法映射到 Unicode 的字符（U+FFFD）占比超过该值时视为乱码文本层
+TEXT_LAYER_MAX_INVALID_RATIO = 0.1
+
+# 影响整份文档结果的渲染设置（渲染倍率、返回的坐标与文本层取舍），
+# 作为结果缓存键的一部分：调整这些设置后磁盘层中的旧结果不再命中
+RENDER_SETTINGS = (DEFAULT_ZOOM, PDF_MAX_PIXELS, PDF_MIN_ZOOM, PDF_MAX_ZOOM, PDF_TARGET_TEXT_PX,
+                   TEXT_LAYER_MIN_CHARS, TEXT_LAYER_MAX_INVALID_RATIO)
+
+# MuPDF 不是线程安全的，所有文档操作都在这把锁内进行
+_fitz_lock = threading.RLock()
+
+_DONE = object()
+
+
+def open_pdf(source):
+    """
+    打开 PDF 文档
+
+    Args:
+        source: 文件路径，或 PDF 字节内容（bytes / bytearray / memoryview / mmap）
+
+    Returns:
+        fitz.Document: 文档对象，调用者负责 close()
+    """
+    if isinstance(source, (bytearray, mmap.mmap)):
+        # PyMuPDF 会把 bytearray 复制为 bytes；memoryview 直接引用原内存
+        source = memoryview(source)
+    with _fitz_lock:
+        if isinstance(source, (bytes, memoryview)):
+            return fitz.open(stream=source, filetype="pdf")
+        return fitz.open(source)
+
+
+def pixmap_to_ndarray(pix, out: np.ndarray = None) -> np.ndarray:
+    """
+    将 RGB Pixmap 转换为 BGR numpy 数组
+
+    Pixmap 的 samples 缓冲区以零拷贝视图读取，只在颜色通道转换时
+    写入一次目标数组。
+
+    Args:
+        pix: 无 alpha 通道的 RGB fitz.Pixmap
+        out: 可选的复用缓冲区，形状需为 (height, width, 3)
+
+    Returns:
+        np.ndarray: BGR 图像（若提供 out 则就是 out）
+    """
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    rgb = samples.reshape(pix.height, pix.stride)[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=out)
+
+
+class _BufferPool:
+    """按图像尺寸复用 BGR 缓冲区，空闲缓冲区数量有上限"""
+
+    def __init__(self, max_free: int):
+        self.max_free = max_free
+        self._free = {}  # (height, width) -> [np.ndarray]
+        self._lock = threading.Lock()
+
+    def acquire(self, shape):
+        with self._lock:
+            free = self._free.get(shape)
+            return free.pop() if free else None
+
+    def release(self, image: np.ndarray):
+        if image is None:
+            return
+        with self._lock:
+            free = self._free.setdefault(image.shape[:2], [])
+            if len(free) < self.max_free:
+                free.append(image)
+
+
+class _RenderError:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def page_count(source) -> int:
+    """读取 PDF 页数（只解析文档结构，不渲染）"""
+    pdf_document = open_pdf(source)
+    try:
+        return len(pdf_document)
+    finally:
+        with _fitz_lock:
+            pdf_document.close()
+
+
+class PageLimitExceeded(ValueError):
+    """请求处理的页数超过 OCR_PDF_MAX_PAGES"""
+
+
+def parse_page_ranges(spec: str) -> List[int]:
+    """
+    解析页码范围，如 "1-3,10" -> [1, 2, 3, 10]
+
+    Returns:
+        list: 去重并升序排列的页码（从 1 开始）
+
+    Raises:
+        ValueError: 格式无效
+    """
+    pages = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition('-')
+        try:
+            first = int(start)
+            last = int(end) if sep else first
+        except ValueError:
+            raise ValueError(f"无效的页码范围: {part}")
+        if first < 1 or last < first:
+            raise ValueError(f"无效的页码范围: {part}")
+        pages.update(range(first, last + 1))
+    if not pages:
+        raise ValueError("页码范围为空")
+    return sorted(pages)
+
+
+def select_pages(source, pages: Optional[str] = None, max_pages: Optional[int] = None,
+                 limit: int = PDF_MAX_PAGES, total: Optional[int] = None):
+    """
+    在渲染之前确定要处理的页码，并检查页数上限
+
+    只读取文档页数（不渲染），页数过多的请求在此被拒绝。
+
+    Args:
+        source: PDF 文件路径或字节内容
+        pages: 页码范围字符串（如 "1-3,10"），None 表示全部页面；超出文档页数的页码被忽略
+        max_pages: 最多处理前多少页（在页码范围之后应用）
+        limit: 页数上限，0 表示不限制
+        total: 已知的文档总页数，给出时不再打开 source
+
+    Returns:
+        tuple: (page_nums, total)，page_nums 为要处理的页码列表，total 为文档总页数
+
+    Raises:
+        ValueError: 页码范围无效或没有可处理的页面
+        PageLimitExceeded: 要处理的页数超过 limit
+    """
+    if total is None:
+        total = page_count(source)
+    if pages:
+        page_nums = [p for p in parse_page_ranges(pages) if p <= total]
+        if not page_nums:
+            raise ValueError(f"页码范围 {pages} 超出文档页数 {total}")
+    else:
+        page_nums = list(range(1, total + 1))
+    if max_pages is not None:
+        if max_pages < 1:
+            raise ValueError("max_pages 必须大于 0")
+        page_nums = page_nums[:max_pages]
+    if limit > 0 and len(page_nums) > limit:
+        raise PageLimitExceeded(
+            f"请求处理 {len(page_nums)} 页，超过上限 {limit} 页；请使用 pages / max_pages 参数或异步任务接口 /jobs"
+        )
+    return page_nums, total
+
+
+def extract_text_layer(page, zoom: float = DEFAULT_ZOOM):
+    """
+    读取页面文本层，返回与 PaddleOCR 相同结构的文本行与边界框
+
+    坐标经页面旋转矩阵与 zoom 换算，与按同一倍率渲染后的 OCR 结果处于
+    同一坐标系。调用方需持有 _fitz_lock。
+
+    Args:
+        page: fitz.Page
+        zoom (float): 渲染倍率
+
+    Returns:
+        dict or None: {'input_path': '', 'rec_texts': list[str], 'rec_boxes': list[[x1, y1, x2, y2]]}，
+                      文本层不可用（扫描件、字符过少或乱码）时返回 None
+    """
+    mat = page.rotation_matrix * fitz.Matrix(zoom, zoom)
+    rec_texts = []
+    rec_boxes = []
+    chars = 0
+    invalid = 0
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        for line in block.get("lines", ()):
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if not text:
+                continue
+            rect = fitz.Rect(line["bbox"]) * mat
+            rec_texts.append(text)
+            rec_boxes.append([int(round(rect.x0)), int(round(rect.y0)), int(round(rect.x1)), int(round(rect.y1))])
+            chars += sum(1 for c in text if not c.isspace())
+            invalid += text.count("\ufffd")
+
+    if chars < TEXT_LAYER_MIN_CHARS or invalid > chars * TEXT_LAYER_MAX_INVALID_RATIO:
+        return None
+    return {'input_path': '', 'rec_texts': rec_texts, 'rec_boxes': rec_boxes}
+
+
+def _median_text_size(page):
+    """文本层中文字的中位字号（点），没有文本层时返回 None"""
+    sizes = []
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                if span["text"].strip():
+                    sizes.append(span["size"])
+    if not sizes:
+        return None
+    sizes.sort()
+    return sizes[len(sizes) // 2]
+
+
+def choose_zoom(page, base_zoom: float = DEFAULT_ZOOM, max_pixels: int = PDF_MAX_PIXELS,
+                target_text_px: float = PDF_TARGET_TEXT_PX) -> float:
+    """
+    为单页选择渲染倍率
+
+    1. 默认使用 base_zoom
+    2. target_text_px > 0 且页面有文本层时，按中位字号换算使文字约为 target_text_px 像素高，
+       并限制在 [OCR_PDF_MIN_ZOOM, OCR_PDF_MAX_ZOOM] 内
+    3. 渲染后像素数超过 max_pixels 时按比例降低倍率（优先于下限）
+
+    调用方需持有 _fitz_lock。
+    """
+    zoom = base_zoom
+    if target_text_px > 0:
+        text_size = _median_text_size(page)
+        if text_size:
+            zoom = min(max(target_text_px / text_size, PDF_MIN_ZOOM), PDF_MAX_ZOOM)
+    area = page.rect.width * page.rect.height
+    if max_pixels > 0 and area > 0 and area * zoom * zoom > max_pixels:
+        zoom = math.sqrt(max_pixels / area)
+    return zoom
+
+
+def to_coordinate_space(boxes, scale: float):
+    """
+    把渲染图像上的边界框换算到坐标空间
+
+    Args:
+        boxes: [[x1, y1, x2, y2], ...]（list 或 numpy 数组）
+        scale: pdf_to_images 页面信息中的 'scale'
+
+    Returns:
+        list: 换算并取整后的边界框
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    if boxes.size == 0:
+        return []
+    if scale != 1.0:
+        boxes = boxes * scale
+    return np.rint(boxes).astype(np.int64).tolist()
+
+
+def _clean_cell(value) -> str:
+    return " ".join(str(value).split()) if value is not None else ""
+
+
+def extract_vector_table(page, min_cols: int = 2):
+    """
+    用 PyMuPDF 的矢量表格检测提取页面中最大的表格
+
+    只依赖 PDF 中的框线与文本，不渲染也不识别；扫描件或没有框线的页面
+    检测不到表格。调用方需持有 _fitz_lock。
+
+    Args:
+        page: fitz.Page
+        min_cols (int): 表格最少列数
+
+    Returns:
+        dict or None: {'headers': list[str], 'rows': list[list[str]]}，
+                      未检测到有效表格（至少表头 + 1 行数据且含文本）时返回 None
+    """
+    best = None
+    for table in page.find_tables().tables:
+        if table.col_count < min_cols:
+            continue
+        rows = [[_clean_cell(cell) for cell in row] for row in table.extract()]
+        rows = [row for row in rows if any(row)]
+        if len(rows) < 2:
+            continue
+        if best is None or len(rows) * len(rows[0]) > len(best) * len(best[0]):
+            best = rows
+    if best is None:
+        return None
+    return {'headers': best[0], 'rows': best[1:]}
+
+
+def page_fingerprint(image: np.ndarray) -> str:
+    """渲染结果的像素指纹：内容相同的页面（即使来自不同版本的文档）指纹相同"""
+    digest = hashlib.sha256(f"{image.shape}{image.dtype.str}".encode("ascii"))
+    digest.update(np.ascontiguousarray(image))
+    return digest.hexdigest()
+
+
+def _render_pages(source, zoom, pool: _BufferPool, pages=None, stop: threading.Event = None,
+                  fingerprint: bool = False, text_layer: bool = False, vector_tables: bool = False):
+    """逐页渲染（生成器），缓冲区从 pool 获取；zoom 为 None 时按页选择倍率"""
+    pdf_document = open_pdf(source)
+    try:
+        coordinate_mat = fitz.Matrix(COORDINATE_ZOOM, COORDINATE_ZOOM)
+        if pages is None:
+            page_indexes = range(len(pdf_document))
+        else:
+            page_indexes = [p - 1 for p in pages if 1 <= p <= len(pdf_document)]
+        for page_num in page_indexes:
+            if stop is not None and stop.is_set():
+                return
+            started = time.perf_counter()
+            extracted = None
+            with _fitz_lock:
+                pdf_page = pdf_document[page_num]
+                # 坐标空间中的页面尺寸
+                page_rect = pdf_page.rect * coordinate_mat
+                if text_layer:
+                    text = extract_text_layer(pdf_page, COORDINATE_ZOOM)
+                    if text is not None:
+                        extracted, page_source = [text], 'text_layer'
+                if extracted is None and vector_tables:
+                    table = extract_vector_table(pdf_page)
+                    if table is not None:
+                        extracted, page_source = table, 'vector_table'
+                if extracted is not None:
+                    pix = None
+                else:
+                    page_zoom = zoom if zoom is not None else choose_zoom(pdf_page)
+                    pix = pdf_page.get_pixmap(matrix=fitz.Matrix(page_zoom, page_zoom),
+                                              colorspace=fitz.csRGB, alpha=False)
+
+            if pix is None:
+                # 文本层或矢量表格可用：不渲染
+                yield {
+                    'page_num': page_num + 1,
+                    'image': None,
+                    'width': int(round(page_rect.width)),
+                    'height': int(round(page_rect.height)),
+                    'zoom': None,
+                    'scale': 1.0,
+                    'page_width': int(round(page_rect.width)),
+                    'page_height': int(round(page_rect.height)),
+                    'source': page_source,
+                    'extracted': extracted,
+                    'render_ms': (time.perf_counter() - started) * 1000
+                }
+                continue
+
+            shape = (pix.height, pix.width)
+            image = pixmap_to_ndarray(pix, pool.acquire(shape))
+            del pix
+
+            page = {
+                'page_num': page_num + 1,  # 页码从 1 开始
+                'image': image,
+                'width': shape[1],
+                'height': shape[0],
+                'zoom': round(page_zoom, 4),
+                'scale': COORDINATE_ZOOM / page_zoom,
+                'page_width': int(round(page_rect.width)),
+                'page_height': int(round(page_rect.height))
+            }
+            if fingerprint:
+                page['fingerprint'] = page_fingerprint(image)
+            page['render_ms'] = (time.perf_counter() - started) * 1000
+            yield page
+    finally:
+        with _fitz_lock:
+            pdf_document.close()
+
+
+def _produce(source, zoom, pool: _BufferPool, page_nums, pages: queue.Queue, stop: threading.Event,
+             fingerprint: bool, text_layer: bool, vector_tables: bool):
+    """渲染线程：把页面放入有界队列，队列满时阻塞等待识别阶段取走"""
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for page in _render_pages(source, zoom, pool, page_nums, stop, fingerprint, text_layer,
+                                  vector_tables):
+            if not _put(page):
+                return
+    except Exception as e:
+        _put(_RenderError(e))
+    finally:
+        _put(_DONE)
+
+
+def pdf_to_images(source, zoom: Optional[float] = None, lookahead: int = PDF_LOOKAHEAD, pages=None,
+                  fingerprint: bool = False, text_layer: bool = False, vector_tables: bool = False):
+    """
+    逐页渲染 PDF，产出可直接送入 predict 的 numpy 图像
+
+    处理流程：
+    1. 使用 PyMuPDF 打开 PDF 文档
+    2. 逐页渲染为 RGB Pixmap，倍率由 choose_zoom 按页选择（默认 2 倍，受像素预算限制）
+    3. 将 Pixmap 缓冲区转换为 BGR 数组，同尺寸页面循环复用缓冲区
+    4. lookahead > 0 时由后台线程提前渲染后续页面，与调用方的识别过程重叠
+
+    Args:
+        source: PDF 文件路径或字节内容
+        zoom (float): 固定渲染倍率，None 表示按页自动选择（choose_zoom）
+        lookahead (int): 渲染最多领先的页数（队列容量），0 表示同步渲染
+        pages: 只渲染这些页码（从 1 开始，按给定顺序），None 表示全部页面
+        fingerprint (bool): 是否计算每页的像素指纹（在渲染线程中完成）
+        text_layer (bool): 是否优先使用页面自带的文本层，可用时不渲染该页
+        vector_tables (bool): 是否优先用矢量表格检测提取表格，成功时不渲染该页
+
+    Yields:
+        dict: 每页图像信息：
+            {
+                'page_num': int,       # 页码（从1开始）
+                'image': np.ndarray,   # BGR 图像 (height, width, 3)
+                'width': int,          # 图像宽度（像素）
+                'height': int,         # 图像高度（像素）
+                'zoom': float,         # 实际渲染倍率
+                'scale': float,        # 图像像素坐标乘以该值即为坐标空间坐标
+                'page_width': int,     # 坐标空间中的页面宽度
+                'page_height': int,    # 坐标空间中的页面高度
+                'fingerprint': str,    # 像素指纹（仅 fingerprint=True 时）
+                'render_ms': float     # 渲染或直接提取的耗时（毫秒）
+            }
+
+        文本层或矢量表格可用的页面 'image' 为 None、'zoom' 为 None，坐标已在坐标空间中，并带有：
+            'source': 'text_layer' | 'vector_table',
+            'extracted': 文本层为 [{'input_path', 'rec_texts', 'rec_boxes'}]（与 predict 返回结构一致），
+                         矢量表格为 {'headers', 'rows'}
+
+    注意：
+        - 'image' 引用复用缓冲区，只在下一次迭代前有效；
+          需要保留时请自行 copy()
+        - 同时存在的页面缓冲区最多 lookahead + 2 个
+    """
+    pool = _BufferPool(max_free=lookahead + 2)
+
+    if lookahead <= 0:
+        for page in _render_pages(source, zoom, pool, pages, fingerprint=fingerprint,
+                                  text_layer=text_layer, vector_tables=vector_tables):
+            yield page
+            pool.release(page['image'])
+        return
+
+    rendered = queue.Queue(maxsize=lookahead)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce, args=(source, zoom, pool, pages, rendered, stop, fingerprint, text_layer, vector_tables),
+        name="pdf-render", daemon=True
+    )
+    producer.start()
+    try:
+        while True:
+            item = rendered.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _RenderError):
+                raise item.exc
+            yield item
+            # 调用方已处理完该页，缓冲区交还给渲染线程复用
+            pool.release(item['image'])
+    finally:
+        # 调用方提前结束迭代或出错时通知渲染线程退出
+        stop.set()
+        producer.join()
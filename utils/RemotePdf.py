@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+远程 PDF 按需读取（HTTP 范围请求）
+
+/pdf/predict-by-url 只需要大文件中的少数几页时，不下载整个文件：
+1. 先用范围请求读取第一个块，确认服务器支持 Range 并得到文件大小
+2. RangeFile 把远程文件包装成可 seek 的只读文件，按块（OCR_PDF_RANGE_BLOCK_KB）
+   读取并缓存，相邻的缺失块合并为一次请求
+3. pypdf 在其上只解析 xref、页面树路径上的节点以及所选页面引用的对象，
+   生成与原文档页数相同的子集 PDF：所选页面保留原内容，其余为空白占位页，
+   页码与坐标均与原文档一致，后续渲染 / 识别流程不变
+
+服务器不支持范围请求、文件小于 OCR_PDF_RANGE_MIN_MB、未安装 pypdf 或
+pypdf 无法解析时，调用方退回完整下载。
+
+RangeFile 的读取在阻塞任务线程池中进行，通过 anyio.from_thread 调用共享的
+异步 HTTP 客户端（见 HttpFetcher），因此 RemotePdf 的方法必须在 run_blocking 中调用。
+"""
+
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import anyio.from_thread
+
+from utils import Metrics
+from utils.HttpFetcher import FETCH_MAX_BYTES, DownloadTooLarge, FetchError, fetch_range
+from utils.LazyImport import lazy_module
+
+pypdf = lazy_module("pypdf")
+
+# 设为 0 关闭按需读取，总是完整下载
+RANGE_ENABLED = os.environ.get("OCR_PDF_RANGE", "1") != "0"
+# 小于该大小的文件直接完整下载
+RANGE_MIN_BYTES = int(float(os.environ.get("OCR_PDF_RANGE_MIN_MB", "16")) * 1024 * 1024)
+RANGE_BLOCK_BYTES = max(int(os.environ.get("OCR_PDF_RANGE_BLOCK_KB", "256")), 4) * 1024
+# 单个文档的块缓存上限
+RANGE_CACHE_BYTES = int(float(os.environ.get("OCR_PDF_RANGE_CACHE_MB", "64")) * 1024 * 1024)
+
+# 复制页面时不带入的键：注释中的链接 / 目标会引用其它页面，缩略图与文章线程与识别无关
+_EXCLUDED_PAGE_KEYS = ("/Annots", "/B", "/Thumb", "/Parent")
+# 页面树中可继承的属性
+_INHERITABLE = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+_loads = Metrics.counter("ocr_pdf_remote_loads_total", "远程 PDF 的读取方式（range: 按需读取; full: 完整下载）",
+                         ("mode",))
+_range_requests = Metrics.counter("ocr_pdf_range_requests_total", "按需读取发出的范围请求数")
+_range_bytes = Metrics.counter("ocr_pdf_range_bytes_total", "按需读取实际下载的字节数")
+
+
+class UnsupportedPdf(Exception):
+    """pypdf 无法按需解析该文档（不规范的 xref、非 PDF 内容等），应退回完整下载"""
+
+
+class RangeFile(io.RawIOBase):
+    """
+    按块读取并缓存的远程只读文件
+
+    Args:
+        size: 文件大小
+        fetch: fetch(start, end) 返回 [start, end]（含两端）的字节
+        block_size: 块大小
+        max_cached_bytes: 块缓存上限（LRU）
+        max_fetch_bytes: 累计下载上限，超过时抛出 DownloadTooLarge
+        first_block: 已经读到的第一个块
+    """
+
+    def __init__(self, size: int, fetch: Callable[[int, int], bytes], block_size: int = RANGE_BLOCK_BYTES,
+                 max_cached_bytes: int = RANGE_CACHE_BYTES, max_fetch_bytes: int = FETCH_MAX_BYTES,
+                 first_block: bytes = b""):
+        super().__init__()
+        self.size = size
+        self.block_size = block_size
+        self.max_cached_blocks = max(max_cached_bytes // block_size, 4)
+        self.max_fetch_bytes = max_fetch_bytes
+        self.fetched_bytes = 0
+        self.requests = 0
+        self._fetch = fetch
+        self._blocks = OrderedDict()
+        self._pos = 0
+        if len(first_block) >= min(block_size, size):
+            self._blocks[0] = first_block[:block_size]
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        else:
+            raise ValueError(f"无效的 whence: {whence}")
+        self._pos = max(self._pos, 0)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), self.size - self._pos)
+        if n <= 0:
+            return 0
+        data = self._read(self._pos, n)
+        buffer[:n] = data
+        self._pos += n
+        return n
+
+    def _read(self, pos: int, n: int) -> bytes:
+        first, last = pos // self.block_size, (pos + n - 1) // self.block_size
+        self._load(first, last)
+        data = b"".join(self._blocks[i] for i in range(first, last + 1))
+        offset = pos - first * self.block_size
+        return data[offset:offset + n]
+
+    def _load(self, first: int, last: int):
+        """读取 [first, last] 中缺失的块，连续缺失的块合并为一次请求"""
+        missing = [i for i in range(first, last + 1) if i not in self._blocks]
+        runs = []
+        for i in missing:
+            if runs and runs[-1][1] == i - 1:
+                runs[-1][1] = i
+            else:
+                runs.append([i, i])
+        for start_block, end_block in runs:
+            start = start_block * self.block_size
+            end = min((end_block + 1) * self.block_size, self.size) - 1
+            if self.fetched_bytes + end - start + 1 > self.max_fetch_bytes:
+                raise DownloadTooLarge(f"按需读取超过大小上限 {self.max_fetch_bytes / (1024 * 1024):g}MB")
+            data = self._fetch(start, end)
+            if len(data) != end - start + 1:
+                raise FetchError(f"范围请求 {start}-{end} 返回了 {len(data)} 字节")
+            self.requests += 1
+            self.fetched_bytes += len(data)
+            _range_requests.inc()
+            _range_bytes.inc(len(data))
+            for i in range(start_block, end_block + 1):
+                offset = (i - start_block) * self.block_size
+                self._blocks[i] = data[offset:offset + self.block_size]
+        for i in range(first, last + 1):
+            self._blocks.move_to_end(i)
+        # 本次读取用到的块不淘汰
+        while len(self._blocks) > max(self.max_cached_blocks, last - first + 1):
+            self._blocks.popitem(last=False)
+
+
+class RemotePdf:
+    """
+    支持范围请求的远程 PDF
+
+    Attributes:
+        digest: 由 URL、大小与 ETag / Last-Modified 得到的摘要，用作结果缓存键；
+                服务器不提供校验器时为 None
+    """
+
+    def __init__(self, url: str, labels: dict, size: int, headers: dict, first_block: bytes):
+        self.url = url
+        self.labels = labels
+        self.size = size
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        # 弱 ETag 不能用于 If-Range
+        self._if_range = etag if etag and not etag.startswith('W/') else last_modified
+        self.digest = None
+        if etag or last_modified:
+            source = f"range|{url}|{size}|{etag}|{last_modified}"
+            self.digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        self.file = RangeFile(size, self._fetch, first_block=first_block)
+        self._reader = None
+
+    @classmethod
+    async def open(cls, url: str, labels: dict) -> Optional["RemotePdf"]:
+        """
+        探测服务器是否支持范围请求
+
+        Returns:
+            RemotePdf；不支持范围请求、文件小于 OCR_PDF_RANGE_MIN_MB 或未安装 pypdf 时返回 None
+
+        Raises:
+            FetchError: 网络错误或非 2xx 状态码
+        """
+        if not RANGE_ENABLED:
+            return None
+        try:
+            import pypdf  # noqa: F401
+        except ImportError:
+            return None
+        size, first_block, headers = await fetch_range(url, labels, 0, RANGE_BLOCK_BYTES - 1)
+        if size is None or size < RANGE_MIN_BYTES:
+            return None
+        return cls(url, labels, size, headers, first_block)
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        size, data, _ = anyio.from_thread.run(fetch_range, self.url, self.labels, start, end, self._if_range)
+        if size is None:
+            raise FetchError(f"{self.url} 在读取过程中发生变化或不再支持范围请求")
+        return data
+
+    def _get_reader(self):
+        if self._reader is None:
+            # strict 模式：非严格模式会逐个校验 xref 中所有对象的位置，等于读取整个文件；
+            # 不规范的文档在严格模式下解析失败，由调用方退回完整下载
+            self._reader = pypdf.PdfReader(self.file, strict=True)
+        return self._reader
+
+    def _parse(self, func, *args):
+        try:
+            return func(*args)
+        except FetchError:
+            raise
+        except Exception as e:
+            raise UnsupportedPdf(str(e)) from e
+
+    def page_count(self) -> int:
+        """
+        文档页数（只读取 xref 与页面树根节点）
+
+        Raises:
+            UnsupportedPdf: 无法按需解析
+            FetchError: 范围请求失败
+        """
+        return self._parse(lambda: int(self._get_reader().trailer['/Root']['/Pages']['/Count']))
+
+    def _page(self, index: int):
+        """按页面树中的 /Count 定位第 index 页（从 0 开始），只读取路径上的节点"""
+        reader = self._get_reader()
+        node = reader.trailer['/Root']['/Pages']
+        inherited = {}
+        while True:
+            for name in _INHERITABLE:
+                if name in node:
+                    inherited[name] = node[name]
+            kids = node['/Kids']
+            if int(node['/Count']) == len(kids):
+                # 所有子节点都是页面，直接定位
+                reference = kids[index]
+                break
+            for kid in kids:
+                child = kid.get_object()
+                count = int(child['/Count']) if child.get('/Type') == '/Pages' else 1
+                if index < count:
+                    break
+                index -= count
+            else:
+                raise IndexError("页码超出页面树范围")
+            if child.get('/Type') != '/Pages':
+                reference = kid
+                break
+            node = child
+        page = pypdf.PageObject(reader, reference)
+        page.update(reference.get_object())
+        for name, value in inherited.items():
+            if name not in page:
+                page[pypdf.generic.NameObject(name)] = value
+        return page
+
+    def extract(self, page_nums: Optional[List[int]]) -> bytes:
+        """
+        生成与原文档页数相同的子集 PDF
+
+        Args:
+            page_nums: 保留内容的页码（从 1 开始），None 表示全部页面
+
+        Raises:
+            同 page_count
+        """
+        return self._parse(self._extract, page_nums)
+
+    def _extract(self, page_nums: Optional[List[int]]) -> bytes:
+        total = self.page_count()
+        selected = set(page_nums) if page_nums is not None else set(range(1, total + 1))
+        writer = pypdf.PdfWriter()
+        for page_num in range(1, total + 1):
+            if page_num in selected:
+                writer.add_page(self._page(page_num - 1), excluded_keys=_EXCLUDED_PAGE_KEYS)
+            else:
+                # 占位页不会被渲染，只用于保持页码
+                writer.add_blank_page(width=72, height=72)
+        output = io.BytesIO()
+        writer.write(output)
+        _loads.inc(mode="range")
+        return output.getvalue()
+
+
+def count_full_load():
+    """记录一次完整下载（未使用按需读取）"""
+    _loads.inc(mode="full")
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+按内容寻址的识别结果缓存
+
+缓存键 = SHA-256(输入字节) + 引擎配置（检测模型、识别模型、OCR_LANGUAGE、
+角度分类等开关）+ 结果类型。相同的发票/扫描件重复提交时直接返回已有结果，
+不再重新检测与识别。
+
+两级存储：
+- 内存层：进程内 LRU，容量 OCR_CACHE_MEMORY_MB
+- 磁盘层：OCR_CACHE_DIR 下的 JSON 文件，容量 OCR_CACHE_DISK_MB，重启后仍然有效；
+  目录在第一次使用磁盘层时才扫描，import 不做磁盘 I/O
+
+请求头 X-OCR-Cache: bypass 或 Cache-Control: no-cache 跳过缓存查找（结果仍会写入），
+Cache-Control: no-store 则既不查找也不写入。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import Request
+
+from utils import Metrics
+from utils.EngineRegistry import ENGINE_OPTIONS, OCR_LANGUAGE, resolve_models
+
+# 设为 0 关闭结果缓存
+CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "1") != "0"
+CACHE_MEMORY_MB = float(os.environ.get("OCR_CACHE_MEMORY_MB", "64"))
+CACHE_DIR = os.environ.get("OCR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "paddleocr_cache"))
+# 磁盘层容量（MB），0 表示只使用内存层
+CACHE_DISK_MB = float(os.environ.get("OCR_CACHE_DISK_MB", "512"))
+
+# 结果格式变化时递增，使旧缓存自然失效
+_KEY_VERSION = 2
+
+_lookups = Metrics.counter("ocr_result_cache_lookups_total", "结果缓存查找次数", ("kind", "tier"))
+_bytes_saved = Metrics.counter("ocr_result_cache_bytes_saved_total", "因命中缓存而免于识别的输入字节数", ("kind",))
+_memory_bytes = Metrics.gauge("ocr_result_cache_memory_bytes", "内存层占用（字节）")
+_disk_bytes = Metrics.gauge("ocr_result_cache_disk_bytes", "磁盘层占用（字节）")
+
+
+def cache_key(kind: str, digest: str, detection_model: Optional[str] = None,
+              recognition_model: Optional[str] = None, variant: Optional[str] = None) -> str:
+    """
+    计算缓存键
+
+    Args:
+        kind: 结果类型（ocr / pdf_ocr / pdf_table 等）
+        digest: 输入字节的 SHA-256 十六进制摘要
+        variant: 影响结果的其它请求参数（如页码选择），不计入指标标签
+    """
+    detection_model, recognition_model = resolve_models(detection_model, recognition_model)
+    config = json.dumps([_KEY_VERSION, kind, digest, detection_model, recognition_model,
+                         OCR_LANGUAGE, ENGINE_OPTIONS, variant], sort_keys=True)
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+def digest_bytes(data) -> str:
+    """输入字节的 SHA-256 摘要，支持 bytes / bytearray / memoryview"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_policy(request: Optional[Request]) -> Tuple[bool, bool]:
+    """
+    根据请求头决定是否查找、写入缓存
+
+    Returns:
+        tuple: (lookup, store)
+    """
+    if not CACHE_ENABLED:
+        return False, False
+    if request is None:
+        return True, True
+    cache_control = request.headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return False, False
+    bypass = request.headers.get("x-ocr-cache", "").lower() == "bypass" or "no-cache" in cache_control
+    return not bypass, True
+
+
+class ResultCache:
+    """
+    线程安全的两级结果缓存，值为可 JSON 序列化的对象
+
+    Args:
+        memory_bytes: 内存层容量，<= 0 表示关闭内存层
+        directory: 磁盘层目录
+        disk_bytes: 磁盘层容量，<= 0 表示关闭磁盘层
+    """
+
+    def __init__(self, memory_bytes: int, directory: str, disk_bytes: int):
+        self.memory_bytes = memory_bytes
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> 序列化后的 bytes，按最近使用排序
+        self._memory_used = 0
+        self._disk = OrderedDict()  # key -> 文件大小，按最近使用排序
+        self._disk_used = 0
+        # 磁盘层索引在第一次使用时建立
+        self._disk_loaded = disk_bytes <= 0
+        self._index_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._saved = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _ensure_disk_index(self):
+        if self._disk_loaded:
+            return
+        with self._index_lock:
+            if not self._disk_loaded:
+                self._load_disk_index()
+                self._disk_loaded = True
+
+    def _load_disk_index(self):
+        """扫描磁盘层，按修改时间恢复 LRU 顺序"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name[:-5], st.st_size))
+        with self._lock:
+            for _, key, size in sorted(entries):
+                self._disk[key] = size
+                self._disk_used += size
+            self._evict_disk_locked()
+            _disk_bytes.set(self._disk_used)
+
+    def get(self, key: str, kind: str = "", input_size: int = 0):
+        """
+        查找缓存，未命中返回 None
+
+        Args:
+            kind: 结果类型（用于指标标签）
+            input_size: 输入字节数，命中时计入节省的字节数
+        """
+        self._ensure_disk_index()
+        payload = None
+        tier = "miss"
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                tier = "memory"
+            elif key in self._disk:
+                self._disk.move_to_end(key)
+                tier = "disk"
+
+        if tier == "disk":
+            try:
+                with open(self._path(key), "rb") as f:
+                    payload = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                payload = None
+                tier = "miss"
+                with self._lock:
+                    self._disk_used -= self._disk.pop(key, 0)
+            else:
+                self._put_memory(key, payload)
+
+        _lookups.inc(kind=kind, tier=tier)
+        with self._lock:
+            if payload is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._saved += input_size
+        _bytes_saved.inc(input_size, kind=kind)
+        return json.loads(payload)
+
+    def put(self, key: str, value):
+        """写入两级缓存"""
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._put_memory(key, payload)
+        if self.disk_bytes > 0 and len(payload) <= self.disk_bytes:
+            self._put_disk(key, payload)
+
+    def _put_memory(self, key: str, payload: bytes):
+        if len(payload) > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= len(old)
+            self._memory[key] = payload
+            self._memory_used += len(payload)
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+            _memory_bytes.set(self._memory_used)
+
+    def _put_disk(self, key: str, payload: bytes):
+        self._ensure_disk_index()
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再原子替换，进程中途退出不会留下半个条目
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_used -= self._disk.pop(key, 0)
+            self._disk[key] = len(payload)
+            self._disk_used += len(payload)
+            self._evict_disk_locked()
+            _disk_bytes.set(self._disk_used)
+
+    def _evict_disk_locked(self):
+        while self._disk_used > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """清空两级缓存"""
+        self._ensure_disk_index()
+        with self._lock:
+            keys = list(self._disk.keys())
+            self._memory.clear()
+            self._disk.clear()
+            self._memory_used = 0
+            self._disk_used = 0
+            _memory_bytes.set(0)
+            _disk_bytes.set(0)
+        for key in keys:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """命中率、节省字节数与各层占用"""
+        self._ensure_disk_index()
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': CACHE_ENABLED,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'bytes_saved': self._saved,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_used,
+                'memory_budget_bytes': self.memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_used,
+                'disk_budget_bytes': self.disk_bytes
+            }
+
+
+# 全局共享实例
+result_cache = ResultCache(
+    memory_bytes=int(CACHE_MEMORY_MB * 1024 * 1024),
+    directory=CACHE_DIR,
+    disk_bytes=int(CACHE_DISK_MB * 1024 * 1024) if CACHE_ENABLED else 0
+)
+
+
+def lookup_request(request: Optional[Request], kind: str, data, detection_model: Optional[str] = None,
+                   recognition_model: Optional[str] = None, variant: Optional[str] = None,
+                   digest: Optional[str] = None):
+    """
+    按请求头策略查找输入字节对应的缓存结果
+
+    Args:
+        digest: 已知的输入摘要（如 UrlCache 记录的），给出时不再计算，data 可以为 None
+
+    Returns:
+        tuple: (key, cached)，key 为 None 表示本次结果不应写入缓存；
+               cached 为 None 表示未命中（或跳过了查找）
+    """
+    lookup, store = cache_policy(request)
+    if not (lookup or store):
+        return None, None
+    key = cache_key(kind, digest or digest_bytes(data), detection_model, recognition_model, variant)
+    cached = result_cache.get(key, kind, len(data) if data is not None else 0) if lookup else None
+    return (key if store else None), cached
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+逐页流式响应
+
+客户端通过 Accept 头选择流式输出：
+- application/x-ndjson: 每行一个 JSON 对象 {"type": ..., "data": ...}
+- text/event-stream: Server-Sent Events，event 名为记录类型
+
+记录类型：
+- page: 单页结果，处理完立即发送
+- summary: 结束记录，包含 resultcode / message 与统计信息
+- error: 处理中途失败，之后不再发送其它记录
+"""
+
+import json
+import time
+from typing import Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from utils.BlockingExecutor import iterate_blocking
+from utils.Telemetry import observe_serialize
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def negotiate_stream(request: Request) -> Optional[str]:
+    """根据 Accept 头返回流式媒体类型，未请求流式输出时返回 None"""
+    accept = request.headers.get("accept", "")
+    if NDJSON_MEDIA_TYPE in accept:
+        return NDJSON_MEDIA_TYPE
+    if SSE_MEDIA_TYPE in accept:
+        return SSE_MEDIA_TYPE
+    return None
+
+
+def _encode(record_type: str, data, media_type: str) -> bytes:
+    start = time.perf_counter()
+    if media_type == SSE_MEDIA_TYPE:
+        payload = json.dumps(data, ensure_ascii=False)
+        encoded = f"event: {record_type}\ndata: {payload}\n\n".encode("utf-8")
+    else:
+        line = json.dumps({'type': record_type, 'data': data}, ensure_ascii=False)
+        encoded = (line + "\n").encode("utf-8")
+    observe_serialize(time.perf_counter() - start)
+    return encoded
+
+
+def stream_records(records: Iterable[Tuple[str, object]], media_type: str) -> StreamingResponse:
+    """
+    把 (记录类型, 数据) 迭代器包装为流式响应
+
+    迭代器在阻塞任务线程池（BlockingExecutor）中逐条执行；抛出的异常转换为 error 记录发送给客户端。
+    迭代器应在自身的 finally 中清理临时资源。
+    """
+
+    def _body():
+        try:
+            for record_type, data in records:
+                yield _encode(record_type, data, media_type)
+        except Exception as e:
+            yield _encode('error', {'resultcode': 500, 'message': f"PDF识别失败: {str(e)}"}, media_type)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(iterate_blocking(_body()), media_type=media_type, headers=headers)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+请求与处理阶段指标
+
+- 请求延迟：按路由模板（而非实际路径）、方法与状态码统计，另有进行中请求数
+- 阶段耗时 ocr_stage_seconds：按检测/识别模型打标签，stage 取值
+    download    URL 下载
+    upload      原始请求体接收（/predict-by-bytes）
+    decode      图片 / base64 解码
+    render      PDF 页面渲染
+    extract     文本层 / 矢量表格直接提取
+    ocr         检测 + 识别（PaddleOCR 在一次 predict 调用内完成两者，无法分开计时）
+    postprocess 结果结构提取与表格重建
+    serialize   响应 JSON 序列化
+- 处理的 PDF 页数（按来源）与送入识别的像素数
+
+标签取值都来自有限集合（模型名、路由模板），可以在高负载下常开。
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+
+from utils import Metrics
+from utils.EngineRegistry import resolve_models
+
+_MODEL_LABELS = ("detection_model", "recognition_model")
+
+# 阶段耗时普遍在毫秒以下到数秒之间
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_stage_seconds = Metrics.histogram(
+    "ocr_stage_seconds", "各处理阶段耗时", ("stage",) + _MODEL_LABELS, buckets=STAGE_BUCKETS)
+_pages_total = Metrics.counter(
+    "ocr_pdf_pages_total", "处理的 PDF 页数（source: ocr / text_layer / vector_table）", ("source",) + _MODEL_LABELS)
+_pixels_total = Metrics.counter("ocr_pixels_total", "送入识别的图像像素数", _MODEL_LABELS)
+_request_seconds = Metrics.histogram(
+    "ocr_http_request_seconds", "HTTP 请求耗时（至响应体发送完毕）", ("method", "route", "status"))
+_requests_in_flight = Metrics.gauge("ocr_http_requests_in_flight", "正在处理的 HTTP 请求数")
+
+# 当前请求使用的模型标签：中间件为每个请求放入一个空 dict，接口函数填入模型名，
+# 响应序列化时读取。用可变 dict 而非直接 set()，是因为同步接口在线程池中执行，
+# 其中对 ContextVar 的修改不会传回请求所在的上下文。
+_request_models: ContextVar[Optional[dict]] = ContextVar("ocr_request_models", default=None)
+
+
+def model_labels(detection_model: Optional[str] = None, recognition_model: Optional[str] = None) -> dict:
+    """补全默认模型名称，返回指标标签"""
+    detection_model, recognition_model = resolve_models(detection_model, recognition_model)
+    return {'detection_model': detection_model, 'recognition_model': recognition_model}
+
+
+def bind_request_models(detection_model: Optional[str] = None, recognition_model: Optional[str] = None) -> dict:
+    """记录当前请求使用的模型（同一请求后续的 serialize 阶段沿用这组标签），返回标签"""
+    labels = model_labels(detection_model, recognition_model)
+    holder = _request_models.get()
+    if holder is not None:
+        holder.update(labels)
+    return labels
+
+
+def observe_stage(stage: str, seconds: float, labels: dict):
+    _stage_seconds.observe(seconds, stage=stage, **labels)
+
+
+@contextmanager
+def stage_timer(stage: str, labels: dict):
+    """计时 with 块并记录到 ocr_stage_seconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_seconds.observe(time.perf_counter() - start, stage=stage, **labels)
+
+
+def count_pdf_page(source: str, labels: dict):
+    _pages_total.inc(source=source, **labels)
+
+
+def count_pixels(image, labels: dict):
+    """image 为 numpy 数组时累计其像素数（路径 / URL 输入不计）"""
+    shape = getattr(image, 'shape', None)
+    if shape is not None and len(shape) >= 2:
+        _pixels_total.inc(shape[0] * shape[1], **labels)
+
+
+def observe_serialize(seconds: float):
+    """记录当前请求的序列化耗时，未绑定模型的请求（如 /health）不记录"""
+    labels = _request_models.get()
+    if labels:
+        _stage_seconds.observe(seconds, stage='serialize', **labels)
+
+
+class TimedJSONResponse(JSONResponse):
+    """记录 serialize 阶段耗时的 JSONResponse（作为应用的默认响应类）"""
+
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        body = super().render(content)
+        observe_serialize(time.perf_counter() - start)
+        return body
+
+
+class RequestMetricsMiddleware:
+    """
+    纯 ASGI 中间件：统计请求耗时与进行中请求数
+
+    耗时计到响应体发送完毕，流式响应也完整计入；路由标签使用路由模板
+    （如 /jobs/{job_id}），未匹配任何路由的请求记为 unmatched。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        token = _request_models.set({})
+        _requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _requests_in_flight.dec()
+            _request_models.reset(token)
+            route = scope.get('route')
+            _request_seconds.observe(
+                time.perf_counter() - start,
+                method=scope.get('method', ''),
+                route=getattr(route, 'path', None) or 'unmatched',
+                status=str(status)
+            )
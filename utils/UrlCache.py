@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+URL 级条件请求缓存
+
+客户端反复提交同一个对象存储 URL 时，按 URL 记录上次下载的 ETag / Last-Modified
+与内容摘要（SHA-256，即结果缓存键中的 digest）：
+- 距上次确认不超过 OCR_URL_CACHE_TTL 秒：认为内容未变，不发请求
+- 否则发送条件请求（If-None-Match / If-Modified-Since），源站返回 304 时
+  沿用记录的摘要
+
+两种情况都不下载内容，调用方按摘要直接查结果缓存（ResultCache），命中即
+同时省掉下载与识别；结果缓存未命中（已被淘汰，或换了模型/参数）时抛出
+ContentRequired，调用方以 revalidate=False 重新完整下载。
+
+源站既不返回 ETag 也不返回 Last-Modified 且 TTL 为 0 时不记录条目。
+条目数上限 OCR_URL_CACHE_ENTRIES（LRU 淘汰，0 表示关闭），只保存在内存中。
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from utils import Metrics
+from utils.BlockingExecutor import run_blocking
+from utils.HttpFetcher import fetch
+from utils.ResultCache import digest_bytes
+
+# 在该时间（秒）内复用记录，不向源站确认；0 表示每次都发送条件请求
+URL_CACHE_TTL = float(os.environ.get("OCR_URL_CACHE_TTL", "0"))
+URL_CACHE_ENTRIES = int(os.environ.get("OCR_URL_CACHE_ENTRIES", "1024"))
+
+_requests = Metrics.counter(
+    "ocr_url_cache_requests_total",
+    "URL 缓存结果（fresh: 未确认直接复用; not_modified: 304; modified: 内容已变; miss: 无记录）",
+    ("outcome",))
+_entries = Metrics.gauge("ocr_url_cache_entries", "URL 缓存条目数")
+
+OUTCOME_FRESH = "fresh"
+OUTCOME_NOT_MODIFIED = "not_modified"
+OUTCOME_MODIFIED = "modified"
+OUTCOME_MISS = "miss"
+
+
+class ContentRequired(Exception):
+    """只有摘要、没有内容，而结果缓存未命中：需要完整下载后重试"""
+
+
+class UrlEntry:
+    __slots__ = ("etag", "last_modified", "digest", "size", "meta", "validated_at")
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], digest: str, size: int, meta):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.size = size
+        self.meta = meta
+        self.validated_at = time.monotonic()
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class UrlFetch:
+    """
+    fetch 的结果
+
+    Attributes:
+        content: 响应体；内容未变（fresh / not_modified）时为 None
+        digest: 内容摘要
+        size: 内容字节数
+        meta: 下载时由 describe(content) 得到的附加信息（如 PDF 页数），失败为 None
+        outcome: fresh / not_modified / modified / miss
+    """
+    __slots__ = ("content", "digest", "size", "meta", "outcome")
+
+    def __init__(self, content: Optional[bytes], digest: str, size: int, meta, outcome: str):
+        self.content = content
+        self.digest = digest
+        self.size = size
+        self.meta = meta
+        self.outcome = outcome
+
+
+def _describe(describe: Optional[Callable], content: bytes):
+    if describe is None:
+        return None
+    try:
+        return describe(content)
+    except Exception:
+        # 内容无法解析时由后续的完整处理报告错误
+        return None
+
+
+class UrlCache:
+    """
+    线程安全的 URL -> UrlEntry LRU 表
+
+    Args:
+        max_entries: 条目数上限，<= 0 表示关闭
+        ttl: 免确认复用的时间（秒）
+    """
+
+    def __init__(self, max_entries: int = URL_CACHE_ENTRIES, ttl: float = URL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, url: str) -> Optional[UrlEntry]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url: str, entry: UrlEntry):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(url, None)
+            self._entries[url] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            _entries.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            _entries.set(0)
+
+    async def fetch(self, url: str, labels: dict, describe: Optional[Callable] = None,
+                    revalidate: bool = True) -> UrlFetch:
+        """
+        获取 URL 内容或确认其未变
+
+        Args:
+            describe: 对新下载的内容计算附加信息并随条目保存（在线程池中执行）
+            revalidate: False 时忽略已有记录，总是完整下载
+
+        Raises:
+            同 HttpFetcher.fetch
+        """
+        entry = self.get(url) if revalidate and self.max_entries > 0 else None
+        headers = None
+        if entry is not None:
+            if time.monotonic() - entry.validated_at < self.ttl:
+                _requests.inc(outcome=OUTCOME_FRESH)
+                return UrlFetch(None, entry.digest, entry.size, entry.meta, OUTCOME_FRESH)
+            headers = entry.conditional_headers()
+
+        status_code, content, response_headers = await fetch(url, labels, headers=headers or None)
+        if status_code == 304 and entry is not None:
+            entry.validated_at = time.monotonic()
+            _requests.inc(outcome=OUTCOME_NOT_MODIFIED)
+            return UrlFetch(None, entry.digest, entry.size, entry.meta, OUTCOME_NOT_MODIFIED)
+
+        outcome = OUTCOME_MODIFIED if headers else OUTCOME_MISS
+        _requests.inc(outcome=outcome)
+        digest = await run_blocking(digest_bytes, content)
+        meta = await run_blocking(_describe, describe, content)
+        etag = response_headers.get('etag')
+        last_modified = response_headers.get('last-modified')
+        if etag or last_modified or self.ttl > 0:
+            self.put(url, UrlEntry(etag, last_modified, digest, len(content), meta))
+        return UrlFetch(content, digest, len(content), meta, outcome)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl
+            }
+
+
+# 全局共享实例
+url_cache = UrlCache()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+启动预热
+
+服务启动时在后台线程中：
+1. 预加载 OCR_PRELOAD_MODELS 中列出的模型组合（默认只有默认组合）
+2. 对每个组合用一张合成图片执行一次识别，完成推理后端的首次初始化
+
+全部完成前 /ready 返回 503，完成后返回 200 并附带各组合的加载与预热耗时；
+/health 只表示进程存活，不受预热影响。
+
+OCR_PRELOAD_MODELS 格式：以逗号分隔的 "检测模型:识别模型"，任一侧留空表示默认模型，
+例如 "PP-OCRv5_server_det:PP-OCRv5_server_rec,PP-OCRv5_mobile_det:PP-OCRv5_mobile_rec"；
+设为 none 则不预加载，服务启动即就绪。
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from utils import Metrics
+from utils.BatchScheduler import submit
+from utils.EngineRegistry import get_engine, resolve_models
+from utils.WorkerPool import get_worker_pool
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_MODELS = os.environ.get("OCR_PRELOAD_MODELS", "")
+# 设为 0 只加载模型，不执行预热识别
+WARMUP_INFERENCE = os.environ.get("OCR_WARMUP", "1") != "0"
+
+STATUS_PENDING = "pending"
+STATUS_WARMING = "warming"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+_ready = Metrics.gauge("ocr_ready", "预热完成、可以接收流量时为 1")
+_warmup_seconds = Metrics.gauge(
+    "ocr_warmup_seconds", "各模型组合的加载与预热耗时", ("detection_model", "recognition_model", "phase"))
+
+_lock = threading.Lock()
+_state = {
+    'status': STATUS_PENDING,
+    'profiles': [],
+    'started_at': None,
+    'finished_at': None,
+    'error': None
+}
+
+
+def parse_profiles(spec: str) -> List[Tuple[str, str]]:
+    """
+    解析 OCR_PRELOAD_MODELS
+
+    Returns:
+        list: [(detection_model, recognition_model)]，已补全默认模型并去重
+    """
+    spec = spec.strip()
+    if spec.lower() == "none":
+        return []
+    profiles = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        detection_model, _, recognition_model = item.partition(":")
+        profile = resolve_models(detection_model.strip() or None, recognition_model.strip() or None)
+        if profile not in profiles:
+            profiles.append(profile)
+    return profiles or [resolve_models()]
+
+
+def synthetic_image() -> np.ndarray:
+    """生成一张带几行文字的白底 BGR 图片，用于预热识别"""
+    import cv2
+    image = np.full((160, 640, 3), 255, dtype=np.uint8)
+    for i, text in enumerate(("PaddleOCR warm-up 0123456789", "Invoice No. 2024-001  Total 99.90")):
+        cv2.putText(image, text, (16, 56 + i * 60), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2, cv2.LINE_AA)
+    return image
+
+
+def _warm_profile(detection_model: str, recognition_model: str, image: np.ndarray) -> dict:
+    timings = {'detection_model': detection_model, 'recognition_model': recognition_model}
+    pool = get_worker_pool()
+    if pool is None:
+        start = time.perf_counter()
+        get_engine(detection_model, recognition_model)
+        timings['load_seconds'] = round(time.perf_counter() - start, 3)
+    if WARMUP_INFERENCE or pool is not None:
+        # 启用工作池时引擎在子进程中加载：同时提交与进程数相同的任务，让每个子进程都完成加载与预热
+        start = time.perf_counter()
+        futures = [submit(image, detection_model, recognition_model)
+                   for _ in range(pool.workers if pool is not None else 1)]
+        for future in futures:
+            future.result()
+        timings['warmup_seconds'] = round(time.perf_counter() - start, 3)
+    for phase in ('load_seconds', 'warmup_seconds'):
+        if phase in timings:
+            _warmup_seconds.set(timings[phase], detection_model=detection_model,
+                                recognition_model=recognition_model, phase=phase[:-len('_seconds')])
+    return timings
+
+
+def run_warmup(spec: Optional[str] = None):
+    """按顺序预加载并预热全部模型组合（阻塞），结果记录在 warmup_status() 中"""
+    profiles = parse_profiles(PRELOAD_MODELS if spec is None else spec)
+    with _lock:
+        _state.update(status=STATUS_WARMING, profiles=[], started_at=time.time(), finished_at=None, error=None)
+    try:
+        image = synthetic_image() if profiles else None
+        for detection_model, recognition_model in profiles:
+            logger.info("预热模型组合 %s / %s", detection_model, recognition_model)
+            timings = _warm_profile(detection_model, recognition_model, image)
+            with _lock:
+                _state['profiles'].append(timings)
+    except Exception as e:
+        logger.exception("模型预热失败")
+        with _lock:
+            _state.update(status=STATUS_FAILED, error=str(e), finished_at=time.time())
+        return
+    with _lock:
+        _state.update(status=STATUS_READY, finished_at=time.time())
+    _ready.set(1)
+
+
+def start_warmup() -> threading.Thread:
+    """在后台线程中执行 run_warmup，服务可以先接受 /health 探测"""
+    thread = threading.Thread(target=run_warmup, name="ocr-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    with _lock:
+        return _state['status'] == STATUS_READY
+
+
+def warmup_status() -> dict:
+    """预热状态与各模型组合的加载 / 预热耗时"""
+    with _lock:
+        state = dict(_state, profiles=list(_state['profiles']))
+    if state['started_at'] is not None:
+        end = state['finished_at'] or time.time()
+        state['elapsed_seconds'] = round(end - state['started_at'], 3)
+    return state
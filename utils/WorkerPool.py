@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+多进程 OCR 工作池（可选）
+
+OCR_WORKERS > 0 时启用：启动 N 个子进程，每个子进程通过 EngineRegistry
+持有自己的 PaddleOCR 引擎。图片写入共享内存后只把共享内存名称、形状和
+模型名称发给子进程，子进程返回已转换为纯 Python 结构的识别结果，
+整个过程不对图像做 pickle。
+
+每个子进程的推理线程数由 OCR_WORKER_THREADS 限制（默认按 CPU 核数均分），
+避免多个进程的 OpenMP / MKL 线程相互争抢。
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+from utils import Metrics
+from utils.Telemetry import model_labels, observe_stage
+
+WORKER_COUNT = max(int(os.environ.get("OCR_WORKERS", "0")), 0)
+WORKER_THREADS = int(os.environ.get("OCR_WORKER_THREADS", "0")) or max((os.cpu_count() or 1) // max(WORKER_COUNT, 1), 1)
+
+_pool_size = Metrics.gauge("ocr_worker_pool_size", "工作进程数量")
+_inflight = Metrics.gauge("ocr_worker_pool_inflight", "已提交但未完成的任务数")
+_tasks_total = Metrics.counter("ocr_worker_tasks_total", "工作进程完成的任务数", ("outcome",))
+_busy_seconds = Metrics.counter(
+    "ocr_worker_busy_seconds_total", "工作进程实际执行推理的累计时间，除以进程数即为利用率")
+_task_seconds = Metrics.histogram("ocr_worker_task_seconds", "子进程内单个任务的推理耗时")
+_wait_seconds = Metrics.histogram("ocr_worker_queue_wait_seconds", "任务从提交到子进程开始执行的等待时间")
+
+
+def _init_worker(threads: int):
+    """子进程初始化：限制各数学库的线程数"""
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    os.environ["OCR_CPU_THREADS"] = str(threads)
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+
+def to_plain(results) -> list:
+    """把 predict 结果转换为可直接跨进程返回的 list/dict 结构"""
+    plain = []
+    for item in results:
+        core = item.get('res', item) if isinstance(item, dict) else item
+        if isinstance(core, dict):
+            get = core.get
+        else:
+            def get(name, default=None, _obj=core):
+                return getattr(_obj, name, default)
+        rec_texts = get('rec_texts')
+        rec_boxes = get('rec_boxes')
+        plain.append({
+            'input_path': get('input_path') or '',
+            'rec_texts': list(rec_texts) if isinstance(rec_texts, (list, tuple)) else [],
+            'rec_boxes': rec_boxes.tolist() if isinstance(rec_boxes, np.ndarray) else (rec_boxes or [])
+        })
+    return plain
+
+
+def _run_task(payload: tuple, detection_model: Optional[str], recognition_model: Optional[str],
+              submitted_at: float):
+    """
+    子进程任务
+
+    Args:
+        payload: ('shm', 共享内存名称, 形状, dtype) 或 ('input', 文件路径/URL)
+    """
+    from utils.EngineRegistry import get_engine
+
+    started = time.time()
+    engine = get_engine(detection_model, recognition_model)
+    if payload[0] == 'input':
+        compute_start = time.perf_counter()
+        results = to_plain(engine.predict(input=payload[1]))
+        return results, started - submitted_at, time.perf_counter() - compute_start
+
+    _, shm_name, shape, dtype = payload
+    # 共享内存由父进程创建并负责 unlink，子进程只做映射
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        compute_start = time.perf_counter()
+        results = to_plain(engine.predict(input=image))
+        compute_seconds = time.perf_counter() - compute_start
+        del image
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # 推理结果仍引用该缓冲区时由垃圾回收释放映射
+            pass
+    return results, started - submitted_at, compute_seconds
+
+
+class WorkerPool:
+    """
+    OCR 子进程池
+
+    Args:
+        workers: 子进程数量
+        threads: 每个子进程的推理线程数
+    """
+
+    def __init__(self, workers: int, threads: int):
+        self.workers = workers
+        self.threads = threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads,)
+        )
+        _pool_size.set(workers)
+
+    def submit(self, image, detection_model: Optional[str] = None,
+               recognition_model: Optional[str] = None) -> Future:
+        """
+        提交一张图片（numpy 数组、文件路径或 URL）到子进程识别
+
+        numpy 图像在提交时复制进共享内存，返回后调用方即可复用原缓冲区。
+
+        Returns:
+            concurrent.futures.Future: 结果为与 predict 相同结构的列表
+        """
+        shm = None
+        if isinstance(image, np.ndarray):
+            image = np.ascontiguousarray(image)
+            shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+            view = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+            view[...] = image
+            del view
+            payload = ('shm', shm.name, image.shape, image.dtype.str)
+        else:
+            payload = ('input', image)
+
+        def _release():
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+        labels = model_labels(detection_model, recognition_model)
+        _inflight.inc()
+        try:
+            inner = self._executor.submit(
+                _run_task, payload, detection_model, recognition_model, time.time()
+            )
+        except Exception:
+            _inflight.dec()
+            _release()
+            raise
+
+        outer = Future()
+
+        def _done(fut: Future):
+            _inflight.dec()
+            _release()
+            try:
+                results, wait_seconds, compute_seconds = fut.result()
+            except BaseException as e:
+                _tasks_total.inc(outcome='error')
+                outer.set_exception(e)
+                return
+            _tasks_total.inc(outcome='ok')
+            _busy_seconds.inc(compute_seconds)
+            _task_seconds.observe(compute_seconds)
+            observe_stage('ocr', compute_seconds, labels)
+            _wait_seconds.observe(max(wait_seconds, 0.0))
+            outer.set_result(results)
+
+        inner.add_done_callback(_done)
+        return outer
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        _pool_size.set(0)
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> Optional[WorkerPool]:
+    """获取全局工作池，未启用（OCR_WORKERS=0）时返回 None"""
+    global _pool
+    if WORKER_COUNT <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(WORKER_COUNT, WORKER_THREADS)
+            atexit.register(_pool.shutdown)
+        return _pool